@@ -1,12 +1,28 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import asyncio
+import json
 import os
+import time
 import tempfile
 import base64
+import subprocess
+import sys
 import soundfile as sf
 import io
-from pipeline import SpeechProcessingPipeline
+from audio_stream import AudioStreamSession
+from voice_turn import VoiceTurnRunner
+from executors import ModelExecutors
+from model_server import RemotePipeline
+from batching import MicroBatcher
+from llm_client import LLMError
+from chat_context import ChatContext
+from onnx_sessions import SESSION_TIMINGS
+from metrics import ACTIVE_SESSIONS, FIRST_AUDIO_SECONDS, INTERRUPTIONS, REGISTRY, gauge
+
+PROCESS_START = time.perf_counter()
 
 app = FastAPI()
 
@@ -20,45 +36,366 @@ app.add_middleware(
 )
 
 
+# Speech needed over a reply in progress before it is cut off
+BARGE_IN_MS = int(os.environ.get("BARGE_IN_MS", 200))
+
+# Built on startup; the models load in the background while the server listens
+pipeline = None
+runner = None
+models_loaded = None
+startup_timings = {}
+
+
+def build_pipeline():
+    # MODEL_SERVER_SOCKET: the models live in model_server.py, shared by
+    # every worker; this process only decodes, runs VAD and talks to the LLM
+    if os.environ.get("MODEL_SERVER_SOCKET"):
+        return RemotePipeline(os.environ["MODEL_SERVER_SOCKET"])
+    # VOICE_BACKEND=stub serves fixed-latency fake models (StubPipeline),
+    # e.g. for bench_e2e.py; anything else loads the real ones
+    if os.environ.get("VOICE_BACKEND", "models") == "stub":
+        from stub_pipeline import StubPipeline
+        return StubPipeline.from_env()
+    # Imported here so front-end workers (RemotePipeline) never load torch
+    from pipeline import SpeechProcessingPipeline
+    # Warm the batch shapes the ASR batcher will actually send
+    max_batch = int(os.environ.get("ASR_MAX_BATCH", 1))
+    return SpeechProcessingPipeline(warmup_batch_sizes=tuple(sorted({1, max_batch})), lazy=True)
+
+
+def build_runner(pipeline):
+    if isinstance(pipeline, RemotePipeline):
+        # Batching and per-model serialization happen in the model server;
+        # the local stages only bound how many calls this worker has in flight
+        workers = int(os.environ.get("MODEL_SERVER_CONCURRENCY", 4))
+        runner = VoiceTurnRunner(pipeline, executors=ModelExecutors(asr_workers=workers, tts_workers=workers))
+        register_queue_metrics(runner, [])
+        return runner
+    # ASR_MAX_BATCH > 1 batches concurrent users' utterances into one Whisper generate
+    asr_batcher = None
+    if int(os.environ.get("ASR_MAX_BATCH", 1)) > 1:
+        asr_batcher = MicroBatcher(
+            pipeline.transcribe_batch,
+            max_batch_size=int(os.environ["ASR_MAX_BATCH"]),
+            max_wait_ms=float(os.environ.get("ASR_BATCH_WAIT_MS", 20)),
+            name="whisper-batcher",
+        )
+    # TTS_MAX_BATCH > 1 synthesizes sentences of concurrent replies in one Kokoro run
+    tts_batcher = None
+    if int(os.environ.get("TTS_MAX_BATCH", 1)) > 1:
+        tts_batcher = MicroBatcher(
+            pipeline.synthesize_sentences,
+            max_batch_size=int(os.environ["TTS_MAX_BATCH"]),
+            max_wait_ms=float(os.environ.get("TTS_BATCH_WAIT_MS", 10)),
+            name="kokoro-batcher",
+        )
+    runner = VoiceTurnRunner(pipeline, asr_batcher=asr_batcher, tts_batcher=tts_batcher)
+    register_queue_metrics(runner, [b for b in (asr_batcher, tts_batcher) if b is not None])
+    return runner
+
+
+def register_queue_metrics(runner, batchers):
+    stages = runner.executors.stages()
+    gauge("voice_stage_waiting", "Calls waiting for a slot of a model stage",
+          fn=lambda: {stage.name: stage.waiting for stage in stages}, label="stage")
+    gauge("voice_stage_active", "Calls holding a slot of a model stage",
+          fn=lambda: {stage.name: stage.active for stage in stages}, label="stage")
+    gauge("voice_batcher_pending", "Items queued in a micro-batcher",
+          fn=lambda: {batcher.name: batcher.pending for batcher in batchers}, label="batcher")
+
+
+@app.on_event("startup")
+async def start_models():
+    global pipeline, runner, models_loaded
+    models_loaded = asyncio.Event()
+    pipeline = build_pipeline()
+    runner = build_runner(pipeline)
+    startup_timings["listen"] = round(time.perf_counter() - PROCESS_START, 3)
+    print(f"Listening after {startup_timings['listen']:.2f}s, loading models in the background")
+
+    async def load():
+        try:
+            await asyncio.to_thread(pipeline.initialize_models)
+        except Exception as e:
+            print(f"Model initialization failed: {e}")
+        finally:
+            startup_timings["ready"] = round(time.perf_counter() - PROCESS_START, 3)
+            models_loaded.set()
+
+    app.state.model_loader = asyncio.create_task(load())
+
+
+def readiness():
+    return {
+        "ready": pipeline is not None and pipeline.ready.is_set(),
+        "error": pipeline.init_error if pipeline is not None else None,
+        "since_start": startup_timings,
+        "phases": dict(pipeline.init_timings) if pipeline is not None else {},
+        "onnx_sessions": SESSION_TIMINGS,
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """200 once every model is loaded and warm, 503 before that (or on failure)"""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latency histograms, queue depths and sessions, Prometheus text format.
+    With a model server (WEB_WORKERS > 1) the ASR histogram is on its own
+    /metrics, see model_server.py"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+async def wait_for_models(websocket: WebSocket):
+    """Hold a session that connected during startup until the models are ready"""
+    if not models_loaded.is_set():
+        await websocket.send_json({"type": "status", "state": "loading"})
+        await models_loaded.wait()
+    if not pipeline.ready.is_set():
+        await websocket.send_json({"type": "error", "message": f"Models failed to load: {pipeline.init_error}"})
+        await websocket.close(code=1011)
+        return False
+    return True
+
+
+def audio_url(audio_data):
+    return f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}"
+
+
+def observe_first_audio(turn_start):
+    if turn_start is not None:
+        FIRST_AUDIO_SECONDS.observe(time.perf_counter() - turn_start)
+
+
+class ReplyTurn:
+    """One assistant reply in flight. Cancelling its task (barge-in) stops
+    the LLM stream and the TTS chunks still queued; sent holds the text of
+    every audio message sent so far, played how many of them the client
+    reports as heard."""
+
+    def __init__(self):
+        self.task = None
+        self.sent = []
+        self.played = None
+        self.response = None
+        self.committed = False
+        # Set once interrupt() has settled this turn's chat history
+        self.closed = False
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def heard(self):
+        played = len(self.sent) if self.played is None else min(self.played, len(self.sent))
+        return " ".join(self.sent[:played])
+
+
+async def reply(websocket: WebSocket, chat_history, stream=False, turn_start=None, turn=None):
+    """Generate the assistant turn for chat_history and send text + audio.
+    turn_start (perf_counter when the user's audio arrived) feeds the
+    end-to-end first-audio histogram. The reply is added to chat_history
+    once all of its audio has been sent."""
+    turn = turn or ReplyTurn()
+    if not stream:
+        response = await runner.respond(chat_history)
+        print(f"Response: {response}")
+        turn.response = response
+        await websocket.send_json({"type": "response", "text": response})
+
+        audio_data = await runner.speak(response)
+        # print(f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}")
+        await websocket.send_json({"type": "audio", "audioUrl": audio_url(audio_data)})
+        turn.sent.append(response)
+        observe_first_audio(turn_start)
+        chat_history.append({"role": "assistant", "content": response})
+        turn.committed = True
+        return
+
+    # Streaming: LLM tokens are cut into sentences and each chunk is pushed
+    # as soon as Kokoro has synthesized it, then an end-of-utterance marker
+    async for seq, chunk_text, audio_data in runner.respond_stream(chat_history):
+        await websocket.send_json({
+            "type": "audio_chunk",
+            "seq": seq,
+            "text": chunk_text,
+            "audioUrl": audio_url(audio_data),
+        })
+        if seq == 0:
+            observe_first_audio(turn_start)
+        turn.sent.append(chunk_text)
+    response = " ".join(turn.sent)
+    print(f"Response: {response}")
+    turn.response = response
+    chat_history.append({"role": "assistant", "content": response})
+    turn.committed = True
+    await websocket.send_json({"type": "response", "text": response})
+    await websocket.send_json({"type": "audio_end", "chunks": len(turn.sent)})
+
+
+async def run_reply(websocket: WebSocket, chat_history, stream, turn_start, turn):
+    try:
+        await reply(websocket, chat_history, stream, turn_start, turn)
+    except Exception as e:
+        # LLM down or timed out, TTS or ASR failure: report it and keep the
+        # session open, the client is not waiting for this reply any more
+        if not isinstance(e, LLMError):
+            print(f"Reply failed: {e}")
+        turn.closed = True
+        try:
+            await websocket.send_json({"type": "error", "message": str(e)})
+        except Exception as send_error:
+            # The socket is already gone
+            print(f"Could not report the failed reply: {send_error}")
+
+
+def start_reply(websocket: WebSocket, chat_history, stream=False, turn_start=None):
+    """Run the reply as its own task, so the session keeps reading messages
+    (interrupts, playback progress, new audio) while it is generated"""
+    turn = ReplyTurn()
+    turn.task = asyncio.create_task(run_reply(websocket, chat_history, stream, turn_start, turn))
+    return turn
+
+
+async def interrupt(websocket: WebSocket, chat_history, turn, played=None):
+    """Barge-in: abort the reply if it is still running and keep only what
+    the client played of it in chat_history"""
+    if turn is None or turn.closed or (turn.played is None and played is None and not turn.running):
+        return
+    turn.closed = True
+    if played is not None:
+        turn.played = played
+    if turn.running:
+        turn.task.cancel()
+        try:
+            await turn.task
+        except asyncio.CancelledError:
+            pass
+        INTERRUPTIONS.inc()
+    heard = turn.heard()
+    if turn.committed:
+        if heard == turn.response:
+            return
+        # Finished generating, but playback was cut short
+        if heard:
+            chat_history[-1]["content"] = heard
+        else:
+            chat_history.turns.pop()
+    elif heard:
+        chat_history.append({"role": "assistant", "content": heard})
+    print(f"Interrupted after {len(heard.split())} words: {heard}")
+    await websocket.send_json({"type": "interrupted", "played": turn.played, "text": heard})
+
+
+async def answer(websocket: WebSocket, chat_history, transcription, stream=False, turn_start=None):
+    """Send the transcript of a spoken turn and start replying to it.
+    Returns the ReplyTurn, or None when there is nothing to answer."""
+    await websocket.send_json({"type": "transcription", "text": transcription})
+    if not transcription.strip():
+        # The VAD found no speech, nothing to answer
+        return None
+    chat_history.append({"role": "user", "content": transcription})
+    return start_reply(websocket, chat_history, stream, turn_start)
+
+
+async def send_partial(websocket: WebSocket, samples):
+    try:
+        text = await runner.partial_transcript(samples)
+        if text:
+            await websocket.send_json({"type": "partial_transcript", "text": text})
+    except Exception as e:
+        print(f"Partial transcript failed: {e}")
+
+
+def parse_control(text):
+    """{"type": ...} JSON control message from the client, else None"""
+    if not text.startswith("{"):
+        return None
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) and "type" in message else None
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # Client opts into chunked audio with /ws?stream=1
+    stream = websocket.query_params.get("stream", "0").lower() in ("1", "true")
+    # /ws?audio=stream: bytes are 16 kHz PCM_16 frames of a live mic stream
+    # instead of one whole utterance per message
+    audio_stream = AudioStreamSession() if websocket.query_params.get("audio") == "stream" else None
+    partial_task = None
+    if not await wait_for_models(websocket):
+        return
+    ACTIVE_SESSIONS.inc()
+    # Reply in flight, cancelled when the user barges in
+    turn = None
     try:
-        chat_history = []
+        # Token-budgeted history with a stable, prefix-cacheable prompt
+        chat_history = ChatContext()
         while True:
             data = await websocket.receive()
-            if "text" in data:
+            if data.get("type") == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
+            if "text" in data and data["text"] is not None:
                 text = data["text"]
+                control = parse_control(text)
+                if control is not None:
+                    if control["type"] == "playback" and turn is not None:
+                        # Client progress: number of audio messages played so far
+                        turn.played = control.get("played")
+                    elif control["type"] == "interrupt":
+                        await interrupt(websocket, chat_history, turn, control.get("played"))
+                    elif control["type"] == "end_of_speech" and audio_stream is not None:
+                        # Client-side endpoint, e.g. push-to-talk released
+                        turn_start = time.perf_counter()
+                        samples = audio_stream.finalize()
+                        if samples is not None:
+                            if partial_task is not None:
+                                partial_task.cancel()
+                            await interrupt(websocket, chat_history, turn)
+                            transcription = await runner.transcribe_samples(samples)
+                            turn = await answer(websocket, chat_history, transcription, stream, turn_start) or turn
+                    continue
+                await interrupt(websocket, chat_history, turn)
                 await websocket.send_json({"type": "transcription", "text": text})
                 chat_history.append({"role": "user", "content": text})
-                
-                response = pipeline.generate_response(chat_history)
-                chat_history.append({"role": "assistant", "content": response})
-                
-                
-                await websocket.send_json({"type": "response", "text": response})
-                
-                audio_data = pipeline.generate_speech(response)
-                # print(f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}")
-                await websocket.send_json({
-                            "type": "audio",
-                            "audioUrl": f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}"
-                        })
-                    
+                turn = start_reply(websocket, chat_history, stream)
+
+            elif "bytes" in data and audio_stream is not None:
+                turn_start = time.perf_counter()
+                events = audio_stream.feed(data["bytes"])
+                if turn is not None and turn.running and audio_stream.in_utterance and \
+                        audio_stream.speech_frames * audio_stream.vad.frame_ms >= BARGE_IN_MS:
+                    # The user talks over the reply
+                    await interrupt(websocket, chat_history, turn)
+                for kind, samples in events:
+                    if kind == "partial":
+                        # At most one partial decode in flight per session
+                        if partial_task is None or partial_task.done():
+                            partial_task = asyncio.create_task(send_partial(websocket, samples))
+                    else:
+                        if partial_task is not None:
+                            partial_task.cancel()
+                        await interrupt(websocket, chat_history, turn)
+                        transcription = await runner.transcribe_samples(samples)
+                        turn = await answer(websocket, chat_history, transcription, stream, turn_start) or turn
+
             elif "bytes" in data:
 
-                audio_bytes = data["bytes"]    
-                
-                transcription = pipeline.process_audio_file(audio_bytes)
-                
-                chat_history.append({"role": "user", "content": transcription})
-                response = pipeline.generate_response(chat_history)
-                print(f"Response: {response}")
-                chat_history.append({"role": "assistant", "content": response})
-                
-                await websocket.send_json({"type": "transcription", "text": transcription})
-                await websocket.send_json({"type": "response", "text": response})
-                
+                audio_bytes = data["bytes"]
+                turn_start = time.perf_counter()
+                # A new utterance while the last reply is still going: barge-in
+                await interrupt(websocket, chat_history, turn)
+
+                transcription = await runner.transcribe(audio_bytes)
+
 
                 # with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
                 #     pipeline.generate_speech(response)
@@ -71,30 +408,53 @@ async def websocket_endpoint(websocket: WebSocket):
                 #         })
                 #     os.unlink(temp_file.name)
                 # os.unlink(temp_file_path)
-                
-                audio_data = pipeline.generate_speech(response)
-                # print(f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}")
-                await websocket.send_json({
-                            "type": "audio",
-                            "audioUrl": f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}"
-                        })
-                
+
+                turn = await answer(websocket, chat_history, transcription, stream, turn_start) or turn
+
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         await websocket.send_json({"type": "error", "message": str(e)})
         print(f"Error: {e}")
+    finally:
+        ACTIVE_SESSIONS.dec()
+        if partial_task is not None:
+            partial_task.cancel()
+        if turn is not None and turn.running:
+            turn.task.cancel()
 
-def run_server():
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=7575,
-        ssl_certfile="ssl-localhost/server_cert.pem",
-        ssl_keyfile="ssl-localhost/server_key.pem",
-        log_level="debug",
+def start_model_server(socket_path):
+    """Model host for WEB_WORKERS > 1, inheriting this environment"""
+    server = subprocess.Popen(
+        [sys.executable, "model_server.py", "--socket", socket_path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
     )
+    print(f"Model server started (pid {server.pid}) on {socket_path}")
+    return server
+
+
+def run_server():
+    # WEB_WORKERS > 1: several websocket processes share one model server
+    # instead of each loading its own Whisper and Kokoro
+    workers = int(os.environ.get("WEB_WORKERS", 1))
+    model_server = None
+    if workers > 1 and not os.environ.get("MODEL_SERVER_SOCKET"):
+        os.environ["MODEL_SERVER_SOCKET"] = "/tmp/voice_model_server.sock"
+        model_server = start_model_server(os.environ["MODEL_SERVER_SOCKET"])
+    try:
+        uvicorn.run(
+            "app:app" if workers > 1 else app,
+            host="0.0.0.0",
+            port=7575,
+            workers=workers,
+            ssl_certfile="ssl-localhost/server_cert.pem",
+            ssl_keyfile="ssl-localhost/server_key.pem",
+            log_level="debug",
+        )
+    finally:
+        if model_server is not None:
+            model_server.terminate()
+            model_server.wait()
 
 if __name__ == "__main__":
-    pipeline = SpeechProcessingPipeline()
-    run_server()
\ No newline at end of file
+    run_server()
@@ -1,11 +1,29 @@
+"""Voice chat with a turn detector deciding when the user is done.
+
+The client either sends transcript fragments as text (plain text, or
+{"type": "transcript", "text": ..., "final": false} for interim results
+that replace each other), or streams 16 kHz mono PCM_16 frames as bytes,
+transcribed here. Every connection gets its own TurnTaker: VAD silence and
+the EOU probability of the transcript decide when the turn is over, and
+the reply (LLM + TTS) runs exactly once per turn.
+
+Once the EOU probability reaches TURN_LIKELY_THRESHOLD the reply is
+started speculatively (with its speech too when TURN_SPECULATE_TTS=1) and
+used if the turn is confirmed with the same text, cancelled otherwise.
+"""
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import asyncio
 import os
-import tempfile
-import base64
-from pipeline import SpeechProcessingPipeline
-from turn_detector import TurnDetector
+import time
+from app import audio_url, build_pipeline, build_runner, parse_control
+from audio_stream import AudioStreamSession
+from chat_context import ChatContext
+from llm_client import LLMError
+from speculation import Speculator
+from turn_detector import EOUScorer, EOUState, TurnDetector
+from turn_taking import SPEAKING, TurnTaker
 
 app = FastAPI()
 
@@ -18,69 +36,214 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-text_buffer = []
-turn_detector = TurnDetector()
-_is_turn = False
+# Shared by every session; per-session state lives in TurnSession
+pipeline = None
+runner = None
+eou_scorer = None
+models_loaded = None
+
+TICK_S = float(os.environ.get("TURN_TICK_MS", 50)) / 1000
+SPECULATE_TTS = os.environ.get("TURN_SPECULATE_TTS", "0") == "1"
+
+
+@app.on_event("startup")
+async def start_models():
+    global pipeline, runner, eou_scorer, models_loaded
+    models_loaded = asyncio.Event()
+    pipeline = build_pipeline()
+    runner = build_runner(pipeline)
+
+    async def load():
+        global eou_scorer
+        try:
+            detector, _ = await asyncio.gather(
+                asyncio.to_thread(TurnDetector),
+                asyncio.to_thread(pipeline.initialize_models),
+            )
+            eou_scorer = EOUScorer(detector)
+        except Exception as e:
+            print(f"Model initialization failed: {e}")
+        finally:
+            models_loaded.set()
+
+    app.state.model_loader = asyncio.create_task(load())
+
+
+class TurnSession:
+    """State of one connection: turn taking, EOU cache, chat history and
+    the tasks working for it"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.taker = TurnTaker()
+        self.eou_state = EOUState()
+        self.chat_history = ChatContext()
+        self.speculator = Speculator()
+        # Created on the first audio frame; its endpoint produces the final
+        # transcript as soon as the turn could end
+        self.stream = None
+        self.last_speech_end = None
+        # Bumped on every final transcript so late partials are dropped
+        self.utterance = 0
+        self.tasks = set()
+        self.response_task = None
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def on_text(self, text):
+        message = parse_control(text)
+        now = time.monotonic()
+        if message is None:
+            fragment, final = text, True
+        elif message["type"] == "transcript":
+            fragment, final = message.get("text", ""), message.get("final", True)
+        else:
+            return
+        # No audio from this client: the fragments are the speech activity
+        self.taker.speech(now)
+        self.taker.add_text(fragment, now, final)
+
+    def on_audio(self, pcm_bytes):
+        if self.stream is None:
+            self.stream = AudioStreamSession(endpoint_ms=self.taker.min_silence_ms)
+        events = self.stream.feed(pcm_bytes)
+        if self.stream.last_speech_end is not None and self.stream.last_speech_end != self.last_speech_end:
+            self.taker.speech(time.monotonic())
+        self.last_speech_end = self.stream.last_speech_end
+        for kind, samples in events:
+            if kind == "final":
+                self.utterance += 1
+                self.taker.final_pending()
+                self.spawn(self.transcribe_final(samples))
+            else:
+                self.spawn(self.transcribe_partial(samples, self.utterance))
+        self.taker.utterance(self.stream.in_utterance)
+
+    async def transcribe_partial(self, samples, utterance):
+        try:
+            text = await runner.partial_transcript(samples)
+        except Exception as e:
+            print(f"Partial transcript failed: {e}")
+            return
+        if text and utterance == self.utterance:
+            self.taker.add_text(text, time.monotonic(), final=False)
+            await self.websocket.send_json({"type": "partial_transcript", "text": text})
+
+    async def transcribe_final(self, samples):
+        try:
+            text = await runner.transcribe_samples(samples)
+        except Exception as e:
+            print(f"Transcription failed: {e}")
+            text = ""
+        self.taker.add_text(text, time.monotonic(), final=True)
+        if text.strip():
+            await self.websocket.send_json({"type": "transcription", "text": text})
+
+    async def score(self, version, text):
+        messages = list(self.chat_history.turns[-1:]) + [{"role": "user", "content": text}]
+        try:
+            prob = await eou_scorer.score(messages, self.eou_state)
+        except Exception as e:
+            print(f"EOU scoring failed: {e}")
+            prob = 0.0
+        self.taker.eou_result(version, prob)
+
+    async def prepare_reply(self, text, speak=True):
+        """Reply to text without touching the chat history, so it can run
+        before the turn is confirmed: (history with the reply's user turn,
+        response, audio or None)"""
+        history = self.chat_history.fork({"role": "user", "content": text})
+        response = await runner.respond(history)
+        audio_data = await runner.speak(response) if speak else None
+        return history, response, audio_data
+
+    async def respond(self, text):
+        prepared = self.speculator.take(text)
+        if prepared is None:
+            prepared = self.prepare_reply(text)
+        try:
+            await self.websocket.send_json({"type": "turn", "text": text})
+            history, response, audio_data = await prepared
+            self.chat_history.append(history[-1])
+            self.chat_history.append({"role": "assistant", "content": response})
+            self.chat_history.usage.extend(history.usage)
+            await self.websocket.send_json({"type": "response", "text": response})
+            if audio_data is None:
+                audio_data = await runner.speak(response)
+            await self.websocket.send_json({"type": "audio", "audioUrl": audio_url(audio_data)})
+        except Exception as e:
+            # LLM down or timed out, TTS or model server failure: report it,
+            # the client is not waiting for this reply any more
+            if not isinstance(e, LLMError):
+                print(f"Reply failed: {e}")
+            try:
+                await self.websocket.send_json({"type": "error", "message": str(e)})
+            except Exception as send_error:
+                # The socket is already gone
+                print(f"Could not report the failed reply: {send_error}")
+        finally:
+            self.taker.end_response()
+
+    async def run(self):
+        """Tick the turn taker: start EOU scoring when the transcript has
+        settled, start the reply when the turn has ended"""
+        while True:
+            await asyncio.sleep(TICK_S)
+            now = time.monotonic()
+            request = self.taker.eou_request(now)
+            if request is not None:
+                self.spawn(self.score(*request))
+            text = self.taker.poll(now)
+            if text is not None:
+                print(f"Turn {self.taker.turns}: {text} (speculation hit rate {self.speculator.hit_rate:.0%})")
+                self.response_task = self.spawn(self.respond(text))
+            elif self.taker.state == SPEAKING:
+                # The user went on: a reply to older text is no use
+                self.speculator.discard(self.taker.text)
+                if self.taker.eou_current:
+                    self.speculator.consider(self.taker.text, self.taker.eou_prob,
+                                             lambda text: self.prepare_reply(text, speak=SPECULATE_TTS))
+
+    def close(self):
+        self.speculator.discard()
+        for task in list(self.tasks):
+            task.cancel()
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    if not models_loaded.is_set():
+        await websocket.send_json({"type": "status", "state": "loading"})
+        await models_loaded.wait()
+    if eou_scorer is None or not pipeline.ready.is_set():
+        await websocket.send_json({"type": "error", "message": "Models failed to load"})
+        await websocket.close(code=1011)
+        return
+
+    session = TurnSession(websocket)
+    session.spawn(session.run())
     try:
-        chat_history = []
         while True:
             data = await websocket.receive()
-            
-            if "text" in data:
-                text = data["text"]
-                await websocket.send_json({"type": "transcription", "text": text})
-                # Turn Detector
-                if not _is_turn:
-                    text_buffer.append(text_buffer)
-                    current_text = " ".join(text_buffer)
-                    print(current_text)
-                    messages = [{"role": "user", "content": current_text}]
-                    eou_prob = turn_detector.calculate_eou(messages)
-                    if eou_prob >= turn_detector.EOU_THRESHOLD:
-                        _is_turn = True
-                
-                        response = pipeline.generate_response(text)
-                        await websocket.send_json({"type": "response", "text": response})
-                        
-                        audio_data = pipeline.generate_speech(response)
-                        # print(f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}")
-                        await websocket.send_json({
-                                    "type": "audio",
-                                    "audioUrl": f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}"
-                                })
-                    
-            elif "bytes" in data:
-
-                audio_data = data["bytes"]
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                    temp_file.write(audio_data)
-                    temp_file_path = temp_file.name
-                
-                transcription, response = pipeline.process_audio_file(temp_file_path)
-                await websocket.send_json({"type": "transcription", "text": transcription})
-                await websocket.send_json({"type": "response", "text": response})
-                
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                    pipeline.generate_speech(response)
-                    temp_file.close()
-                    with open(temp_file.name, "rb") as audio_file:
-                        audio_data = audio_file.read()
-                        await websocket.send_json({
-                            "type": "audio",
-                            "audioUrl": f"data:audio/wav;base64,{base64.b64encode(audio_data).decode('utf-8')}"
-                        })
-                    os.unlink(temp_file.name)
-                os.unlink(temp_file_path)
-                
+            if data.get("type") == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
+            if data.get("text") is not None:
+                session.on_text(data["text"])
+            elif data.get("bytes") is not None:
+                session.on_audio(data["bytes"])
+
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         await websocket.send_json({"type": "error", "message": str(e)})
         print(f"Error: {e}")
+    finally:
+        session.close()
 
 def run_server():
     uvicorn.run(
@@ -93,5 +256,4 @@ def run_server():
     )
 
 if __name__ == "__main__":
-    pipeline = SpeechProcessingPipeline()
-    run_server()
\ No newline at end of file
+    run_server()
@@ -0,0 +1,45 @@
+import os
+import torch
+from torch import nn
+from transformers import AutoModelForSpeechSeq2Seq
+
+# name -> (load dtype, int8 dynamic quantization of nn.Linear)
+ASR_BACKENDS = {
+    "torch-fp16": (torch.float16, False),
+    "torch-fp32": (torch.float32, False),
+    "torch-int8": (torch.float32, True),
+}
+
+
+def select_asr_backend(device, backend=None):
+    """Backend name for this device: ASR_BACKEND env or argument, else auto.
+    Auto is fp16 on CUDA and int8-quantized Linear layers on CPU, where fp16
+    matmuls have no fast kernels."""
+    backend = backend or os.environ.get("ASR_BACKEND", "auto")
+    if backend == "auto":
+        backend = "torch-fp16" if device == "cuda" else "torch-int8"
+    if backend not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR backend {backend!r}, expected one of {list(ASR_BACKENDS)}")
+    if backend == "torch-int8" and device != "cpu":
+        raise ValueError("torch-int8 dynamic quantization only runs on CPU")
+    return backend
+
+
+def asr_dtype(backend):
+    """dtype of the input features the backend expects"""
+    return ASR_BACKENDS[backend][0]
+
+
+def load_whisper_model(model_dir, device, backend):
+    dtype, quantize = ASR_BACKENDS[backend]
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(
+        model_dir,
+        torch_dtype=dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True,
+    ).to(device)
+    if quantize:
+        # Weights of every Linear to int8, activations quantized on the fly
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
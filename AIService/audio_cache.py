@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+
+
+def float_to_pcm16(audio):
+    """Float waveform in [-1, 1] -> 16-bit little-endian PCM bytes"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class SpeechCache:
+    """Two-tier cache of synthesized speech as raw 16-bit PCM.
+
+    Keyed on (normalized text, voice file, speed). Tier 1 is an in-memory
+    LRU, tier 2 a content-addressed directory (<dir>/<h[:2]>/<h>.pcm) shared
+    by every process on the host. Both evict least recently used entries to
+    stay under their byte budget. A hit skips G2P and the ONNX run entirely.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_bytes=None, disk_bytes=None):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes or int(os.environ.get("TTS_CACHE_MEMORY_MB", 64)) * 2 ** 20
+        self.disk_bytes = disk_bytes or int(os.environ.get("TTS_CACHE_DISK_MB", 1024)) * 2 ** 20
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.disk_used = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.disk_used = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split())
+
+    @classmethod
+    def key(cls, text, voice_file, speed):
+        raw = f"{cls.normalize(text)}\0{voice_file}\0{float(speed):.4f}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pcm")
+
+    def get(self, text, voice_file, speed):
+        key = self.key(text, voice_file, speed)
+        with self._lock:
+            pcm = self.memory.get(key)
+            if pcm is not None:
+                self.memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return pcm
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+                # mtime is the disk tier's LRU clock
+                os.utime(path)
+            except FileNotFoundError:
+                pcm = None
+            if pcm is not None:
+                with self._lock:
+                    self.hits["disk"] += 1
+                self._put_memory(key, pcm)
+                return pcm
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, voice_file, speed, pcm):
+        key = self.key(text, voice_file, speed)
+        self._put_memory(key, pcm)
+        if self.cache_dir:
+            self._put_disk(key, pcm)
+
+    def get_or_synthesize(self, text, voice_file, speed, synthesize):
+        """Cached PCM for text, else synthesize(text) -> PCM bytes and store it"""
+        pcm = self.get(text, voice_file, speed)
+        if pcm is None:
+            pcm = synthesize(text)
+            self.put(text, voice_file, speed, pcm)
+        return pcm
+
+    def _put_memory(self, key, pcm):
+        if len(pcm) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_used -= len(old)
+            self.memory[key] = pcm
+            self.memory_used += len(pcm)
+            while self.memory_used > self.memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= len(evicted)
+
+    def _put_disk(self, key, pcm):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so other processes never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.disk_used += len(pcm)
+            over_budget = self.disk_used > self.disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".pcm"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _evict_disk(self):
+        # Drop oldest entries down to 90% of the budget, so this scan is rare
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        used = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for path, size, _ in entries:
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+        with self._lock:
+            self.disk_used = used
+
+    def stats(self):
+        return {
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_used,
+            "disk_bytes": self.disk_used,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+        }
+
+
+def prewarm(cache, tts_engine, phrases, voice_file, speed):
+    """Synthesize every phrase, and each of its sentences, into the cache"""
+    from text_chunking import split_sentences
+
+    def synthesize(text):
+        tokens, ref_s = tts_engine.prepare_inputs(text, voice_file=voice_file)
+        return float_to_pcm16(tts_engine.synthesize(tokens, ref_s, speed=speed)[0])
+
+    n_new = 0
+    for phrase in phrases:
+        for text in dict.fromkeys([phrase, *split_sentences(phrase)]):
+            if cache.get(text, voice_file, speed) is None:
+                cache.put(text, voice_file, speed, synthesize(text))
+                n_new += 1
+    return n_new
+
+
+if __name__ == "__main__":
+    from kokoro_onnx import DEFAULT_SPEED, DEFAULT_VOICE, KokoroTTS
+
+    parser = argparse.ArgumentParser(description="Pre-warm the TTS audio cache from a phrase list (one per line)")
+    parser.add_argument("phrases", help="text file with one phrase per line")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--voice", default=DEFAULT_VOICE)
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED)
+    args = parser.parse_args()
+
+    with open(args.phrases, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip()]
+    cache = SpeechCache(cache_dir=args.cache_dir)
+    n_new = prewarm(cache, KokoroTTS(model_dir=args.model_dir), phrases, args.voice, args.speed)
+    print(f"Pre-warmed {n_new} new entries from {len(phrases)} phrases into {args.cache_dir}")
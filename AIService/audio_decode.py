@@ -0,0 +1,61 @@
+from functools import lru_cache
+from math import gcd
+import numpy as np
+
+PCM16_SCALE = np.float32(1 / 32768)
+# Below this peak the input is treated as silence and left unscaled,
+# instead of blowing the noise floor up to full scale (or dividing by 0)
+MIN_PEAK = 1e-4
+
+
+def decode_pcm16(audio_bytes, channels=1):
+    """Little-endian 16-bit PCM bytes -> float32 in [-1, 1).
+    The int16 view is zero-copy, the float32 result is the only allocation."""
+    usable = len(audio_bytes) - len(audio_bytes) % (2 * channels)
+    pcm = np.frombuffer(audio_bytes, dtype="<i2", count=usable // 2)
+    audio = np.multiply(pcm, PCM16_SCALE, dtype=np.float32)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return audio
+
+
+def normalize_peak(audio, min_peak=MIN_PEAK):
+    """Scale audio in place to a peak of 1, silent input is returned as is"""
+    if len(audio) == 0:
+        return audio
+    peak = max(float(audio.max()), -float(audio.min()))
+    if peak >= min_peak:
+        audio *= np.float32(1 / peak)
+    return audio
+
+
+class PolyphaseResampler:
+    """Rational-ratio resampler with the anti-aliasing FIR designed once.
+    Same filter scipy.signal.resample_poly would build on every call.
+    scipy is only imported here, input already at the target rate never
+    needs it."""
+
+    def __init__(self, source_rate, target_rate, half_len=10, beta=5.0):
+        from scipy import signal
+
+        divisor = gcd(source_rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = source_rate // divisor
+        max_rate = max(self.up, self.down)
+        self.taps = signal.firwin(2 * half_len * max_rate + 1, 1 / max_rate, window=("kaiser", beta)).astype(np.float32)
+
+    def __call__(self, audio):
+        from scipy import signal
+
+        return signal.resample_poly(audio, self.up, self.down, window=self.taps).astype(np.float32, copy=False)
+
+
+@lru_cache(maxsize=16)
+def get_resampler(source_rate, target_rate):
+    return PolyphaseResampler(source_rate, target_rate)
+
+
+def resample(audio, source_rate, target_rate):
+    if source_rate == target_rate:
+        return audio
+    return get_resampler(source_rate, target_rate)(audio)
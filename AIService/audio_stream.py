@@ -0,0 +1,129 @@
+import os
+import numpy as np
+from audio_decode import decode_pcm16
+from vad import EnergyVAD
+
+
+class PCMRingBuffer:
+    """Fixed-size float32 ring buffer addressed by absolute sample index.
+
+    total counts every sample ever appended, so absolute indices follow the
+    stream; only the last capacity samples can be read back. A chunk longer
+    than the buffer keeps just its tail, stored at its own absolute indices.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.total = 0
+
+    @property
+    def oldest(self):
+        return max(self.total - self.capacity, 0)
+
+    def append(self, samples):
+        # The head of an oversized chunk would be overwritten anyway: skip it,
+        # but still count it so the tail lands at its real position
+        skipped = max(len(samples) - self.capacity, 0)
+        self.total += skipped
+        samples = samples[skipped:]
+        pos = self.total % self.capacity
+        first = min(len(samples), self.capacity - pos)
+        self.buffer[pos:pos + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.total += len(samples)
+
+    def read(self, start, end=None):
+        """Copy of samples [start, end) in absolute indices, clamped to what is kept"""
+        end = self.total if end is None else min(end, self.total)
+        start = max(start, self.oldest)
+        if start >= end:
+            return np.zeros(0, dtype=np.float32)
+        a, b = start % self.capacity, end % self.capacity
+        if a < b:
+            return self.buffer[a:b].copy()
+        return np.concatenate((self.buffer[a:], self.buffer[:b]))
+
+
+class AudioStreamSession:
+    """Per-websocket state of the streaming audio protocol.
+
+    The client sends 16 kHz mono 16-bit PCM in small frames. Each frame is
+    appended to a ring buffer and classified by the VAD (level relative to
+    the loudest frame so far in the session). While the user speaks, feed()
+    asks for a partial transcript of the last partial_window_s seconds every
+    partial_interval_ms; after endpoint_ms of silence it returns the whole
+    utterance for the final transcript. Utterances shorter than
+    min_speech_ms of speech are dropped as noise.
+    """
+
+    def __init__(self, sample_rate=16000, buffer_seconds=30, partial_window_s=None,
+                 partial_interval_ms=None, endpoint_ms=None, min_speech_ms=200, vad=None):
+        self.sample_rate = sample_rate
+        self.ring = PCMRingBuffer(int(buffer_seconds * sample_rate))
+        self.partial_window = int(float(partial_window_s or os.environ.get("STREAM_PARTIAL_WINDOW_S", 8)) * sample_rate)
+        self.partial_interval = int(int(partial_interval_ms or os.environ.get("STREAM_PARTIAL_INTERVAL_MS", 500)) * sample_rate / 1000)
+        self.endpoint_ms = int(endpoint_ms or os.environ.get("STREAM_ENDPOINT_MS", 700))
+        self.min_speech_ms = min_speech_ms
+        # Live mic input is not peak-normalized, so the absolute floor does
+        # the work until the first loud frame sets the reference level
+        self.vad = vad or EnergyVAD(floor_db=float(os.environ.get("STREAM_FLOOR_DB", -45)))
+        self.frame = int(sample_rate * self.vad.frame_ms / 1000)
+        # Utterances are finalized before the ring buffer overwrites their start
+        self.max_utterance = self.ring.capacity - self.partial_interval
+        self.peak_db = -np.inf
+        self.analyzed = 0
+        self.reset()
+
+    def reset(self):
+        self.utterance_start = None
+        self.last_speech_end = None
+        self.speech_frames = 0
+        self.last_partial = 0
+
+    @property
+    def in_utterance(self):
+        return self.utterance_start is not None
+
+    def feed(self, pcm_bytes):
+        """Append one PCM frame, returns a list of ("partial" | "final", samples)"""
+        self.ring.append(decode_pcm16(pcm_bytes))
+        events = []
+        end = self.ring.total - (self.ring.total - self.analyzed) % self.frame
+        if end > self.analyzed:
+            level_db, zcr = self.vad.frame_features(self.ring.read(self.analyzed, end), self.sample_rate)
+            self.peak_db = max(self.peak_db, level_db.max())
+            speech = self.vad.classify(level_db, zcr, self.peak_db)
+            voiced = np.flatnonzero(speech)
+            if len(voiced):
+                if not self.in_utterance:
+                    pad = int(self.vad.pad_ms * self.sample_rate / 1000)
+                    self.utterance_start = max(self.analyzed + voiced[0] * self.frame - pad, self.ring.oldest)
+                    self.last_partial = self.analyzed + voiced[0] * self.frame
+                self.last_speech_end = self.analyzed + (voiced[-1] + 1) * self.frame
+                self.speech_frames += len(voiced)
+            self.analyzed = end
+
+        if not self.in_utterance:
+            return events
+        silence_ms = (self.analyzed - self.last_speech_end) * 1000 / self.sample_rate
+        if silence_ms >= self.endpoint_ms or self.ring.total - self.utterance_start >= self.max_utterance:
+            final = self.finalize()
+            if final is not None:
+                events.append(("final", final))
+        elif self.ring.total - self.last_partial >= self.partial_interval:
+            self.last_partial = self.ring.total
+            start = max(self.utterance_start, self.ring.total - self.partial_window)
+            events.append(("partial", self.ring.read(start)))
+        return events
+
+    def finalize(self):
+        """End the current utterance now (endpoint or client end-of-speech),
+        returns its samples or None when there was no real speech"""
+        if not self.in_utterance:
+            return None
+        pad = int(self.vad.pad_ms * self.sample_rate / 1000)
+        samples = self.ring.read(self.utterance_start, self.last_speech_end + pad)
+        enough = self.speech_frames * self.vad.frame_ms >= self.min_speech_ms
+        self.reset()
+        return samples if enough else None
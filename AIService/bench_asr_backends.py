@@ -0,0 +1,80 @@
+"""Word error rate and real-time factor of the ASR backends.
+
+Transcribes each file with every backend. WER is measured against
+--reference (one line of text per file) or, without it, against the first
+backend in --backends (the current fp16 path by default).
+RTF = transcription time / audio duration, lower is better.
+
+    python bench_asr_backends.py ../audio.wav test.wav --backends torch-fp16 torch-fp32 torch-int8
+"""
+import argparse
+import gc
+import json
+import re
+import time
+import soundfile as sf
+from pipeline import SpeechProcessingPipeline
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """(substitutions + deletions + insertions) / reference words"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def load_audio(pipeline, path):
+    audio_data, sample_rate = sf.read(path, dtype="float32")
+    audio_data, sample_rate = pipeline.load_audio_file(audio_data, sample_rate)
+    audio_data, sample_rate = pipeline.preprocess_audio(audio_data, sample_rate)
+    return audio_data, sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--backends", nargs="+", default=["torch-fp16", "torch-fp32", "torch-int8"])
+    parser.add_argument("--reference", help="text file, one reference transcript per input file")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # file index -> reference text; filled by the first backend when no --reference
+    references = {}
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            references = dict(enumerate(line.strip() for line in f))
+
+    for backend in args.backends:
+        pipeline = SpeechProcessingPipeline(asr_backend=backend, warmup_steps=1)
+        for i, path in enumerate(args.files):
+            audio_data, sample_rate = load_audio(pipeline, path)
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                text = pipeline.transcribe_audio(audio_data, sample_rate)
+            seconds = (time.perf_counter() - start) / args.repeats
+            references.setdefault(i, text)
+            print(json.dumps({
+                "backend": backend,
+                "device": pipeline.device,
+                "file": path,
+                "rtf": round(seconds / (len(audio_data) / sample_rate), 3),
+                "seconds": round(seconds, 3),
+                "wer": round(word_error_rate(references[i], text), 4),
+                "text": text,
+            }))
+        del pipeline
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
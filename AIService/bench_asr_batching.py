@@ -0,0 +1,83 @@
+"""Throughput / latency trade-off of cross-session Whisper micro-batching.
+
+N simulated sessions submit utterances concurrently through a MicroBatcher
+over pipeline.transcribe_batch; one line of JSON per max batch size.
+
+    python bench_asr_batching.py --batch-sizes 1 2 4 8 --sessions 8
+    python bench_asr_batching.py --stub          # no models, StubPipeline timings
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from batching import MicroBatcher
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def load_utterance(pipeline, path):
+    import soundfile as sf
+    audio_data, sample_rate = sf.read(path, dtype="float32")
+    audio_data, sample_rate = pipeline.load_audio_file(audio_data, sample_rate)
+    audio_data, _ = pipeline.preprocess_audio(audio_data, sample_rate)
+    return audio_data
+
+
+def run(pipeline, audio, batch_size, wait_ms, sessions, per_session):
+    batcher = MicroBatcher(pipeline.transcribe_batch, max_batch_size=batch_size,
+                           max_wait_ms=wait_ms, name="bench-batcher")
+    latencies = []
+
+    def session():
+        for _ in range(per_session):
+            start = time.perf_counter()
+            batcher.submit(audio).result()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        for future in [pool.submit(session) for _ in range(sessions)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    batcher.close()
+    return {
+        "max_batch_size": batch_size,
+        "max_wait_ms": wait_ms,
+        "sessions": sessions,
+        "utterances": len(latencies),
+        "mean_batch_size": round(batcher.mean_batch_size, 2),
+        "utterances_per_s": round(len(latencies) / elapsed, 2),
+        "latency_mean_s": round(statistics.mean(latencies), 3),
+        "latency_p95_s": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", default="test.wav")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--per-session", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="use StubPipeline instead of real models")
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_pipeline import StubPipeline
+        pipeline = StubPipeline()
+        audio = b""
+    else:
+        from pipeline import SpeechProcessingPipeline
+        pipeline = SpeechProcessingPipeline()
+        audio = load_utterance(pipeline, args.audio)
+
+    for batch_size in args.batch_sizes:
+        print(json.dumps(run(pipeline, audio, batch_size, args.wait_ms, args.sessions, args.per_session)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time and memory per second of audio of the PCM decode + resample path.
+
+Compares the previous path (BytesIO + soundfile RAW decode, several dtype
+conversions, librosa.resample per call) with audio_decode (np.frombuffer
+view, one float32 allocation, cached polyphase filter). Memory is the
+tracemalloc peak of one call, relative to the int16 input size.
+
+    python bench_audio_decode.py --seconds 5 --rate 16000 --rate 48000
+"""
+import argparse
+import io
+import time
+import tracemalloc
+import numpy as np
+from audio_decode import decode_pcm16, normalize_peak, resample
+
+
+def previous_path(audio_bytes, rate):
+    import librosa
+    import soundfile as sf
+
+    audio_data, _ = sf.read(io.BytesIO(audio_bytes), channels=1, samplerate=rate, subtype="PCM_16", format="RAW")
+    audio_data = audio_data.astype(np.float32)
+    audio_data = audio_data.astype("float32")
+    audio_data /= np.max(np.abs(audio_data))
+    if rate != 16000:
+        audio_data = librosa.resample(audio_data, orig_sr=rate, target_sr=16000)
+    return audio_data
+
+
+def current_path(audio_bytes, rate):
+    return normalize_peak(resample(decode_pcm16(audio_bytes), rate, 16000))
+
+
+def measure(fn, audio_bytes, rate, seconds, repeats):
+    fn(audio_bytes, rate)  # filter design / imports out of the timing
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(audio_bytes, rate)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    fn(audio_bytes, rate)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ms_per_audio_second": round(elapsed * 1000 / seconds, 4),
+        "peak_bytes": peak,
+        "peak_x_input": round(peak / len(audio_bytes), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=int, action="append", help="source sample rate, repeatable")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rate in args.rate or [16000, 48000]:
+        n = int(args.seconds * rate)
+        t = np.arange(n) / rate
+        wave = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(n)
+        audio_bytes = (wave * 32767).astype("<i2").tobytes()
+        for name, fn in (("previous", previous_path), ("current", current_path)):
+            try:
+                result = measure(fn, audio_bytes, rate, args.seconds, args.repeats)
+            except ImportError as e:
+                print(f"{rate} Hz {name:9s} skipped: {e}")
+                continue
+            print(f"{rate} Hz {name:9s} {result['ms_per_audio_second']:8.4f} ms/s audio, "
+                  f"peak {result['peak_bytes'] / 1024:8.1f} KiB ({result['peak_x_input']}x input)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""End-to-end voice-turn benchmark over the websocket service.
+
+Starts app.py in-process (or targets a running server with --url) and
+replays a recorded utterance from N concurrent websocket clients.
+--backend stub serves StubPipeline with the --*-latency settings, --backend
+models loads the real Whisper / Kokoro (optionally with --fake-llm so no
+Ollama server is needed).
+
+Reports p50/p95/p99 per stage as seen by the client (transcription, first
+audio, whole turn) and as recorded by the server's stage histograms, plus
+turns/s and peak RSS, as JSON lines (or a JSON file with --output) that can
+be compared between commits.
+
+    python bench_e2e.py --backend stub --clients 1 8 32 --turns 5
+    python bench_e2e.py --backend models --fake-llm --audio ../audio.wav --stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+CLIENT_STAGES = ("transcription", "first_audio", "turn")
+
+
+def load_pcm16(path):
+    """Recorded audio -> 16 kHz mono PCM_16 bytes, the /ws wire format"""
+    import soundfile as sf
+    from audio_decode import resample
+
+    audio, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+    audio = resample(audio.mean(axis=1), sample_rate, 16000)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def synthetic_utterance(seconds=1.0):
+    """Tone burst padded with silence, for runs without a recording: the
+    streaming endpoint detector needs something that looks like speech"""
+    t = np.arange(int(16000 * seconds)) / 16000
+    tone = 0.3 * np.sin(2 * np.pi * 220 * t)
+    audio = np.concatenate((np.zeros(3200), tone, np.zeros(3200)))
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+def summarize(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {"n": len(values), "mean": round(float(np.mean(values)), 4),
+            "p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4)}
+
+
+async def play_turn(ws, audio_bytes, protocol, frame_bytes):
+    """Send one utterance, read until the reply is complete.
+    Returns {stage: seconds since the user finished speaking}."""
+    if protocol == "stream":
+        for i in range(0, len(audio_bytes), frame_bytes):
+            await ws.send_bytes(audio_bytes[i:i + frame_bytes])
+        start = time.perf_counter()
+        await ws.send_str(json.dumps({"type": "end_of_speech"}))
+    else:
+        start = time.perf_counter()
+        await ws.send_bytes(audio_bytes)
+
+    marks = {}
+    # A streamed file with a long pause can be endpointed into several
+    # utterances; wait for the reply to each of them
+    pending = 0
+    while True:
+        message = await ws.receive_json()
+        elapsed = time.perf_counter() - start
+        kind = message.get("type")
+        if kind == "error":
+            raise RuntimeError(message.get("message"))
+        if kind == "transcription":
+            marks.setdefault("transcription", elapsed)
+            if message["text"].strip():
+                pending += 1
+            elif pending == 0:
+                break
+        elif kind in ("audio", "audio_chunk"):
+            marks.setdefault("first_audio", elapsed)
+        if kind in ("audio", "audio_end"):
+            pending -= 1
+            if pending <= 0:
+                break
+    marks["turn"] = time.perf_counter() - start
+    return marks
+
+
+async def client(url, audio_bytes, turns, protocol, frame_bytes, results, errors):
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url, ssl=False, max_msg_size=0) as ws:
+            for _ in range(turns):
+                try:
+                    results.append(await play_turn(ws, audio_bytes, protocol, frame_bytes))
+                except RuntimeError as e:
+                    errors.append(str(e))
+
+
+async def wait_ready(base_url, timeout=600):
+    import aiohttp
+
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/ready", ssl=False) as response:
+                    if response.status == 200:
+                        return await response.json()
+            except aiohttp.ClientConnectionError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("server did not become ready")
+
+
+def server_stages():
+    from metrics import REGISTRY, Histogram
+
+    stages = {}
+    for metric in REGISTRY.metrics.values():
+        if isinstance(metric, Histogram) and metric.count:
+            name = metric.name.removeprefix("voice_").removesuffix("_seconds")
+            stages[name] = {"n": len(metric.recent), **metric.percentiles()}
+    return stages
+
+
+def reset_server_stages():
+    from metrics import REGISTRY, Histogram
+
+    for metric in REGISTRY.metrics.values():
+        if isinstance(metric, Histogram):
+            metric.reset()
+
+
+async def run(args, audio_bytes, clients, base_url, in_process):
+    params = []
+    if args.stream:
+        params.append("stream=1")
+    if args.protocol == "stream":
+        params.append("audio=stream")
+    query = "?" + "&".join(params) if params else ""
+    ws_url = base_url.replace("http", "ws", 1) + "/ws" + query
+    frame_bytes = int(16000 * args.frame_ms / 1000) * 2
+
+    if in_process:
+        reset_server_stages()
+    results, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(ws_url, audio_bytes, args.turns, args.protocol, frame_bytes, results, errors)
+        for _ in range(clients)
+    ))
+    wall = time.perf_counter() - start
+    return {
+        "backend": args.backend,
+        "protocol": args.protocol,
+        "stream_reply": args.stream,
+        "clients": clients,
+        "turns": len(results),
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(len(results) / wall, 3),
+        # ru_maxrss is KiB on Linux; includes the server when in-process
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "client": {stage: summarize([r[stage] for r in results if stage in r]) for stage in CLIENT_STAGES},
+        "server": server_stages() if in_process else {},
+    }
+
+
+async def main_async(args):
+    audio_bytes = load_pcm16(args.audio) if args.audio else synthetic_utterance()
+    fake_llm = None
+    server = None
+    server_task = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            # Configure the in-process app before importing it: backend,
+            # stub latencies and the LLM endpoint are read at import/startup
+            os.environ["VOICE_BACKEND"] = args.backend
+            os.environ.setdefault("STUB_ASR_LATENCY", str(args.asr_latency))
+            os.environ.setdefault("STUB_LLM_FIRST_TOKEN", str(args.llm_first_token))
+            os.environ.setdefault("STUB_LLM_TOKEN_DELAY", str(args.llm_token_delay))
+            os.environ.setdefault("STUB_TTS_LATENCY", str(args.tts_latency))
+            if args.fake_llm:
+                from fake_ollama import FakeOllamaServer
+
+                fake_llm = FakeOllamaServer(first_token_delay=args.llm_first_token, token_delay=args.llm_token_delay)
+                fake_llm.start()
+                os.environ["OLLAMA_BASE_URL"] = fake_llm.base_url
+            import uvicorn
+            import app
+
+            config = uvicorn.Config(app.app, host="127.0.0.1", port=args.port, log_level="warning")
+            server = uvicorn.Server(config)
+            server_task = asyncio.create_task(server.serve())
+            base_url = f"http://127.0.0.1:{args.port}"
+        ready = await wait_ready(base_url)
+
+        results = []
+        for clients in args.clients:
+            result = await run(args, audio_bytes, clients, base_url, in_process=server is not None)
+            result["startup"] = ready.get("since_start", {})
+            results.append(result)
+            print(json.dumps(result))
+        return results
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await server_task
+        if fake_llm is not None:
+            fake_llm.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("stub", "models"), default="stub")
+    parser.add_argument("--url", help="benchmark a running server, e.g. https://localhost:7575")
+    parser.add_argument("--port", type=int, default=7599)
+    parser.add_argument("--audio", default=None, help="utterance to replay, e.g. ../audio.wav (default a 1 s tone)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--protocol", choices=("utterance", "stream"), default="utterance",
+                        help="one bytes message per utterance, or PCM frames + end_of_speech")
+    parser.add_argument("--frame-ms", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="request chunked reply audio (/ws?stream=1)")
+    parser.add_argument("--fake-llm", action="store_true", help="serve the LLM from fake_ollama.py")
+    parser.add_argument("--asr-latency", type=float, default=0.3)
+    parser.add_argument("--llm-first-token", type=float, default=0.2)
+    parser.add_argument("--llm-token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.15)
+    parser.add_argument("--output", help="also write {commit, args, results} to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "python": sys.version.split()[0],
+                       "args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""LLM client latency against the in-process fake Ollama server.
+
+Compares a fresh requests.post per turn (the old generate_response) with the
+pooled OllamaClient, then shows retries absorbing transient 503s and the
+circuit breaker failing fast once the backend is down.
+
+    python bench_llm_client.py --calls 50
+"""
+import argparse
+import json
+import statistics
+import time
+import requests
+from fake_ollama import FakeOllamaServer
+from llm_client import CircuitBreaker, LLMError, OllamaClient
+
+PAYLOAD = {"model": "fake", "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(name, latencies):
+    return {
+        "client": name,
+        "calls": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def bench_fresh(base_url, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = requests.post(f"{base_url}/api/chat", json={**PAYLOAD, "stream": False})
+        response.json()
+        latencies.append(time.perf_counter() - start)
+    return summarize("requests.post per call", latencies)
+
+
+def bench_pooled(base_url, calls):
+    client = OllamaClient(base_url=base_url)
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client.chat(PAYLOAD)
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    return summarize("pooled OllamaClient", latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    with FakeOllamaServer(first_token_delay=0, token_delay=0) as server:
+        print(json.dumps(bench_fresh(server.base_url, args.calls)))
+        print(json.dumps(bench_pooled(server.base_url, args.calls)))
+
+    # Two transient failures are absorbed by the retries
+    with FakeOllamaServer(first_token_delay=0, token_delay=0, fail_requests=2) as server:
+        client = OllamaClient(base_url=server.base_url, retries=2, backoff=0.05)
+        start = time.perf_counter()
+        client.chat(PAYLOAD)
+        print(json.dumps({"retried_calls": len(server.requests),
+                          "ms": round((time.perf_counter() - start) * 1000, 2)}))
+
+    # Backend down: the breaker opens and later calls fail without a request
+    with FakeOllamaServer(fail_requests=10 ** 6) as server:
+        client = OllamaClient(base_url=server.base_url, retries=0,
+                              breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30))
+        outcomes = []
+        for _ in range(6):
+            start = time.perf_counter()
+            try:
+                client.chat(PAYLOAD)
+            except LLMError as e:
+                outcomes.append({"error": type(e).__name__,
+                                 "ms": round((time.perf_counter() - start) * 1000, 2)})
+        print(json.dumps({"breaker": client.breaker.state, "server_requests": len(server.requests),
+                          "calls": outcomes}))
+
+
+if __name__ == "__main__":
+    main()
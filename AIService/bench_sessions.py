@@ -0,0 +1,91 @@
+"""Aggregate throughput of N simulated websocket sessions.
+
+Compares the old handler (model calls made directly in the coroutine) with
+VoiceTurnRunner (bounded executors + async LLM) on StubPipeline latencies.
+
+    python bench_sessions.py --clients 1 4 16 --turns 3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from executors import ModelExecutors
+from stub_pipeline import StubPipeline
+from voice_turn import VoiceTurnRunner
+
+
+async def blocking_session(pipeline, turns, latencies):
+    # Same call pattern as the original /ws handler
+    chat_history = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        transcription = pipeline.process_audio_file(b"")
+        chat_history.append({"role": "user", "content": transcription})
+        response = pipeline.generate_response(chat_history)
+        chat_history.append({"role": "assistant", "content": response})
+        pipeline.generate_speech(response)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+async def runner_session(runner, turns, latencies):
+    chat_history = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        transcription = await runner.transcribe(b"")
+        chat_history.append({"role": "user", "content": transcription})
+        spoken = [chunk async for _, chunk, _ in runner.respond_stream(chat_history)]
+        chat_history.append({"role": "assistant", "content": " ".join(spoken)})
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(mode, clients, turns, args):
+    pipeline = StubPipeline(
+        asr_latency=args.asr_latency,
+        llm_first_token=args.llm_first_token,
+        llm_token_delay=args.llm_token_delay,
+        tts_latency=args.tts_latency,
+    )
+    latencies = []
+    executors = None
+    start = time.perf_counter()
+    if mode == "blocking":
+        await asyncio.gather(*(blocking_session(pipeline, turns, latencies) for _ in range(clients)))
+    else:
+        executors = ModelExecutors(asr_workers=args.asr_workers, tts_workers=args.tts_workers)
+        runner = VoiceTurnRunner(pipeline, executors)
+        await asyncio.gather(*(runner_session(runner, turns, latencies) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    if executors is not None:
+        executors.shutdown()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "turns": len(latencies),
+        "wall_s": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 2),
+        "mean_turn_s": round(statistics.mean(latencies), 3),
+        "max_turn_s": round(max(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--asr-latency", type=float, default=0.3)
+    parser.add_argument("--llm-first-token", type=float, default=0.2)
+    parser.add_argument("--llm-token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.15)
+    parser.add_argument("--asr-workers", type=int, default=2)
+    parser.add_argument("--tts-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    for clients in args.clients:
+        for mode in ("blocking", "executors"):
+            print(json.dumps(asyncio.run(run(mode, clients, args.turns, args))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Batch size vs wall time for Kokoro synthesis.
+
+For each batch size B, times B separate session.run calls against one
+KokoroTTS.synthesize_batch call over the same sentences, and checks that
+every batched waveform matches its single run (waveforms_match). Exits 1
+on a mismatch: the pipeline would then not batch with this export.
+
+    python bench_tts_batching.py --batch-sizes 1 2 4 8
+"""
+import argparse
+import json
+import sys
+import time
+from kokoro_onnx import KokoroTTS, waveforms_match
+
+SENTENCES = [
+    "Great job!",
+    "How about you?",
+    "I'm doing great, thanks for asking.",
+    "That sounds like a lot of fun.",
+    "Which part did you enjoy the most?",
+    "Tell me more about your weekend.",
+    "I really like pizza, it's always a good choice.",
+    "Let's practice a few more sentences together.",
+]
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    tts = KokoroTTS(model_dir=args.model_dir)
+    print(json.dumps({"providers": tts.session.get_providers(), "supports_batch": tts.supports_batch,
+                      "batch_matches_single": tts.batch_matches_single()}))
+    # Warm up both code paths
+    batch = [tts.prepare_inputs(text) for text in SENTENCES]
+    tts.synthesize(*batch[0])
+    tts.synthesize_batch(batch[:2])
+
+    all_match = True
+    for batch_size in args.batch_sizes:
+        items = [batch[i % len(batch)] for i in range(batch_size)]
+        single = [tts.synthesize(tokens, ref_s)[0] for tokens, ref_s in items]
+        match = all(waveforms_match(b, s, tts.samples_per_frame)
+                    for b, s in zip(tts.synthesize_batch(items), single))
+        all_match &= match
+        sequential_s = best_of(lambda: [tts.synthesize(tokens, ref_s) for tokens, ref_s in items], args.repeats)
+        batched_s = best_of(lambda: tts.synthesize_batch(items), args.repeats)
+        print(json.dumps({
+            "batch_size": batch_size,
+            "sequential_s": round(sequential_s, 3),
+            "batched_s": round(batched_s, 3),
+            "speedup": round(sequential_s / batched_s, 2),
+            "match": match,
+        }))
+    sys.exit(0 if all_match else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Per-call cost of TurnDetector.calculate_eou on a growing transcript.
+
+Replays an utterance word by word, the way interim transcripts arrive, and
+scores every fragment either in full (no state) or incrementally with a
+per-session EOUState that keeps the past key/values.
+
+With --sessions, N concurrent sessions replay the utterance at once and
+EOU calls/s are compared between one ONNX run per call and EOUScorer
+batching them across sessions (one JSON line per session count and mode).
+
+    python bench_turn_detector.py --repeats 20
+    python bench_turn_detector.py --sessions 1 4 16 64 --max-batch 16
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from turn_detector import EOUScorer, EOUState, TurnDetector
+
+HISTORY = [
+    {"role": "assistant", "content": "Hi! What did you do over the weekend?"},
+]
+UTTERANCE = (
+    "well on saturday I went hiking with a couple of friends up the hill behind "
+    "my house and then on sunday I mostly stayed at home and watched a movie"
+)
+
+
+def fragments(utterance):
+    words = utterance.split()
+    return [" ".join(words[:i]) for i in range(1, len(words) + 1)]
+
+
+def replay(detector, texts, incremental):
+    state = EOUState() if incremental else None
+    timings = []
+    for text in texts:
+        chat_ctx = HISTORY + [{"role": "user", "content": text}]
+        start = time.perf_counter()
+        detector.calculate_eou(chat_ctx, state)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_sessions(detector, texts, sessions, max_batch, wait_ms):
+    scorer = EOUScorer(detector, max_batch_size=max_batch, max_wait_ms=wait_ms)
+    latencies = []
+
+    def session():
+        state = EOUState()
+        for text in texts:
+            start = time.perf_counter()
+            scorer.score_blocking(HISTORY + [{"role": "user", "content": text}], state)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        for future in [pool.submit(session) for _ in range(sessions)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    batcher = scorer.batcher
+    scorer.close()
+    return {
+        "sessions": sessions,
+        "max_batch_size": max_batch,
+        "calls": len(latencies),
+        "mean_batch_size": round(batcher.mean_batch_size, 2) if batcher else 1.0,
+        "calls_per_s": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--utterance", default=UTTERANCE)
+    parser.add_argument("--sessions", type=int, nargs="+", help="concurrent sessions to sweep")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    detector = TurnDetector()
+    print(f"KV cache inputs: {detector.supports_kv_cache}")
+    texts = fragments(args.utterance)
+    replay(detector, texts, incremental=False)  # warmup
+    if args.sessions:
+        for sessions in args.sessions:
+            for max_batch in (1, args.max_batch):
+                print(json.dumps(run_sessions(detector, texts, sessions, max_batch, args.wait_ms)))
+        return
+    for name, incremental in (("full", False), ("incremental", True)):
+        timings = [t for _ in range(args.repeats) for t in replay(detector, texts, incremental)]
+        p50, p95 = np.percentile(timings, (50, 95)) * 1000
+        print(f"{name:12s} {len(texts)} fragments: mean {np.mean(timings) * 1000:7.2f} ms/call, "
+              f"p50 {p50:7.2f} ms, p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
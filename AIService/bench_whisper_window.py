@@ -0,0 +1,73 @@
+"""Check the short-utterance Whisper window against the full 30 s path.
+
+Transcribes each file with both paths, prints latency per path and whether
+the transcripts match (case / punctuation insensitive). Exits 1 on mismatch;
+WHISPER_SHORT_WINDOW should only be turned on where this passes.
+
+    python bench_whisper_window.py ../audio.wav test.wav
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import soundfile as sf
+from pipeline import SpeechProcessingPipeline
+from whisper_window import pick_frame_bucket
+
+
+DEFAULT_FILES = ["../audio.wav", "test.wav"]
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def transcribe_both(pipeline, path, repeats=1):
+    """(full window text, seconds), (short window text, seconds) for a file"""
+    audio_data, sample_rate = sf.read(path, dtype="float32")
+    audio_data, sample_rate = pipeline.load_audio_file(audio_data, sample_rate)
+    audio_data, _ = pipeline.preprocess_audio(audio_data, sample_rate)
+    pipeline.short_window = False
+    full = timed_transcribe(pipeline, audio_data, repeats)
+    pipeline.short_window = True
+    short = timed_transcribe(pipeline, audio_data, repeats)
+    return audio_data, full, short
+
+
+def timed_transcribe(pipeline, audio_data, repeats):
+    pipeline.transcribe_batch([audio_data])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        text = pipeline.transcribe_batch([audio_data])[0]
+    return text, (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    pipeline = SpeechProcessingPipeline(short_window=True)
+    all_match = True
+    for path in args.files:
+        audio_data, (full_text, full_s), (short_text, short_s) = transcribe_both(pipeline, path, args.repeats)
+
+        match = normalize(full_text) == normalize(short_text)
+        all_match &= match
+        print(json.dumps({
+            "file": path,
+            "duration_s": round(len(audio_data) / 16000, 2),
+            "frames": pick_frame_bucket(len(audio_data)),
+            "full_window_s": round(full_s, 3),
+            "short_window_s": round(short_s, 3),
+            "match": match,
+            "full_text": full_text,
+            "short_text": short_text,
+        }))
+    sys.exit(0 if all_match else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import copy
+import os
+
+
+def estimate_tokens(text):
+    """Rough token count for English chat text (~4 bytes per token)"""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+class ChatContext:
+    """Conversation of one session, sent to the LLM under a token budget.
+
+    Holds the user/assistant turns (append() like a list) and builds the
+    prompt messages: the system prompt first, then the kept turns. When the
+    prompt goes over max_tokens, old turns are dropped in one step down to
+    low_water of the budget, starting at a user turn, and replaced by a
+    short note of what the user said in them. The cut then stays where it
+    is until the budget is hit again, so consecutive requests share a
+    byte-identical prefix and the server can reuse its prompt KV cache.
+    """
+
+    def __init__(self, turns=None, max_tokens=None, reply_tokens=64, low_water=0.6,
+                 summary_tokens=None, count_tokens=estimate_tokens):
+        self.turns = list(turns or [])
+        self.max_tokens = max_tokens or int(os.environ.get("LLM_CONTEXT_TOKENS", 1536))
+        # Room left for the reply inside the model's context window
+        self.reply_tokens = reply_tokens
+        self.low_water = low_water
+        self.summary_tokens = int(os.environ.get("LLM_CONTEXT_SUMMARY_TOKENS", 80)) if summary_tokens is None else summary_tokens
+        self.count_tokens = count_tokens
+        # First turn still sent verbatim; everything before it is summarized
+        self.start = 0
+        self.summary = None
+        self.prompt_tokens = 0
+        # One entry per LLM call: estimated and server-reported token counts
+        self.usage = []
+
+    def append(self, message):
+        self.turns.append(message)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def __getitem__(self, index):
+        return self.turns[index]
+
+    def fork(self, *messages):
+        """Copy with messages appended, e.g. for a speculative request:
+        compacting or recording usage on it leaves this context unchanged,
+        and since the cut is the same, so is the prompt prefix"""
+        other = copy.copy(self)
+        other.turns = self.turns + list(messages)
+        other.usage = []
+        return other
+
+    def _cost(self, message):
+        # Plus a few tokens of chat template around every message
+        return self.count_tokens(message["content"]) + 4
+
+    def messages(self, system_prompt):
+        """Prompt messages for the next call: system prompt, summary, kept turns"""
+        system = {"role": "system", "content": system_prompt}
+        budget = self.max_tokens - self.reply_tokens
+        fixed = self._cost(system)
+        costs = [self._cost(m) for m in self.turns[self.start:]]
+        summary_cost = self._cost(self.summary) if self.summary else 0
+        if fixed + summary_cost + sum(costs) > budget:
+            self._compact(costs, budget * self.low_water - fixed - self.summary_tokens)
+            costs = [self._cost(m) for m in self.turns[self.start:]]
+            summary_cost = self._cost(self.summary) if self.summary else 0
+
+        messages = [system]
+        if self.summary:
+            messages.append(self.summary)
+        messages.extend(self.turns[self.start:])
+        self.prompt_tokens = fixed + summary_cost + sum(costs)
+        return messages
+
+    def _compact(self, costs, target):
+        # Drop oldest kept turns until the rest fits target, never the last one
+        drop = 0
+        kept = sum(costs)
+        while drop < len(costs) - 1 and kept > target:
+            kept -= costs[drop]
+            drop += 1
+        # Start the kept part on a user turn
+        while drop < len(costs) - 1 and self.turns[self.start + drop]["role"] != "user":
+            drop += 1
+        self.start += drop
+        self.summary = self._summarize(self.turns[:self.start])
+
+    def _summarize(self, dropped):
+        """Short note of the user's dropped turns, newest first until summary_tokens"""
+        if not self.summary_tokens:
+            return None
+        said = []
+        used = 0
+        for message in reversed(dropped):
+            if message["role"] != "user":
+                continue
+            cost = self.count_tokens(message["content"]) + 2
+            if used + cost > self.summary_tokens:
+                break
+            said.append(message["content"].strip())
+            used += cost
+        if not said:
+            return None
+        return {
+            "role": "system",
+            "content": "Earlier in this conversation the user said: " + " | ".join(reversed(said)),
+        }
+
+    def record_usage(self, stats):
+        """Store the token counts of one call; stats are the server's
+        prompt_eval_count / eval_count, when it reported them"""
+        entry = {"estimated_prompt_tokens": self.prompt_tokens, "turns_sent": len(self.turns) - self.start}
+        entry.update(stats)
+        self.usage.append(entry)
+        print(
+            f"Prompt tokens: ~{entry['estimated_prompt_tokens']} estimated, "
+            f"{entry.get('prompt_eval_count', '?')} evaluated by server, "
+            f"{entry.get('eval_count', '?')} generated, {entry['turns_sent']} turns sent"
+        )
+        return entry
+
+
+def as_chat_context(chat_history):
+    """ChatContext for chat_history; plain lists get a throwaway one, so
+    they are trimmed to the budget but keep no cut between calls"""
+    if isinstance(chat_history, ChatContext):
+        return chat_history
+    return ChatContext(turns=chat_history)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+
+class Stage:
+    """One bounded execution lane (ASR, LLM or TTS).
+
+    Blocking model calls go to the stage's own thread pool so they never run
+    on the event loop; max_pending caps how many calls may be queued or running
+    at once, extra callers wait on the semaphore instead of piling up in the pool.
+    Stages without workers (the async LLM client) only use the concurrency cap.
+    """
+
+    def __init__(self, name, workers=None, max_pending=None):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending or (workers * 4 if workers else 64)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) if workers else None
+        self._slots = None
+        self.waiting = 0
+        self.active = 0
+
+    def _get_slots(self):
+        # Created lazily so the semaphore binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            await self._get_slots().acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        self._get_slots().release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the stage's slots for the duration of an async call"""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def run(self, fn, *args):
+        """Run a blocking fn(*args) in this stage's thread pool.
+
+        The slot is released when the thread is done, not when the caller
+        stops waiting: a call cancelled by barge-in keeps counting against
+        max_pending until its model run has actually finished."""
+        if self.pool is None:
+            async with self.slot():
+                return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        loop = asyncio.get_running_loop()
+        await self._acquire()
+        try:
+            future = self.pool.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release_from_thread(loop))
+        # Cancelling the wrapper also cancels the call if it has not started
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _release_from_thread(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop already closed, nothing left to hand the slot to
+            pass
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ModelExecutors:
+    """Dedicated stages for ASR, LLM HTTP and TTS so that one session's turn
+    does not freeze the other websocket connections on the worker"""
+
+    def __init__(self, asr_workers=None, tts_workers=None, llm_concurrency=None):
+        self.asr = Stage("asr", workers=asr_workers or int(os.environ.get("ASR_WORKERS", 1)))
+        self.tts = Stage("tts", workers=tts_workers or int(os.environ.get("TTS_WORKERS", 2)))
+        self.llm = Stage("llm", max_pending=llm_concurrency or int(os.environ.get("LLM_CONCURRENCY", 16)))
+
+    def stages(self):
+        return [self.asr, self.llm, self.tts]
+
+    def shutdown(self):
+        for stage in self.stages():
+            stage.shutdown()
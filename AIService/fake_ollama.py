@@ -0,0 +1,173 @@
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLIES = [
+    "Great job! How about you? What did you do this weekend?",
+    "I'm doing great, thanks. Tell me more about your day.",
+    "That sounds fun. Which part did you enjoy the most?",
+]
+
+
+def split_tokens(text):
+    """Cut a reply into LLM-like tokens, each carrying its leading space"""
+    return re.findall(r"\s*\S+", text)
+
+
+class FakeOllamaServer:
+    """Local stand-in for Ollama's /api/chat that replays canned replies.
+
+    Streams NDJSON tokens like the real server, with a configurable delay
+    before the first token and between tokens, so LLM/TTS overlap can be
+    tested and benchmarked without a GPU box.
+    """
+
+    def __init__(self, replies=None, first_token_delay=0.2, token_delay=0.03,
+                 fail_requests=0, error_status=503, host="127.0.0.1", port=0):
+        self.replies = itertools.cycle(replies or DEFAULT_REPLIES)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        # The first fail_requests calls are answered with error_status,
+        # to exercise client retries and the circuit breaker
+        self.fail_requests = fail_requests
+        self.error_status = error_status
+        self.requests = []
+        # Streams the client closed before the end (e.g. barge-in)
+        self.aborted = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_reply(self, body):
+        """Canned reply for this request, or None if it should fail"""
+        with self._lock:
+            self.requests.append(body)
+            if len(self.requests) <= self.fail_requests:
+                return None
+            return next(self.replies)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle +
+            # delayed ACK adds ~40 ms to every request on a kept-alive connection
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != "/api/chat":
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                reply = server.next_reply(body)
+                if reply is None:
+                    self.send_error(server.error_status)
+                    return
+                model = body.get("model", "fake")
+                # Rough counts in the fields Ollama reports on the last chunk
+                usage = {
+                    "prompt_eval_count": sum(len(m.get("content", "")) // 4 + 4 for m in body.get("messages", [])),
+                    "eval_count": len(split_tokens(reply)),
+                }
+
+                time.sleep(server.first_token_delay)
+                if not body.get("stream", True):
+                    tokens = split_tokens(reply)
+                    time.sleep(server.token_delay * max(len(tokens) - 1, 0))
+                    payload = json.dumps({
+                        "model": model,
+                        "message": {"role": "assistant", "content": reply},
+                        "done": True,
+                        **usage,
+                    }).encode()
+                    try:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.send_header("Content-Length", str(len(payload)))
+                        self.end_headers()
+                        self.wfile.write(payload)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Client gave up waiting (deadline, barge-in)
+                        with server._lock:
+                            server.aborted += 1
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, token in enumerate(split_tokens(reply)):
+                        if i:
+                            time.sleep(server.token_delay)
+                        self._write_chunk({
+                            "model": model,
+                            "message": {"role": "assistant", "content": token},
+                            "done": False,
+                        })
+                    self._write_chunk({
+                        "model": model,
+                        "message": {"role": "assistant", "content": ""},
+                        "done": True,
+                        **usage,
+                    })
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client aborted the stream
+                    with server._lock:
+                        server.aborted += 1
+
+            def _write_chunk(self, obj):
+                line = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama /api/chat server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--fail-requests", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        first_token_delay=args.first_token_delay,
+        token_delay=args.token_delay,
+        fail_requests=args.fail_requests,
+        port=args.port,
+    )
+    print(f"Fake Ollama listening on {server.base_url}")
+    server.httpd.serve_forever()
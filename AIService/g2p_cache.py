@@ -0,0 +1,129 @@
+import re
+import threading
+from collections import OrderedDict
+
+# Words (with inner apostrophes) and single punctuation marks, like misaki's tokens
+TOKEN_RE = re.compile(r"[\w']+|[^\w\s]")
+# Marks a word seen with different phonemes in different sentences
+AMBIGUOUS = object()
+# Words misaki pronounces by context: weak/strong forms and the next
+# word's first sound ("the apple" / "the car"), heteronyms ("read",
+# "live") and "used to". Never cached or assembled per word: a sentence
+# with one of them is a word-cache miss.
+CONTEXT_WORDS = frozenset("""
+a an the to of for from and or but as at by in on with that than
+am is are was were be been can could do does had has have must shall should will would
+i me my you your he him his she her we us our they them their there
+used use read live lead wind wound tear close bow row desert object present record
+project produce refuse permit subject content minute separate estimate
+""".split())
+
+
+class LRUCache:
+    """Thread-safe bounded mapping with least-recently-used eviction"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Lookup without touching LRU order or counters"""
+        with self._lock:
+            return self.data.get(key, default)
+
+    def put(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedG2P:
+    """Drop-in wrapper around misaki en.G2P with two LRU levels.
+
+    1. Sentence cache keyed on the whitespace-normalized sentence.
+    2. Word cache filled from the tokens of every sentence G2P has run on.
+       A sentence-cache miss whose words are all cached is assembled from
+       them without calling G2P. Words that came out with different phonemes
+       in different contexts ("the", "read") are never used that way.
+       Words are keyed on their exact text, since misaki's output depends
+       on case ("US" / "us", "May" / "may"), and CONTEXT_WORDS are never
+       reused this way.
+    """
+
+    def __init__(self, g2p, max_sentences=4096, max_words=16384):
+        self.g2p = g2p
+        self.sentences = LRUCache(max_sentences)
+        self.words = LRUCache(max_words)
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split())
+
+    def __call__(self, text):
+        """Returns (phonemes, None), same shape as en.G2P's (phonemes, tokens)"""
+        key = self.normalize(text)
+        phonemes = self.sentences.get(key)
+        if phonemes is None:
+            phonemes = self._from_words(key)
+            if phonemes is None:
+                phonemes = self._run_g2p(key)
+            self.sentences.put(key, phonemes)
+        return phonemes, None
+
+    def _from_words(self, text):
+        parts = []
+        matches = list(TOKEN_RE.finditer(text))
+        for i, match in enumerate(matches):
+            word = match.group()
+            if word.lower() in CONTEXT_WORDS:
+                return None
+            phonemes = self.words.get(word)
+            if phonemes is None or phonemes is AMBIGUOUS:
+                return None
+            parts.append(phonemes)
+            if i + 1 < len(matches) and matches[i + 1].start() > match.end():
+                parts.append(" ")
+        return "".join(parts) if parts else None
+
+    def _run_g2p(self, text):
+        phonemes, tokens = self.g2p(text)
+        for token in tokens or []:
+            word = token.text
+            if token.phonemes is None or word.lower() in CONTEXT_WORDS:
+                continue
+            cached = self.words.peek(word)
+            if cached is None:
+                self.words.put(word, token.phonemes)
+            elif cached is not AMBIGUOUS and cached != token.phonemes:
+                self.words.put(word, AMBIGUOUS)
+        return phonemes
+
+    def stats(self):
+        return {"sentences": self.sentences.stats(), "words": self.words.stats()}
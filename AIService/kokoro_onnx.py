@@ -5,8 +5,31 @@ from onnxruntime import InferenceSession
 import time
 import json
 from misaki import en
+from voice_bank import get_voice_bank
+from g2p_cache import CachedG2P
 from IPython.display import Audio, display
 from onnxruntime import InferenceSession, SessionOptions, get_available_providers
+from text_chunking import split_sentences, split_clauses, split_words
+from onnx_sessions import create_session
+
+# Kokoro context is 512 tokens, minus the pad token 0 at the start & end
+MAX_PHONEMES = 510
+DEFAULT_VOICE = "af_bella.bin"
+DEFAULT_SPEED = .7
+# Short + long pair for batch_matches_single: the short one is padded
+BATCH_CHECK_TEXTS = ("Great job!", "I'm doing great, thanks for asking. How about you?")
+
+
+def waveforms_match(a, b, samples_per_frame, tolerance=0.05):
+    """Same audio up to one duration frame of length and a relative L2
+    error below tolerance"""
+    if abs(len(a) - len(b)) > samples_per_frame:
+        return False
+    n = min(len(a), len(b))
+    a = np.asarray(a[:n], dtype=np.float64)
+    b = np.asarray(b[:n], dtype=np.float64)
+    return float(np.linalg.norm(a - b)) <= tolerance * max(float(np.linalg.norm(b)), 1e-9)
+
 
 class KokoroTTS:
     def __init__(self, model_dir=None):
@@ -14,8 +37,17 @@ class KokoroTTS:
         self.model_dir = model_dir or "models/Kokoro-82M-ONNX"
         
         self.phoneme2id = self._load_phoneme_mapping()
-        self.g2p = en.G2P(trf=False, british=False, fallback=None)
+        self.voices = get_voice_bank(self.model_dir)
+        # G2P is pure Python ahead of every ONNX call, reuse it across replies
+        self.g2p = CachedG2P(en.G2P(trf=False, british=False, fallback=None))
         self.session = self._load_onnx_session()
+        self.samples_per_frame = self._load_samples_per_frame()
+        input_shapes = {i.name: i.shape for i in self.session.get_inputs()}
+        # Some exports fix the batch dim to 1, those fall back to one run per item
+        self.supports_batch = input_shapes["input_ids"][0] != 1
+        self.batched_speed = input_shapes["speed"] != [1]
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self._batch_matches = None
 
     def _load_phoneme_mapping(self):
         config_path = os.path.join(self.model_dir, "config.json")
@@ -27,43 +59,135 @@ class KokoroTTS:
             return {v: int(k) for k, v in phoneme2id.items()}
         return phoneme2id
 
+    def _load_samples_per_frame(self):
+        # Audio samples per predicted duration frame: decoder 2x upsampling
+        # times the iSTFTNet upsample rates and hop size (600 at 24 kHz)
+        config_path = os.path.join(self.model_dir, "config.json")
+        with open(config_path, "r", encoding="utf-8") as f:
+            istftnet = json.load(f)["istftnet"]
+        return 2 * int(np.prod(istftnet["upsample_rates"])) * istftnet["gen_istft_hop_size"]
+
     def _load_onnx_session(self):
         model_path = os.path.join(self.model_dir, "onnx", "model.onnx")
         
-        # Danh sách các provider khả dụng trên hệ thống
-        available_providers = get_available_providers()
-    
         # Ưu tiên sử dụng CUDA nếu có, fallback về CPU nếu không
-        providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
-        selected_providers = [p for p in providers if p in available_providers]
-        print(f"Selected providers: {selected_providers}")
-        return InferenceSession(model_path, providers=selected_providers)
+        # Threads / optimization level come from KOKORO_* or ORT_* env vars
+        return create_session(model_path, name="kokoro", prefix="KOKORO")
 
 
     def text_to_phonemes(self, text):
         phonemes, _ = self.g2p(text)
         return [p for p in phonemes if p in self.phoneme2id]
 
-    def prepare_inputs(self, text, voice_file="af_bella.bin"):
+    def prepare_inputs(self, text, voice_file=DEFAULT_VOICE):
         phonemes = self.text_to_phonemes(text)
         token_ids = [self.phoneme2id[p] for p in phonemes]
         
-        # Load voice reference
-        voice_path = os.path.join(self.model_dir, "voices", voice_file)
-        voices = np.fromfile(voice_path, dtype=np.float32).reshape(-1, 1, 256)
-        ref_s = voices[len(token_ids)]
+        # Voice reference: zero-copy row of the shared memory-mapped voice bank
+        ref_s = self.voices.style(voice_file, len(token_ids))
         
         # Add start/end tokens
         tokens = [[0, *token_ids, 0]]
         return tokens, ref_s
 
-    def synthesize(self, tokens, ref_s, speed=.7):
+    def split_text(self, text, max_phonemes=MAX_PHONEMES):
+        """Split text into sentence chunks whose phonemes fit in one ONNX call.
+        Sentences over budget are split at clauses, then at word boundaries."""
+        max_phonemes = min(max_phonemes, MAX_PHONEMES)
+        chunks = []
+        for sentence in split_sentences(text):
+            chunks.extend(self._split_to_budget(sentence, max_phonemes))
+        return chunks
+
+    def _split_to_budget(self, text, max_phonemes):
+        n_phonemes = len(self.text_to_phonemes(text))
+        if n_phonemes <= max_phonemes:
+            return [text] if n_phonemes else []
+        parts = split_clauses(text)
+        if len(parts) == 1:
+            parts = split_words(text, -(-n_phonemes // max_phonemes))
+            if len(parts) == 1:
+                # Single very long word, nothing left to split on
+                return [text]
+        chunks = []
+        for part in parts:
+            chunks.extend(self._split_to_budget(part, max_phonemes))
+        return chunks
+
+    def synthesize(self, tokens, ref_s, speed=DEFAULT_SPEED):
         return self.session.run(None, {
             "input_ids": tokens,
             "style": ref_s,
             "speed": np.array([speed], dtype=np.float32)
         })[0]
 
+    def synthesize_batch(self, batch, speed=DEFAULT_SPEED):
+        """Synthesize several prepare_inputs() results in one session.run.
+
+        Token sequences are right-padded with the pad id 0 and stacked with
+        their own style rows; each output row is cut back to its own length
+        from the predicted durations (or, for exports without a durations
+        output, by trimming the trailing padding audio). The text encoder has
+        no attention mask, so padded rows can differ from single runs;
+        batch_matches_single checks this export. Returns a list of 1-D
+        waveforms.
+        """
+        if len(batch) == 1 or not self.supports_batch:
+            return [self.synthesize(tokens, ref_s, speed=speed)[0] for tokens, ref_s in batch]
+
+        lengths = [len(tokens[0]) for tokens, _ in batch]
+        input_ids = np.zeros((len(batch), max(lengths)), dtype=np.int64)
+        for row, (tokens, _) in enumerate(batch):
+            input_ids[row, :lengths[row]] = tokens[0]
+        style = np.concatenate([np.asarray(ref_s, dtype=np.float32).reshape(1, -1) for _, ref_s in batch])
+        speeds = np.full(len(batch) if self.batched_speed else 1, speed, dtype=np.float32)
+        outputs = dict(zip(self.output_names, self.session.run(None, {
+            "input_ids": input_ids,
+            "style": style,
+            "speed": speeds,
+        })))
+        waveforms = outputs[self.output_names[0]]
+
+        results = []
+        for row, n_tokens in enumerate(lengths):
+            if "durations" in outputs:
+                # Durations are already scaled by speed
+                n_samples = int(outputs["durations"][row, :n_tokens].sum()) * self.samples_per_frame
+            elif n_tokens < max(lengths):
+                n_samples = self._trim_padding(waveforms[row])
+            else:
+                n_samples = waveforms.shape[1]
+            results.append(waveforms[row, :n_samples])
+        return results
+
+    def batch_matches_single(self, voice_file=DEFAULT_VOICE, speed=DEFAULT_SPEED):
+        """Whether a padded synthesize_batch reproduces single runs with this
+        export (see waveforms_match). Checked once, on BATCH_CHECK_TEXTS;
+        batched audio is only used, and cached like single-run audio, when
+        it does."""
+        if self._batch_matches is None:
+            if not self.supports_batch:
+                self._batch_matches = False
+            else:
+                batch = [self.prepare_inputs(text, voice_file=voice_file) for text in BATCH_CHECK_TEXTS]
+                single = [self.synthesize(tokens, ref_s, speed=speed)[0] for tokens, ref_s in batch]
+                batched = self.synthesize_batch(batch, speed=speed)
+                self._batch_matches = all(
+                    waveforms_match(b, s, self.samples_per_frame) for b, s in zip(batched, single)
+                )
+                if not self._batch_matches:
+                    print("Kokoro: padded batches differ from single runs, synthesizing one chunk at a time")
+        return self._batch_matches
+
+    @staticmethod
+    def _trim_padding(waveform, threshold=1e-3, margin=2400):
+        """Length of a padded row without its quiet tail, keeping a short
+        margin (0.1 s) for the final decay"""
+        loud = np.flatnonzero(np.abs(waveform) > threshold)
+        if len(loud) == 0:
+            return len(waveform)
+        return min(len(waveform), int(loud[-1]) + margin)
+
     @staticmethod
     def play_audio(audio, sample_rate=24000):
         display(Audio(audio, rate=sample_rate))
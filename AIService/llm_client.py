@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://107.124.124.71:11434")
+
+
+class LLMError(RuntimeError):
+    """The LLM backend could not produce a reply (after retries)"""
+
+
+class CircuitOpenError(LLMError):
+    """Too many recent failures, calls are rejected until the cool-down ends"""
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures.
+    After reset_timeout one trial call is let through (half-open): success
+    closes the circuit, failure opens it again."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise CircuitOpenError("LLM circuit open, skipping call")
+            if state == "half-open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without a verdict (e.g. cancelled by barge-in):
+        free the half-open trial slot without counting it either way"""
+        with self._lock:
+            self._trial_running = False
+
+
+class _ClientConfig:
+    """Settings shared by the sync and async clients, overridable from env"""
+
+    def __init__(self, base_url=None, timeout=None, connect_timeout=None, retries=None,
+                 backoff=0.2, pool_size=None, breaker=None):
+        self.base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+        self.chat_url = f"{self.base_url}/api/chat"
+        # Deadline for a whole request, including reading a full stream
+        self.timeout = timeout or float(os.environ.get("LLM_TIMEOUT", 30))
+        self.connect_timeout = connect_timeout or float(os.environ.get("LLM_CONNECT_TIMEOUT", 3))
+        self.retries = int(os.environ.get("LLM_RETRIES", 2)) if retries is None else retries
+        self.backoff = backoff
+        self.pool_size = pool_size or int(os.environ.get("LLM_POOL_SIZE", 16))
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff_delay(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+
+# Counters Ollama puts on the last chunk of a /api/chat reply
+USAGE_KEYS = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration",
+              "load_duration", "total_duration")
+
+
+def _record_usage(chunk, stats):
+    if stats is not None:
+        stats.update({key: chunk[key] for key in USAGE_KEYS if key in chunk})
+
+
+def _parse_stream_line(line, stats=None):
+    """Decode one NDJSON line from /api/chat, returns (token, done).
+    The final line's token counts go into stats when given."""
+    chunk = json.loads(line)
+    if "error" in chunk:
+        raise LLMError(chunk["error"])
+    done = chunk.get("done", False)
+    if done:
+        _record_usage(chunk, stats)
+    return chunk.get("message", {}).get("content", ""), done
+
+
+class OllamaClient(_ClientConfig):
+    """Blocking Ollama /api/chat client on a pooled keep-alive requests.Session.
+
+    Every call has a deadline, failed calls are retried with jittered
+    backoff and a circuit breaker stops hammering a backend that is down.
+    """
+
+    RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, LLMError)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, data, stream):
+        response = self.session.post(
+            self.chat_url,
+            json=data,
+            stream=stream,
+            timeout=(self.connect_timeout, self.timeout),
+        )
+        if response.status_code >= 500:
+            response.close()
+            raise LLMError(f"LLM server error {response.status_code}")
+        response.raise_for_status()
+        return response
+
+    def _with_retries(self, call):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                result = call()
+            except self.RETRY_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise LLMError(f"LLM request failed: {e}") from e
+                time.sleep(self.backoff_delay(attempt))
+            except Exception:
+                # The backend answered, the request itself was bad: not retried
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # CancelledError skips the branches above
+                self.breaker.release()
+
+    def chat(self, data, stats=None):
+        """Non-streaming call, returns the assistant message content.
+        stats (a dict) receives the server's token counts."""
+        data = {**data, "stream": False}
+
+        def call():
+            with self._post(data, stream=False) as response:
+                result = response.json()
+            _record_usage(result, stats)
+            return result["message"]["content"]
+
+        return self._with_retries(call)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOllamaClient(_ClientConfig):
+    """aiohttp client for Ollama's /api/chat, so LLM calls can be awaited
+    on the event loop instead of blocking it with requests.post.
+    Same pooling, deadline, retry and circuit-breaker policy as OllamaClient."""
+
+    RETRY_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError, LLMError)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._session = None
+
+    def _get_session(self):
+        # The session must be created inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def _post(self, data):
+        response = await self._get_session().post(self.chat_url, json=data)
+        if response.status >= 500:
+            response.release()
+            raise LLMError(f"LLM server error {response.status}")
+        response.raise_for_status()
+        return response
+
+    async def _with_retries(self, call):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                result = await call()
+            except self.RETRY_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise LLMError(f"LLM request failed: {e!r}") from e
+                await asyncio.sleep(self.backoff_delay(attempt))
+            except Exception:
+                # The backend answered, the request itself was bad: not retried
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # CancelledError skips the branches above
+                self.breaker.release()
+
+    async def chat(self, data, stats=None):
+        """Non-streaming call, returns the assistant message content.
+        stats (a dict) receives the server's token counts."""
+        data = {**data, "stream": False}
+
+        async def call():
+            response = await self._post(data)
+            async with response:
+                try:
+                    result = await response.json(content_type=None)
+                except asyncio.CancelledError:
+                    # Reply abandoned (barge-in): drop the connection so
+                    # Ollama stops generating
+                    response.close()
+                    raise
+            _record_usage(result, stats)
+            return result["message"]["content"]
+
+        return await self._with_retries(call)
+
+    async def chat_stream(self, data, stats=None):
+        """Streaming call, yields content tokens from the NDJSON stream"""
+        data = {**data, "stream": True}
+        response = await self._with_retries(lambda: self._post(data))
+        async with response:
+            try:
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    token, done = _parse_stream_line(line, stats)
+                    if token:
+                        yield token
+                    if done:
+                        break
+            except (asyncio.CancelledError, GeneratorExit):
+                # Reply abandoned (barge-in): close the connection instead of
+                # returning it to the pool, so Ollama stops generating
+                response.close()
+                raise
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
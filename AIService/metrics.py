@@ -0,0 +1,186 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Seconds; covers 5 ms VAD passes up to multi-second LLM replies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered in Prometheus text format.
+    The last `window` raw observations are kept for exact percentiles."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, window=4096):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        """{"p50": ..., ...} over the recent window, {} before any observation"""
+        with self._lock:
+            values = list(self.recent)
+        if not values:
+            return {}
+        return {f"p{q}": round(float(v), 4) for q, v in zip(qs, np.percentile(values, qs))}
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.recent.clear()
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield f"{self.name}_bucket", (("le", _format_value(bound)),), cumulative
+        yield f"{self.name}_sum", (), total
+        yield f"{self.name}_count", (), cumulative
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield f"{self.name}_total", (), self.value
+
+
+class Gauge:
+    """Settable value, or a callback read at scrape time. The callback may
+    return a number or {label value: number} for the gauge's one label."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, fn=None, label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self):
+        value = self.fn() if self.fn is not None else self.value
+        if isinstance(value, dict):
+            for label_value, v in value.items():
+                yield self.name, ((self.label, label_value),), v
+        else:
+            yield self.name, (), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # Re-registering a name replaces it, e.g. a callback gauge rebound
+        # to the runner created on startup
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Every metric in Prometheus text exposition format 0.0.4"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, buckets))
+
+
+def counter(name, help):
+    return REGISTRY.register(Counter(name, help))
+
+
+def gauge(name, help, fn=None, label=None):
+    return REGISTRY.register(Gauge(name, help, fn, label))
+
+
+# Voice pipeline stages, one observation per call / turn
+DECODE_SECONDS = histogram("voice_decode_seconds", "PCM decode, resample and normalize")
+VAD_SECONDS = histogram("voice_vad_seconds", "Silence trimming before ASR")
+ASR_SECONDS = histogram("voice_asr_seconds", "Whisper transcription of one batch")
+LLM_TTFT_SECONDS = histogram("voice_llm_ttft_seconds", "LLM request to first streamed token")
+LLM_SECONDS = histogram("voice_llm_seconds", "Whole LLM reply")
+TTS_FIRST_CHUNK_SECONDS = histogram("voice_tts_first_chunk_seconds", "First sentence ready to its audio ready")
+TTS_SECONDS = histogram("voice_tts_seconds", "All speech synthesis of one reply")
+FIRST_AUDIO_SECONDS = histogram("voice_turn_first_audio_seconds", "User audio received to first assistant audio sent")
+INTERRUPTIONS = counter("voice_interruptions", "Replies cut off by the user (barge-in)")
+ACTIVE_SESSIONS = gauge("voice_active_sessions", "Open websocket sessions")
+
+# Replies started on a likely end of turn, before it is confirmed
+SPECULATIONS = counter("voice_speculations", "Speculative replies started")
+SPECULATION_HITS = counter("voice_speculation_hits", "Speculative replies used for the confirmed turn")
+SPECULATION_WASTED = counter("voice_speculation_wasted", "Speculative replies cancelled or discarded")
+SPECULATION_WASTED_SECONDS = counter("voice_speculation_wasted_seconds", "Time spent on discarded speculative replies")
+SPECULATION_HEAD_START_SECONDS = histogram("voice_speculation_head_start_seconds", "Speculative reply start to turn confirmation")
@@ -0,0 +1,354 @@
+"""One process that owns Whisper and Kokoro, serving many web workers.
+
+Front-end processes (app.py with WEB_WORKERS > 1, or MODEL_SERVER_SOCKET
+set) use RemotePipeline instead of loading their own copy of the models.
+Requests are small JSON headers over a Unix socket; audio samples and
+synthesized WAV bytes travel in multiprocessing.shared_memory segments,
+never pickled.
+
+ASR latency histograms are observed in this process, so it serves its own
+Prometheus /metrics on MODEL_SERVER_METRICS_PORT (0 disables); the web
+workers' /metrics covers decode, VAD, LLM, TTS and sessions.
+
+    python model_server.py --socket /tmp/voice_model_server.sock
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from batching import MicroBatcher
+from metrics import REGISTRY, gauge
+from voice_frontend import VoiceFrontEnd
+
+SOCKET_PATH = os.environ.get("MODEL_SERVER_SOCKET", "/tmp/voice_model_server.sock")
+METRICS_PORT = int(os.environ.get("MODEL_SERVER_METRICS_PORT", 9464))
+
+
+def _create_shm(size):
+    return SharedMemory(create=True, size=max(size, 1))
+
+
+def _attach_shm(name):
+    # Attaching registers the segment with this process's resource tracker
+    # too (3.13 adds track=False to skip it), which would unlink it when
+    # this process exits; the process that created it owns it
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def pack_arrays(arrays):
+    """float32 arrays -> (shm, lengths) with the arrays back to back"""
+    lengths = [len(a) for a in arrays]
+    shm = _create_shm(sum(lengths) * 4)
+    flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+    offset = 0
+    for array, length in zip(arrays, lengths):
+        flat[offset:offset + length] = array
+        offset += length
+    del flat
+    return shm, lengths
+
+
+def unpack_arrays(shm, lengths):
+    """Copies out of the segment, so it can be closed right away"""
+    flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+    arrays = []
+    offset = 0
+    for length in lengths:
+        arrays.append(flat[offset:offset + length].copy())
+        offset += length
+    del flat
+    return arrays
+
+
+def pack_bytes(blobs):
+    """bytes objects -> (shm, lengths)"""
+    lengths = [len(b) for b in blobs]
+    shm = _create_shm(sum(lengths))
+    offset = 0
+    for blob in blobs:
+        shm.buf[offset:offset + len(blob)] = blob
+        offset += len(blob)
+    return shm, lengths
+
+
+def unpack_bytes(shm, lengths):
+    blobs = []
+    offset = 0
+    for length in lengths:
+        blobs.append(bytes(shm.buf[offset:offset + length]))
+        offset += length
+    return blobs
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve REGISTRY on http://host:port/metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    print(f"Model server metrics on http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
+
+
+class ModelServer:
+    """Serves the model half of a pipeline on a Unix socket, one thread per
+    front-end connection. ASR_MAX_BATCH / TTS_MAX_BATCH > 1 batch requests
+    from every worker together; otherwise calls are serialized per model
+    (ASR_WORKERS / TTS_WORKERS at a time), like the in-process executors."""
+
+    def __init__(self, pipeline, address=SOCKET_PATH):
+        self.pipeline = pipeline
+        self.address = address
+        self.asr_slots = threading.Semaphore(int(os.environ.get("ASR_WORKERS", 1)))
+        self.tts_slots = threading.Semaphore(int(os.environ.get("TTS_WORKERS", 2)))
+        self.asr_batcher = None
+        if int(os.environ.get("ASR_MAX_BATCH", 1)) > 1:
+            self.asr_batcher = MicroBatcher(
+                pipeline.transcribe_batch,
+                max_batch_size=int(os.environ["ASR_MAX_BATCH"]),
+                max_wait_ms=float(os.environ.get("ASR_BATCH_WAIT_MS", 20)),
+                name="whisper-batcher",
+            )
+        self.tts_batcher = None
+        if int(os.environ.get("TTS_MAX_BATCH", 1)) > 1:
+            self.tts_batcher = MicroBatcher(
+                self._synthesize_batch,
+                max_batch_size=int(os.environ["TTS_MAX_BATCH"]),
+                max_wait_ms=float(os.environ.get("TTS_BATCH_WAIT_MS", 10)),
+                name="kokoro-batcher",
+            )
+        batchers = [b for b in (self.asr_batcher, self.tts_batcher) if b is not None]
+        gauge("voice_batcher_pending", "Items queued in a micro-batcher",
+              fn=lambda: {batcher.name: batcher.pending for batcher in batchers}, label="batcher")
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family="AF_UNIX") as listener:
+            print(f"Model server listening on {self.address}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = json.loads(conn.recv_bytes())
+                except (EOFError, OSError):
+                    return
+                # Reply segments stay owned by this process: they are
+                # unlinked once the front end has read them, or when it is
+                # gone, so a worker dying mid-reply leaks nothing
+                segments = []
+                try:
+                    try:
+                        reply = self.dispatch(request, segments)
+                    except Exception as e:
+                        reply = {"error": f"{type(e).__name__}: {e}"}
+                    conn.send_bytes(json.dumps(reply).encode())
+                    if segments and "error" not in reply:
+                        conn.recv_bytes()  # {"method": "release"}
+                except (EOFError, OSError):
+                    return
+                finally:
+                    for shm in segments:
+                        shm.close()
+                        shm.unlink()
+
+    def dispatch(self, request, segments):
+        method = request["method"]
+        if method == "status":
+            return {
+                "ready": self.pipeline.ready.is_set(),
+                "init_timings": self.pipeline.init_timings,
+                "init_error": self.pipeline.init_error,
+            }
+        if not self.pipeline.ready.is_set():
+            raise RuntimeError("models are still loading")
+        if method == "transcribe_batch":
+            shm = _attach_shm(request["shm"])
+            try:
+                audios = unpack_arrays(shm, request["lengths"])
+            finally:
+                shm.close()
+            return {"texts": self._transcribe(audios, request["sample_rate"])}
+        if method == "synthesize_sentences":
+            results = self._synthesize(request["sentences"], request.get("max_phonemes"))
+            chunks = [[chunk for chunk, _ in result] for result in results]
+            shm, lengths = pack_bytes([wav for result in results for _, wav in result])
+            segments.append(shm)
+            return {"chunks": chunks, "shm": shm.name, "lengths": lengths}
+        if method == "generate_speech":
+            with self.tts_slots:
+                wav = self.pipeline.generate_speech(request["text"])
+            shm, lengths = pack_bytes([wav])
+            segments.append(shm)
+            return {"shm": shm.name, "lengths": lengths}
+        raise ValueError(f"unknown method {method!r}")
+
+    def _transcribe(self, audios, sample_rate):
+        if self.asr_batcher is not None:
+            futures = [self.asr_batcher.submit(audio) for audio in audios]
+            return [future.result() for future in futures]
+        with self.asr_slots:
+            return self.pipeline.transcribe_batch(audios, sample_rate)
+
+    def _synthesize_batch(self, items):
+        """Batcher target: (sentence, max_phonemes) items, one
+        synthesize_sentences run per phoneme budget"""
+        groups = {}
+        for i, (_, max_phonemes) in enumerate(items):
+            groups.setdefault(max_phonemes, []).append(i)
+        results = [None] * len(items)
+        for max_phonemes, indices in groups.items():
+            kwargs = {"max_phonemes": max_phonemes} if max_phonemes else {}
+            sentences = [items[i][0] for i in indices]
+            for i, result in zip(indices, self.pipeline.synthesize_sentences(sentences, **kwargs)):
+                results[i] = result
+        return results
+
+    def _synthesize(self, sentences, max_phonemes):
+        if self.tts_batcher is not None:
+            futures = [self.tts_batcher.submit((sentence, max_phonemes)) for sentence in sentences]
+            return [future.result() for future in futures]
+        kwargs = {"max_phonemes": max_phonemes} if max_phonemes else {}
+        with self.tts_slots:
+            return [self.pipeline.synthesize_sentence(sentence, **kwargs) for sentence in sentences]
+
+
+class RemotePipeline(VoiceFrontEnd):
+    """Pipeline for front-end workers: decode, VAD and LLM calls run here,
+    ASR and TTS are forwarded to the model server. Each thread keeps its
+    own connection, so calls from the executor threads run in parallel."""
+
+    def __init__(self, address=SOCKET_PATH, lazy=True, connect_timeout=600):
+        self.address = address
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        self._init_front_end()
+        if not lazy:
+            self.initialize_models()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX")
+        return conn
+
+    def _call(self, request, wait_reply=True):
+        try:
+            conn = self._connection()
+            conn.send_bytes(json.dumps(request).encode())
+            if not wait_reply:
+                return None
+            reply = json.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            # Model server restarted: reconnect on the next call
+            self._local.conn = None
+            raise
+        if "error" in reply:
+            raise RuntimeError(f"model server: {reply['error']}")
+        return reply
+
+    def initialize_models(self):
+        """Wait for the model server to come up and finish loading"""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                status = self._call({"method": "status"})
+                if status["init_error"]:
+                    self.init_error = status["init_error"]
+                    raise RuntimeError(f"model server failed to load: {self.init_error}")
+                if status["ready"]:
+                    break
+            except (FileNotFoundError, ConnectionRefusedError, EOFError):
+                pass
+            if time.monotonic() > deadline:
+                self.init_error = "model server not ready"
+                raise TimeoutError(self.init_error)
+            time.sleep(0.5)
+        self.init_timings = {f"model_server_{k}": v for k, v in status["init_timings"].items()}
+        self.ready.set()
+
+    def transcribe_batch(self, audios, sample_rate=16000):
+        shm, lengths = pack_arrays([np.asarray(a, dtype=np.float32) for a in audios])
+        try:
+            reply = self._call({"method": "transcribe_batch", "shm": shm.name,
+                                "lengths": lengths, "sample_rate": sample_rate})
+        finally:
+            shm.close()
+            shm.unlink()
+        return reply["texts"]
+
+    def transcribe_audio(self, audio_data, sample_rate):
+        return self.transcribe_batch([audio_data], sample_rate)[0]
+
+    def _read_reply_bytes(self, reply):
+        shm = _attach_shm(reply["shm"])
+        try:
+            return unpack_bytes(shm, reply["lengths"])
+        finally:
+            shm.close()
+            # The server unlinks the segment once it is read
+            self._call({"method": "release"}, wait_reply=False)
+
+    def synthesize_sentences(self, sentences, max_phonemes=None):
+        reply = self._call({"method": "synthesize_sentences", "sentences": list(sentences),
+                            "max_phonemes": max_phonemes})
+        wavs = iter(self._read_reply_bytes(reply))
+        return [[(chunk, next(wavs)) for chunk in chunks] for chunks in reply["chunks"]]
+
+    def synthesize_sentence(self, sentence, max_phonemes=None):
+        return self.synthesize_sentences([sentence], max_phonemes)[0]
+
+    def generate_speech(self, text):
+        reply = self._call({"method": "generate_speech", "text": text})
+        return self._read_reply_bytes(reply)[0]
+
+
+def build_model_pipeline():
+    if os.environ.get("VOICE_BACKEND", "models") == "stub":
+        from stub_pipeline import StubPipeline
+        return StubPipeline.from_env()
+    from pipeline import SpeechProcessingPipeline
+    max_batch = int(os.environ.get("ASR_MAX_BATCH", 1))
+    return SpeechProcessingPipeline(warmup_batch_sizes=tuple(sorted({1, max_batch})), lazy=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT)
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    pipeline = build_model_pipeline()
+    # Accept connections right away; front ends poll "status" until ready
+    threading.Thread(target=pipeline.initialize_models, name="model-init", daemon=True).start()
+    if args.metrics_port:
+        serve_metrics(args.metrics_port, args.metrics_host)
+    ModelServer(pipeline, args.socket).serve_forever()
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import platform
+import threading
+import time
+import onnxruntime as ort
+
+OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+DEFAULT_OPTIMIZED_DIR = "models/onnx_optimized"
+
+# name -> {"seconds": ..., "optimized_cache": "hit" | "saved" | "off"}
+SESSION_TIMINGS = {}
+_shared_arena_registered = False
+
+
+def _setting(prefix, key, default):
+    """{prefix}_{key} env var, else ORT_{key}, else default"""
+    return os.environ.get(f"{prefix}_{key}", os.environ.get(f"ORT_{key}", default))
+
+
+def default_providers():
+    """CUDA first if this onnxruntime build has it, CPU as fallback"""
+    available = ort.get_available_providers()
+    return [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+
+
+def _register_shared_arena():
+    # One CPU arena for every session that sets session.use_env_allocators,
+    # instead of a private arena per session
+    global _shared_arena_registered
+    if _shared_arena_registered:
+        return
+    memory_info = ort.OrtMemoryInfo("Cpu", ort.OrtAllocatorType.ORT_ARENA_ALLOCATOR, 0, ort.OrtMemType.DEFAULT)
+    ort.create_and_register_allocator(memory_info, ort.OrtArenaCfg(0, -1, -1, -1))
+    _shared_arena_registered = True
+
+
+def hardware_tag():
+    """Machine type plus a short hash of the CPU's feature flags: optimized
+    graphs can hold kernels picked for AVX2 / AVX-512 / NEON"""
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = " ".join(sorted(line.split(":", 1)[1].split()))
+                    break
+    except OSError:
+        flags = platform.processor()
+    return f"{platform.machine()}-{hashlib.sha1(flags.encode()).hexdigest()[:8]}"
+
+
+def _optimized_path(model_path, optimized_dir, level, providers):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(model_path)))
+    # Optimized graphs depend on the ORT version, level, providers and CPU
+    provider_tag = "+".join(p.replace("ExecutionProvider", "").lower() for p in providers)
+    return os.path.join(
+        optimized_dir,
+        f"{parent}_{stem}.{level}.{provider_tag}.{hardware_tag()}.ort{ort.__version__}.onnx",
+    )
+
+
+def create_session(model_path, name=None, prefix="ORT", providers=None,
+                   intra_op_threads=None, inter_op_threads=None,
+                   optimization_level=None, execution_mode=None,
+                   optimized_dir=None, shared_arena=None):
+    """Build an InferenceSession with explicit threading / optimization settings.
+
+    Every setting can come from the arguments, from {prefix}_* env vars
+    (e.g. KOKORO_INTRA_OP_THREADS) or from the global ORT_* ones:
+    INTRA_OP_THREADS, INTER_OP_THREADS (0 = ORT default), OPT_LEVEL
+    (disable/basic/extended/all), EXECUTION_MODE (sequential/parallel),
+    OPTIMIZED_DIR ("" turns the cache off) and SHARED_ARENA (1/0).
+
+    On CPU-only sessions the optimized graph is saved to OPTIMIZED_DIR on
+    the first start; later starts load it with optimizations disabled, so
+    they skip the graph rewrite. Creation time is printed and kept in
+    SESSION_TIMINGS.
+    """
+    name = name or os.path.basename(model_path)
+    providers = providers or default_providers()
+    intra_op_threads = int(intra_op_threads if intra_op_threads is not None else _setting(prefix, "INTRA_OP_THREADS", 0))
+    inter_op_threads = int(inter_op_threads if inter_op_threads is not None else _setting(prefix, "INTER_OP_THREADS", 0))
+    optimization_level = optimization_level or _setting(prefix, "OPT_LEVEL", "all")
+    execution_mode = execution_mode or _setting(prefix, "EXECUTION_MODE", "sequential")
+    if optimized_dir is None:
+        optimized_dir = _setting(prefix, "OPTIMIZED_DIR", DEFAULT_OPTIMIZED_DIR)
+    if shared_arena is None:
+        shared_arena = _setting(prefix, "SHARED_ARENA", "1") == "1"
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = EXECUTION_MODES[execution_mode]
+    options.graph_optimization_level = OPTIMIZATION_LEVELS[optimization_level]
+    if shared_arena:
+        _register_shared_arena()
+        options.add_session_config_entry("session.use_env_allocators", "1")
+
+    path = model_path
+    cache = "off"
+    # Saved optimized graphs are only portable for the CPU provider
+    if optimized_dir and providers == ["CPUExecutionProvider"] and optimization_level != "disable":
+        optimized_path = _optimized_path(model_path, optimized_dir, optimization_level, providers)
+        if os.path.exists(optimized_path) and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path):
+            path = optimized_path
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            cache = "hit"
+        else:
+            os.makedirs(optimized_dir, exist_ok=True)
+            # Written under a name of its own and renamed once complete, so
+            # workers starting together never load a half-written graph
+            options.optimized_model_filepath = f"{optimized_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            cache = "saved"
+
+    start = time.perf_counter()
+    session = ort.InferenceSession(path, sess_options=options, providers=providers)
+    if cache == "saved":
+        os.replace(options.optimized_model_filepath, optimized_path)
+    elapsed = time.perf_counter() - start
+    SESSION_TIMINGS[name] = {"seconds": round(elapsed, 3), "optimized_cache": cache}
+    print(
+        f"ONNX session {name}: {elapsed:.2f}s, providers={session.get_providers()}, "
+        f"threads={intra_op_threads}/{inter_op_threads}, opt={optimization_level}, "
+        f"mode={execution_mode}, optimized cache={cache}"
+    )
+    return session
@@ -1,94 +1,201 @@
+import os
 import torch
 import soundfile as sf
 import numpy as np
 import subprocess
-import librosa
 import io
 import wave
 import json
-import requests
 import time
-from datetime import datetime
-from zoneinfo import ZoneInfo
 from transformers import (
     AutoProcessor,
-    AutoModelForSpeechSeq2Seq,
 )
 import torchaudio
-from kokoro_onnx import KokoroTTS
+from concurrent.futures import ThreadPoolExecutor
+from kokoro_onnx import DEFAULT_SPEED, DEFAULT_VOICE, KokoroTTS
+from audio_cache import SpeechCache, float_to_pcm16
+from metrics import ASR_SECONDS
+from asr_backends import asr_dtype, load_whisper_model, select_asr_backend
+from voice_frontend import SYSTEM_PROMPT_TEST, VoiceFrontEnd
+from whisper_window import FRAME_BUCKETS, FULL_WINDOW_FRAMES, HOP_LENGTH, pick_frame_bucket, encode_window
 
-OLLAMA_BASE_URL = "http://107.124.124.71:11434"
+# Phoneme budget per streamed TTS chunk, smaller chunks = earlier first audio
+TTS_CHUNK_PHONEMES = 200
 
-class SpeechProcessingPipeline:
-    def __init__(self):
+class SpeechProcessingPipeline(VoiceFrontEnd):
+    def __init__(self, short_window=None, asr_backend=None, warmup_steps=None,
+                 warmup_batch_sizes=(1,), lazy=False):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.initialize_models()
+        # fp16 on CUDA, int8 dynamic quantization on CPU unless ASR_BACKEND says otherwise
+        self.asr_backend = select_asr_backend(self.device, asr_backend)
+        self.asr_dtype = asr_dtype(self.asr_backend)
+        if warmup_steps is None:
+            warmup_steps = int(os.environ.get("WHISPER_WARMUP_STEPS", 1))
+        self.warmup_steps = warmup_steps
+        self.warmup_batch_sizes = warmup_batch_sizes
+        # Size the Whisper encoder window to the utterance instead of always
+        # 30 s. Off until bench_whisper_window.py / test_whisper_window.py
+        # show the same transcripts as the 30 s window on real clips
+        if short_window is None:
+            short_window = os.environ.get("WHISPER_SHORT_WINDOW", "0") == "1"
+        self.short_window = short_window
+        # VAD, LLM clients and readiness state, see voice_frontend.py
+        self._init_front_end()
+        # lazy=True leaves initialize_models to the caller, e.g. a server
+        # that starts listening first and loads the models in the background
+        if not lazy:
+            self.initialize_models()
+
+    def _timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.init_timings[phase] = round(time.perf_counter() - start, 3)
+        print(f"Init {phase}: {self.init_timings[phase]:.2f}s")
+        return result
 
     def initialize_models(self):
-        """Khởi tạo model với Kokoro ONNX thay vì API"""
-        print("Initializing Whisper model...")
-        self.whisper_processor = AutoProcessor.from_pretrained("models/whisper-large-v3-turbo")
-        self.whisper_model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            "models/whisper-large-v3-turbo",
-            torch_dtype=torch.float16,
-            low_cpu_mem_usage=True,
-            use_safetensors=True,
-        ).to(self.device)
-        
+        """Khởi tạo model với Kokoro ONNX thay vì API.
+        Whisper and Kokoro load and warm up in parallel threads; ready is
+        set once both are done."""
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-init") as pool:
+                futures = [pool.submit(self._init_whisper), pool.submit(self._init_tts)]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            self.init_error = f"{type(e).__name__}: {e}"
+            raise
+        self.init_timings["total"] = round(time.perf_counter() - start, 3)
+        print(f"Models ready in {self.init_timings['total']:.2f}s: {self.init_timings}")
+        self.ready.set()
+
+    def _init_whisper(self):
+        print(f"Initializing Whisper model ({self.asr_backend} on {self.device})...")
+        self.whisper_processor = self._timed(
+            "whisper_processor", AutoProcessor.from_pretrained, "models/whisper-large-v3-turbo")
+        self.whisper_model = self._timed(
+            "whisper_load", load_whisper_model, "models/whisper-large-v3-turbo", self.device, self.asr_backend)
+
         print("Warnup STT...")
-        self.warmup_whisper()
-        
+        self._timed("whisper_warmup", self.warmup_whisper, self.warmup_steps)
+
+    def _init_tts(self):
         print("Initializing Text-to-Speech model...")
         # Thay đổi thành Kokoro ONNX
-        self.tts_engine = KokoroTTS()
-        
-    def warmup_whisper(self, warmup_steps=3):
-        # Tạo dummy input chuẩn Whisper
-        dummy_input = torch.randn(
-            1,  # batch_size
-            128,  # num_mel_bins
-            3000  # sequence_length (tương đương ~30s audio)
-        ).to(self.device, dtype=torch.float16)
+        self.tts_engine = self._timed("kokoro_load", KokoroTTS)
+        # Memory + on-disk cache of synthesized PCM, see audio_cache.py
+        self.speech_cache = self._timed("speech_cache", SpeechCache)
+        self._timed("kokoro_warmup", self.warmup_tts)
+
+    def warmup_whisper(self, warmup_steps=1):
+        # Warm every encoder shape transcribe_batch can use, so the first
+        # real request of each length does not pay for kernel selection
+        buckets = FRAME_BUCKETS if self.short_window else (FULL_WINDOW_FRAMES,)
 
         # Warmup cả encoder và decoder
         with torch.no_grad():
             for _ in range(warmup_steps):
-                # Chạy full pipeline
-                generated_ids = self.whisper_model.generate(
-                    dummy_input,
-                    max_new_tokens=128,
-                    temperature=0.0,
-                    return_timestamps=False,
-                    language='en'
-                )
-                
-                # Giải phóng bộ nhớ ngay lập tức
-                del generated_ids
-                torch.cuda.empty_cache()        
+                for batch_size in self.warmup_batch_sizes:
+                    for frames in buckets:
+                        # Log-mel of a quiet signal, like real speech
+                        # padding, instead of unit-variance noise
+                        dummy_input = (torch.randn(
+                            batch_size,
+                            128,  # num_mel_bins
+                            frames  # sequence_length (3000 ~ 30s audio)
+                        ) * 0.1 - 0.5).to(self.device, dtype=self.asr_dtype)
+
+                        # A short utterance decodes to a few dozen tokens,
+                        # enough to warm the decoder without 128-step loops
+                        generated_ids = self.whisper_model.generate(
+                            encoder_outputs=encode_window(self.whisper_model, dummy_input),
+                            max_new_tokens=24,
+                            temperature=0.0,
+                            return_timestamps=False,
+                            language='en'
+                        )
+
+                        # Giải phóng bộ nhớ ngay lập tức
+                        del generated_ids
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+
+    def warmup_tts(self):
+        # One sentence of reply length; bypasses the speech cache so the
+        # ONNX run happens even when the phrase is already cached
+        tokens, ref_s = self.tts_engine.prepare_inputs("Sure, that sounds great. How was your day?",
+                                                       voice_file=DEFAULT_VOICE)
+        self.tts_engine.synthesize(tokens, ref_s, speed=DEFAULT_SPEED)
 
     @torch.inference_mode()
     def generate_speech(self, text):
         """Sử dụng Kokoro ONNX để generate speech"""
-        # Generate tokens and reference style
-        tokens, ref_s = self.tts_engine.prepare_inputs(text, voice_file='af_bella.bin')
-        
-        # Synthesize audio
-        audio = self.tts_engine.synthesize(tokens, ref_s)
-        
-        # Get the first audio array (assuming batch size 1)
-        audio_data = audio[0]
-        
         # Save and display the audio
         # filename = "output.wav"
         # sf.write(filename, audio_data, 24000)
         # # display(Audio(data=audio_data, rate=24000, autoplay=True))
         # print(f"Saved {filename}")
+        return self.encode_wav(np.frombuffer(self.synthesize_pcm(text), dtype="<i2"))
+
+    def synthesize_pcm(self, text):
+        """16-bit PCM for text, from the speech cache when it has been said before"""
+        return self.speech_cache.get_or_synthesize(text, DEFAULT_VOICE, DEFAULT_SPEED, self._synthesize_pcm)
+
+    @torch.inference_mode()
+    def _synthesize_pcm(self, text):
+        # Generate tokens and reference style
+        tokens, ref_s = self.tts_engine.prepare_inputs(text, voice_file=DEFAULT_VOICE)
+        
+        # Synthesize audio
+        audio = self.tts_engine.synthesize(tokens, ref_s, speed=DEFAULT_SPEED)
+        
+        # Get the first audio array (assuming batch size 1)
+        return float_to_pcm16(audio[0])
+
+    @torch.inference_mode()
+    def synthesize_pcm_batch(self, texts):
+        """synthesize_pcm for several texts: cache hits are served directly,
+        the misses go through one batched Kokoro run when this export's
+        batches match single runs (KokoroTTS.batch_matches_single), else one
+        run each"""
+        pcms = [self.speech_cache.get(text, DEFAULT_VOICE, DEFAULT_SPEED) for text in texts]
+        missing = [i for i, pcm in enumerate(pcms) if pcm is None]
+        if len(missing) > 1 and self.tts_engine.batch_matches_single():
+            batch = [self.tts_engine.prepare_inputs(texts[i], voice_file=DEFAULT_VOICE) for i in missing]
+            waveforms = self.tts_engine.synthesize_batch(batch, speed=DEFAULT_SPEED)
+            for i, waveform in zip(missing, waveforms):
+                pcms[i] = float_to_pcm16(waveform)
+                self.speech_cache.put(texts[i], DEFAULT_VOICE, DEFAULT_SPEED, pcms[i])
+        else:
+            for i in missing:
+                pcms[i] = self.synthesize_pcm(texts[i])
+        return pcms
+
+    def synthesize_sentence(self, sentence, max_phonemes=TTS_CHUNK_PHONEMES):
+        """Synthesize one sentence chunk by chunk, one Kokoro run each,
+        returns [(chunk_text, wav_bytes), ...]"""
+        return [(chunk, self.generate_speech(chunk))
+                for chunk in self.tts_engine.split_text(sentence, max_phonemes=max_phonemes)]
+
+    def synthesize_sentences(self, sentences, max_phonemes=TTS_CHUNK_PHONEMES):
+        """Synthesize several sentences from different sessions (the
+        TTS_MAX_BATCH batcher) with a single ONNX run, returns one
+        [(chunk_text, wav_bytes), ...] per sentence"""
+        chunked = [self.tts_engine.split_text(sentence, max_phonemes=max_phonemes) for sentence in sentences]
+        pcms = iter(self.synthesize_pcm_batch([chunk for chunks in chunked for chunk in chunks]))
+        return [[(chunk, self.encode_wav(np.frombuffer(next(pcms), dtype="<i2"))) for chunk in chunks]
+                for chunks in chunked]
+
+    @staticmethod
+    def encode_wav(audio_data, sample_rate=24000):
+        """Encode a float waveform as 16-bit PCM WAV bytes"""
         # Tạo buffer trong memory
         with io.BytesIO() as buffer:
             sf.write(
                 buffer,
                 audio_data,
-                24000,
+                sample_rate,
                 format='WAV',
                 subtype='PCM_16'
             )
@@ -97,180 +204,52 @@ class SpeechProcessingPipeline:
         return wav_bytes
         
 
-    def load_audio_file(self, audio_data, sample_rate):
-        """Load audio file and return sample rate and numpy array"""
-        # audio_data, sample_rate = sf.read(file_path)
-        if audio_data.ndim > 1:
-            audio_data = np.mean(audio_data, axis=1)
-        audio_data = audio_data.astype(np.float32)
-        return audio_data, sample_rate
-    
-    def preprocess_audio(self, audio_data, sample_rate):
-        """Preprocess audio for Whisper model"""
-        audio_data = audio_data.astype("float32")
-        audio_data /= np.max(np.abs(audio_data))
-        
-        if sample_rate != 16000:
-            audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=16000)
-            sample_rate = 16000
-            
-        return audio_data, sample_rate
-    
     def transcribe_audio(self, audio_data, sample_rate):
         """Transcribe audio to text using Whisper"""
-        inputs = self.whisper_processor(
-            audio_data, 
-            sampling_rate=sample_rate, 
-            return_tensors="pt",
-        ).to(self.device, torch.float16)
-        
-        with torch.no_grad():
-            generated_ids = self.whisper_model.generate(**inputs,
-                                                        language='en')
-            
-        transcription = self.whisper_processor.batch_decode(
-            generated_ids, 
-            skip_special_tokens=True
-        )[0]
-        return transcription
-    
-    def generate_response(self, chat_history):
-        """Generate conversational response using Qwen model"""
-        vietnam_date = datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")).date()
-        
-        SYSTEM_PROMPT = f"""\
-You are an AI conversation assistant named **NEURA**.  
-Your main task is to help the **user improve their English speaking skills** through casual conversation.  
-You are currently talking to the user in real-time.  
-Do **not** make any grammar, spelling, or formatting mistakes.  
-The current time is **{vietnam_date}**.
-
-## Role Instructions:
-- Please be as brief as possible with every question.
-- You are having a live, spoken-style conversation with the user.
-- Your personality should be friendly, natural, and encouraging.
-- Your focus is to help the user **practice English speaking fluency**.
-
-<Requirements>
-### Language:
-- Always respond in **English only**.
-- **Never** switch to any other language, even if the user asks you to.
-
-### Response Style:
-- Keep each response **short and simple**, like normal spoken language.
-- Each response must be **only one line**.
-- Do **not explain**, **define**, or **elaborate** unless specifically asked in English.
-- Responses must feel like a real-time chat or spoken dialogue.
+        return self.transcribe_batch([audio_data], sample_rate)[0]
 
+    def transcribe_batch(self, audios, sample_rate=16000):
+        """Transcribe several utterances with one batched Whisper generate"""
+        with ASR_SECONDS.time():
+            return self._transcribe_batch(audios, sample_rate)
 
-### Tone and Format:
-- Talk as if you're having a **natural, face-to-face conversation** with the user.
-- Use **spoken English only**, no formal writing.
-- **Do not use any icons, emojis, symbols, markdown, or special characters**.
-
-## Example:
-**User:** How are you today?  
-**ONE:** I'm doing great, thanks! How about you?
-
-**User:** What's your favorite food?  
-**ONE:** I really like pizza, it's always a good choice.
-<Requirements/>
-
-Make sure to follow these rules consistently for every response."""
-        
-        # user_prompt = "Treat the following as a message from the user. Respond in natural, spoken English with one short line: " + user_input.strip()
-
-
-        # Định nghĩa URL của API
-        # url_api = f"{OLLAMA_BASE_URL}/api/generate"  # Thay thế bằng URL thực tế của API Ollama
-        url_api = f"{OLLAMA_BASE_URL}/api/chat"
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-
-        # Chuẩn bị dữ liệu cho phần thân yêu cầu
-        # data = {
-        #     "model": "qwen2.5-coder:7b",
-        #     "system": SYSTEM_PROMPT,
-        #     "prompt": chat_history,
-        #     "stream": False
-        # }
-        SYSTEM_PROMPT_TEST = """
-- You are Neura a virtual assistant that helps you learn English.
-- Communicate naturally like a human conversation.
-- Answer as briefly as possible.
-- You always respond in English no matter what language the user uses.
-- Only talk and respond to English related topics. No coding, no talking about sensitive topics.
-        """
-        chat_history.append({"role": "system", "content": SYSTEM_PROMPT_TEST})
-        
-        data = {
-            "model": "qwen2.5-coder:7b",
-            "system": SYSTEM_PROMPT_TEST,
-            "options": {
-                    "num_predict": 64  # <-- Điều chỉnh độ dài response tại đây
-                        },
-            "messages": chat_history,
-            "stream": False
-        }
-
-        # Chuyển dữ liệu sang JSON
-        # body_json = json.dumps(data)
-
-        # Gửi yêu cầu POST
-        try:
-            # response = requests.post(url_api, headers=headers, data=body_json)
-            response = requests.post(
-                url_api,
-                headers=headers,
-                json=data,
-            )
-            response.raise_for_status()  # Ném ngoại lệ nếu trạng thái HTTP không thành công
-
-            # response_dict = json.loads(response.content)
-            # response_str = str(response_dict.get("response", ""))
-            result = response.json()
-            print(result["message"]["content"])
+    def _transcribe_batch(self, audios, sample_rate=16000):
+        """Transcribe several utterances with one batched Whisper generate.
+        The feature extractor pads every utterance to the same mel window:
+        the smallest frame bucket that fits the longest one when the short
+        window is on, otherwise the full 30 s."""
+        frames = pick_frame_bucket(max(len(a) for a in audios))
+        if not self.short_window or frames == FULL_WINDOW_FRAMES:
+            inputs = self.whisper_processor(
+                audios, 
+                sampling_rate=sample_rate, 
+                return_tensors="pt",
+            ).to(self.device, self.asr_dtype)
             
-            return result["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            print("Lỗi gửi yêu cầu:", e)
-
-    def process_audio_file(self, audio_bytes):
-        """Complete pipeline: audio file -> text -> response -> speech"""
-        # Step 1: Load and preprocess audio
-        # with open("test.wav", "wb") as f:
-        #     f.write(audio_bytes)
-        audio_buffer = io.BytesIO(audio_bytes)
-        audio_buffer.seek(0)
-        audio_data, original_sr = sf.read(audio_buffer, channels=1, samplerate=16000, subtype="PCM_16", format='RAW')
-        if original_sr != 16000:
-            audio_data = librosa.resample(audio_data, orig_sr=original_sr, target_sr=16000)
-        
-        if len(audio_data.shape) > 1:
-            audio_data = librosa.to_mono(audio_data.T)
+            with torch.no_grad():
+                generated_ids = self.whisper_model.generate(**inputs,
+                                                            language='en')
+        else:
+            inputs = self.whisper_processor(
+                audios,
+                sampling_rate=sample_rate,
+                return_tensors="pt",
+                padding="max_length",
+                max_length=frames * HOP_LENGTH,
+                truncation=True,
+            )
+            input_features = inputs.input_features.to(self.device, self.asr_dtype)
+            with torch.no_grad():
+                encoder_outputs = encode_window(self.whisper_model, input_features)
+                generated_ids = self.whisper_model.generate(encoder_outputs=encoder_outputs,
+                                                            language='en')
             
-        audio_data, sample_rate = self.load_audio_file(audio_data, original_sr)
-        audio_data, sample_rate = self.preprocess_audio(audio_data, sample_rate)
-        # wav_buffer = io.BytesIO()
-        # sf.write(wav_buffer, audio_data, 16000, format='wav', subtype='PCM_16')
-        # wav_buffer.seek(0)
-        
-        
-        # Step 2: Transcribe audio to text
-        transcription = self.transcribe_audio(audio_data, sample_rate)
-        print(f"Transcription: {transcription}")
-        
-        # Step 3: Generate response
-        # response = self.generate_response(transcription)
-        # print(f"Response: {response}")
-        
-        # Step 4: Convert response to speech
-        # self.generate_speech(response)
-        
-        return transcription
-
+        transcriptions = self.whisper_processor.batch_decode(
+            generated_ids, 
+            skip_special_tokens=True
+        )
+        return transcriptions
+    
 # # Phần sử dụng và test giữ nguyên
 # if __name__ == "__main__":
 #     # pipeline = SpeechProcessingPipeline()
@@ -4,6 +4,9 @@ from onnxruntime import InferenceSession
 import time
 import json
 from misaki import en
+from voice_bank import get_voice_bank
+from g2p_cache import CachedG2P
+from onnx_sessions import create_session
 import sounddevice as sd
 
 class KokoroTTS:
@@ -12,7 +15,9 @@ class KokoroTTS:
         self.model_dir = model_dir or os.path.join(self.current_dir, "Kokoro-82M-ONNX")
         
         self.phoneme2id = self._load_phoneme_mapping()
-        self.g2p = en.G2P(trf=False, british=False, fallback=None)
+        self.voices = get_voice_bank(self.model_dir)
+        # G2P is pure Python ahead of every ONNX call, reuse it across replies
+        self.g2p = CachedG2P(en.G2P(trf=False, british=False, fallback=None))
         self.session = self._load_onnx_session()
 
     def _load_phoneme_mapping(self):
@@ -27,7 +32,7 @@ class KokoroTTS:
 
     def _load_onnx_session(self):
         model_path = os.path.join(self.model_dir, "onnx", "model_uint8f16.onnx")
-        return InferenceSession(model_path)
+        return create_session(model_path, name="kokoro", prefix="KOKORO")
 
     def text_to_phonemes(self, text):
         phonemes, _ = self.g2p(text)
@@ -37,10 +42,8 @@ class KokoroTTS:
         phonemes = self.text_to_phonemes(text)
         token_ids = [self.phoneme2id[p] for p in phonemes]
         
-        # Load voice reference
-        voice_path = os.path.join(self.model_dir, "voices", voice_file)
-        voices = np.fromfile(voice_path, dtype=np.float32).reshape(-1, 1, 256)
-        ref_s = voices[len(token_ids)]
+        # Voice reference: zero-copy row of the shared memory-mapped voice bank
+        ref_s = self.voices.style(voice_file, len(token_ids))
         
         # Add start/end tokens
         tokens = [[0, *token_ids, 0]]
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from metrics import (
+    SPECULATION_HEAD_START_SECONDS,
+    SPECULATION_HITS,
+    SPECULATION_WASTED,
+    SPECULATION_WASTED_SECONDS,
+    SPECULATIONS,
+)
+
+
+class Speculation:
+    def __init__(self, text, task, prepare):
+        self.text = text
+        self.task = task
+        self.prepare = prepare
+        self.started = time.perf_counter()
+        self.finished = None
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self.finished = time.perf_counter()
+        # Retrieve it so a discarded failure is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def failed(self):
+        return self.task.done() and (self.task.cancelled() or self.task.exception() is not None)
+
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class Speculator:
+    """Starts the reply to a user's transcript once its EOU probability
+    reaches likely_threshold (TURN_LIKELY_THRESHOLD, 0 disables), below the
+    threshold that confirms the turn, so the LLM runs during the silence
+    that confirms it.
+
+    At most one speculation per session. take() hands it over when the
+    confirmed turn has the same text; a different text, or discard() when
+    the user keeps talking, cancels it and counts it as wasted. A
+    speculation that failed or was cancelled is wasted too, and the turn
+    gets a normal reply instead.
+    """
+
+    def __init__(self, likely_threshold=None):
+        self.likely_threshold = float(
+            os.environ.get("TURN_LIKELY_THRESHOLD", 0.3) if likely_threshold is None else likely_threshold
+        )
+        self.current = None
+        self.started = 0
+        self.hits = 0
+        self.wasted = 0
+        self.wasted_seconds = 0.0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.started if self.started else 0.0
+
+    def consider(self, text, prob, prepare):
+        """Start prepare(text) when prob makes the end of turn likely"""
+        if self.likely_threshold <= 0 or prob is None or prob < self.likely_threshold:
+            return
+        if self.current is not None and self.current.text == text:
+            return
+        self.discard()
+        self.current = Speculation(text, asyncio.create_task(prepare(text)), prepare)
+        self.started += 1
+        SPECULATIONS.inc()
+
+    def discard(self, text=None):
+        """Cancel the speculation, unless it is for text (still current)"""
+        if self.current is None or (text is not None and self.current.text == text):
+            return
+        self.current.task.cancel()
+        self._wasted(self.current)
+        self.current = None
+
+    def _wasted(self, speculation):
+        elapsed = speculation.elapsed()
+        self.wasted += 1
+        self.wasted_seconds += elapsed
+        SPECULATION_WASTED.inc()
+        SPECULATION_WASTED_SECONDS.inc(elapsed)
+
+    def take(self, text):
+        """Awaitable reply for the confirmed turn text, or None when there is
+        no usable speculation (the caller runs a normal reply)"""
+        self.discard(text)
+        if self.current is None:
+            return None
+        speculation, self.current = self.current, None
+        if speculation.failed():
+            self._wasted(speculation)
+            return None
+        return self._hand_over(speculation, time.perf_counter() - speculation.started)
+
+    async def _hand_over(self, speculation, head_start):
+        # Counted as a hit only once it has produced the reply: if it fails
+        # after the turn was confirmed, the reply is prepared again
+        try:
+            result = await speculation.task
+        except Exception as e:
+            print(f"Speculative reply failed, preparing it again: {e}")
+            self._wasted(speculation)
+            return await speculation.prepare(speculation.text)
+        self.hits += 1
+        SPECULATION_HITS.inc()
+        SPECULATION_HEAD_START_SECONDS.observe(head_start)
+        return result
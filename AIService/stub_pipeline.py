@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import time
+from fake_ollama import DEFAULT_REPLIES, split_tokens
+from metrics import ASR_SECONDS, LLM_SECONDS, LLM_TTFT_SECONDS
+from text_chunking import split_sentences
+
+# 0.2 s of 16-bit silence at 24 kHz, enough for a client to decode
+STUB_WAV = b"RIFF" + (36 + 9600).to_bytes(4, "little") + b"WAVEfmt " + bytes.fromhex(
+    "1000000001000100" + "c05d0000" + "80bb0000" + "02001000"
+) + b"data" + (9600).to_bytes(4, "little") + bytes(9600)
+
+
+class StubPipeline:
+    """Deterministic stand-in for SpeechProcessingPipeline.
+
+    Same methods, no models: each stage just sleeps for a configurable
+    latency. Blocking stages use time.sleep like the real Whisper/Kokoro
+    calls, the async LLM path uses asyncio.sleep like a real HTTP wait.
+    """
+
+    def __init__(self, asr_latency=0.3, llm_first_token=0.2, llm_token_delay=0.02,
+                 tts_latency=0.15, asr_batch_item_latency=0.03, tts_batch_item_latency=0.02,
+                 replies=None):
+        self.asr_latency = asr_latency
+        self.llm_first_token = llm_first_token
+        self.llm_token_delay = llm_token_delay
+        self.tts_latency = tts_latency
+        # Extra cost of each additional utterance in a batched Whisper call
+        self.asr_batch_item_latency = asr_batch_item_latency
+        self.tts_batch_item_latency = tts_batch_item_latency
+        self.replies = replies or DEFAULT_REPLIES
+        self._turn = 0
+        # Same readiness surface as SpeechProcessingPipeline(lazy=True)
+        self.init_timings = {}
+        self.init_error = None
+        self.ready = threading.Event()
+
+    @classmethod
+    def from_env(cls):
+        """Latencies from STUB_* env vars (seconds), e.g. STUB_ASR_LATENCY=0.3"""
+        names = ("asr_latency", "llm_first_token", "llm_token_delay", "tts_latency",
+                 "asr_batch_item_latency", "tts_batch_item_latency")
+        return cls(**{name: float(os.environ[f"STUB_{name.upper()}"])
+                      for name in names if f"STUB_{name.upper()}" in os.environ})
+
+    def initialize_models(self):
+        self.ready.set()
+
+    def _next_reply(self):
+        reply = self.replies[self._turn % len(self.replies)]
+        self._turn += 1
+        return reply
+
+    def _llm_latency(self, reply):
+        return self.llm_first_token + self.llm_token_delay * (len(split_tokens(reply)) - 1)
+
+    def process_audio_file(self, audio_bytes):
+        with ASR_SECONDS.time():
+            time.sleep(self.asr_latency)
+        return "I went hiking with my friends."
+
+    def prepare_audio(self, audio_bytes):
+        return audio_bytes, 16000
+
+    def prepare_samples(self, audio_data, sample_rate):
+        return audio_data, sample_rate
+
+    def transcribe_audio(self, audio_data, sample_rate):
+        return self.transcribe_batch([audio_data], sample_rate)[0]
+
+    def transcribe_batch(self, audios, sample_rate=16000):
+        with ASR_SECONDS.time():
+            time.sleep(self.asr_latency + self.asr_batch_item_latency * (len(audios) - 1))
+        return ["I went hiking with my friends."] * len(audios)
+
+    def generate_response(self, chat_history):
+        reply = self._next_reply()
+        time.sleep(self._llm_latency(reply))
+        return reply
+
+    async def agenerate_response(self, chat_history):
+        reply = self._next_reply()
+        with LLM_SECONDS.time():
+            await asyncio.sleep(self._llm_latency(reply))
+        return reply
+
+    async def agenerate_response_stream(self, chat_history):
+        start = time.perf_counter()
+        await asyncio.sleep(self.llm_first_token)
+        LLM_TTFT_SECONDS.observe(time.perf_counter() - start)
+        for i, token in enumerate(split_tokens(self._next_reply())):
+            if i:
+                await asyncio.sleep(self.llm_token_delay)
+            yield token
+        LLM_SECONDS.observe(time.perf_counter() - start)
+
+    def generate_speech(self, text):
+        time.sleep(self.tts_latency * max(len(split_sentences(text)), 1))
+        return STUB_WAV
+
+    def synthesize_sentence(self, sentence, max_phonemes=None):
+        time.sleep(self.tts_latency)
+        return [(sentence, STUB_WAV)]
+
+    def synthesize_sentences(self, sentences, max_phonemes=None):
+        time.sleep(self.tts_latency + self.tts_batch_item_latency * (len(sentences) - 1))
+        return [[(sentence, STUB_WAV)] for sentence in sentences]
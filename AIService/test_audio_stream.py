@@ -0,0 +1,28 @@
+import numpy as np
+from audio_stream import PCMRingBuffer
+
+
+def samples(start, end):
+    return np.arange(start, end, dtype=np.float32)
+
+
+def test_reads_follow_absolute_indices_across_the_wrap():
+    ring = PCMRingBuffer(8)
+    ring.append(samples(0, 5))
+    ring.append(samples(5, 11))
+    assert ring.total == 11
+    assert ring.oldest == 3
+    np.testing.assert_array_equal(ring.read(0), samples(3, 11))
+    np.testing.assert_array_equal(ring.read(6, 9), samples(6, 9))
+
+
+def test_chunk_longer_than_the_buffer_keeps_its_tail_in_place():
+    ring = PCMRingBuffer(8)
+    ring.append(samples(0, 3))
+    ring.append(samples(3, 23))
+    # Every sample counts towards total, the last 8 are readable where they belong
+    assert ring.total == 23
+    np.testing.assert_array_equal(ring.read(ring.oldest), samples(15, 23))
+    np.testing.assert_array_equal(ring.read(18, 20), samples(18, 20))
+    ring.append(samples(23, 26))
+    np.testing.assert_array_equal(ring.read(20), samples(20, 26))
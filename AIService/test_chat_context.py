@@ -0,0 +1,71 @@
+from chat_context import ChatContext
+
+SYSTEM = "be brief"
+
+
+def words(text):
+    return len(text.split())
+
+
+def make_context(turns, **kwargs):
+    kwargs = {"max_tokens": 200, "reply_tokens": 20, "summary_tokens": 20, "count_tokens": words, **kwargs}
+    return ChatContext(turns=turns, **kwargs)
+
+
+def exchange(i):
+    return [{"role": "user", "content": f"question {i} " + "word " * 6},
+            {"role": "assistant", "content": f"answer {i} " + "word " * 6}]
+
+
+def conversation(n):
+    """n exchanges plus the next question, as the prompt is built for it"""
+    return [message for i in range(n) for message in exchange(i)] + exchange(n)[:1]
+
+
+def test_short_conversation_is_sent_whole():
+    context = make_context(conversation(2))
+    messages = context.messages(SYSTEM)
+    assert messages[1:] == conversation(2)
+    assert context.summary is None
+
+
+def test_trimming_keeps_the_prompt_under_the_budget():
+    context = make_context(conversation(10))
+    messages = context.messages(SYSTEM)
+    assert context.prompt_tokens <= context.max_tokens - context.reply_tokens
+    # Kept turns start on a user turn and end with the newest one
+    assert messages[2]["role"] == "user"
+    assert messages[-1] == conversation(10)[-1]
+    # The newest dropped user turns survive as a note
+    assert messages[1]["role"] == "system"
+    assert "question 7" in messages[1]["content"]
+
+
+def test_prefix_stays_identical_until_the_budget_is_hit_again():
+    context = make_context(conversation(10))
+    first = context.messages(SYSTEM)
+    start = context.start
+    context.append(exchange(10)[1])
+    context.append(exchange(11)[0])
+    second = context.messages(SYSTEM)
+    assert context.start == start
+    assert second[:len(first)] == first
+    # Turns keep coming until the budget forces a new cut
+    for i in range(11, 15):
+        context.append(exchange(i)[1])
+        context.append(exchange(i + 1)[0])
+        context.messages(SYSTEM)
+    assert context.start > start
+    assert context.prompt_tokens <= context.max_tokens - context.reply_tokens
+
+
+def test_fork_leaves_the_original_untouched():
+    context = make_context(conversation(10))
+    context.messages(SYSTEM)
+    start, summary = context.start, context.summary
+    fork = context.fork(*exchange(10)[1:], *conversation(16)[22:])
+    fork.messages(SYSTEM)
+    fork.record_usage({"prompt_eval_count": 90})
+    assert fork.start > start
+    assert (context.start, context.summary, context.usage) == (start, summary, [])
+    assert len(context) == len(conversation(10))
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from executors import Stage
+
+
+def test_cancelled_call_keeps_its_slot_until_the_thread_is_done():
+    async def main():
+        stage = Stage("tts", workers=2, max_pending=1)
+        release = threading.Event()
+        events = []
+
+        def slow():
+            events.append("slow start")
+            release.wait(2)
+            events.append("slow end")
+
+        def fast():
+            events.append("fast")
+
+        first = asyncio.create_task(stage.run(slow))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        second = asyncio.create_task(stage.run(fast))
+        await asyncio.sleep(0.05)
+        # Barge-in cancelled the awaiter, but the model call is still running
+        assert stage.active == 1 and stage.waiting == 1
+        assert events == ["slow start"]
+        release.set()
+        await second
+        assert events == ["slow start", "slow end", "fast"]
+        assert stage.active == 0
+        stage.shutdown()
+
+    asyncio.run(main())
+
+
+def test_cancelled_call_that_has_not_started_frees_its_slot():
+    async def main():
+        stage = Stage("asr", workers=1, max_pending=2)
+        release = threading.Event()
+        ran = []
+        busy = asyncio.create_task(stage.run(release.wait, 2))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(stage.run(ran.append, "queued"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.sleep(0.05)
+        assert stage.active == 1
+        release.set()
+        await busy
+        await asyncio.sleep(0.05)
+        assert ran == [] and stage.active == 0
+        stage.shutdown()
+
+    asyncio.run(main())
+
+
+def test_results_and_errors_come_back():
+    async def main():
+        stage = Stage("asr", workers=1)
+        assert await stage.run(sum, [1, 2]) == 3
+        try:
+            await stage.run(int, "x")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+        assert stage.active == 0
+        stage.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from g2p_cache import CachedG2P
+
+# Case-dependent pronunciations, like misaki's lexicon
+LEXICON = {"Polish": "pˈOlɪʃ", "polish": "pˈɑlɪʃ", "May": "mˈA", "may": "mA", "help": "hˈɛlp",
+           "shoes": "ʃˈuz", "apple": "ˈæpᵊl", "car": "kˈɑɹ", "red": "ɹˈɛd", ".": "."}
+VOWELS = "aeiou"
+
+
+class FakeG2P:
+    """misaki stand-in: "the" is ði before a vowel and ðə otherwise"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        words = text.replace(".", " .").split()
+        tokens = []
+        for i, word in enumerate(words):
+            if word.lower() == "the":
+                following = words[i + 1] if i + 1 < len(words) else ""
+                phonemes = "ði" if following[:1].lower() in VOWELS else "ðə"
+            else:
+                phonemes = LEXICON[word]
+            tokens.append(SimpleNamespace(text=word, phonemes=phonemes))
+        return " ".join(token.phonemes for token in tokens).replace(" .", "."), tokens
+
+
+def test_words_differing_in_case_are_cached_apart():
+    g2p = FakeG2P()
+    cached = CachedG2P(g2p)
+    cached("Polish shoes.")
+    cached("May help polish shoes.")
+    calls = g2p.calls
+
+    # "polish" came after "Polish": it must not reuse its phonemes
+    assert cached("polish shoes.")[0] == "pˈɑlɪʃ ʃˈuz."
+    assert cached("Polish shoes help.")[0] == "pˈOlɪʃ ʃˈuz hˈɛlp."
+    assert g2p.calls == calls
+
+
+def test_sentence_of_cached_words_skips_g2p():
+    g2p = FakeG2P()
+    cached = CachedG2P(g2p)
+    cached("Polish shoes.")
+    cached("May help polish shoes.")
+    calls = g2p.calls
+    assert cached("May polish Polish shoes.")[0] == "mˈA pˈɑlɪʃ pˈOlɪʃ ʃˈuz."
+    assert g2p.calls == calls
+
+
+def test_context_dependent_words_are_not_assembled_from_the_word_cache():
+    g2p = FakeG2P()
+    cached = CachedG2P(g2p)
+    cached("the apple.")
+    cached("red car.")
+    calls = g2p.calls
+    # Every word has been seen, but "the" sounds different before "car"
+    assert cached("the car.")[0] == "ðə kˈɑɹ."
+    assert g2p.calls == calls + 1
+    assert cached("the red apple.")[0] == "ðə ɹˈɛd ˈæpᵊl."
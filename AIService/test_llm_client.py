@@ -0,0 +1,202 @@
+import asyncio
+import time
+import pytest
+from fake_ollama import FakeOllamaServer
+from llm_client import AsyncOllamaClient, CircuitBreaker, CircuitOpenError, LLMError, OllamaClient
+
+REPLY = "one two three four five six seven eight nine ten"
+DATA = {"model": "fake", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def fake_server(**kwargs):
+    kwargs = {"replies": [REPLY], "first_token_delay": 0, "token_delay": 0, **kwargs}
+    return FakeOllamaServer(**kwargs)
+
+
+def sync_client(server, **kwargs):
+    return OllamaClient(base_url=server.base_url, backoff=0, **kwargs)
+
+
+def test_failed_requests_are_retried():
+    with fake_server(fail_requests=2) as server:
+        client = sync_client(server, retries=2)
+        assert client.chat(DATA) == REPLY
+        assert len(server.requests) == 3
+        assert client.breaker.state == "closed"
+
+
+def test_gives_up_after_the_last_retry():
+    with fake_server(fail_requests=10) as server:
+        client = sync_client(server, retries=1)
+        with pytest.raises(LLMError):
+            client.chat(DATA)
+        assert len(server.requests) == 2
+
+
+def test_bad_request_is_not_retried():
+    with fake_server(fail_requests=10, error_status=400) as server:
+        client = sync_client(server, retries=2)
+        with pytest.raises(Exception) as error:
+            client.chat(DATA)
+        assert not isinstance(error.value, LLMError)
+        assert len(server.requests) == 1
+
+
+def test_deadline():
+    with fake_server(first_token_delay=1.0) as server:
+        client = sync_client(server, retries=0, timeout=0.2)
+        start = time.monotonic()
+        with pytest.raises(LLMError):
+            client.chat(DATA)
+        assert time.monotonic() - start < 0.8
+
+
+def test_async_deadline_covers_the_whole_stream():
+    async def main():
+        with fake_server(token_delay=0.1) as server:
+            client = AsyncOllamaClient(base_url=server.base_url, retries=0, timeout=0.3)
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    async for _ in client.chat_stream(DATA):
+                        pass
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_circuit_opens_and_rejects_calls():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    with fake_server(fail_requests=10) as server:
+        client = sync_client(server, retries=1, breaker=breaker)
+        with pytest.raises(LLMError):
+            client.chat(DATA)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            client.chat(DATA)
+        # Rejected without reaching the server
+        assert len(server.requests) == 2
+
+
+def test_half_open_trial_success_closes_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    with fake_server(fail_requests=2) as server:
+        client = sync_client(server, retries=1, breaker=breaker)
+        with pytest.raises(LLMError):
+            client.chat(DATA)
+        time.sleep(0.15)
+        assert breaker.state == "half-open"
+        assert client.chat(DATA) == REPLY
+        assert breaker.state == "closed"
+
+
+def test_half_open_trial_failure_opens_the_circuit_again():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    with fake_server(fail_requests=10) as server:
+        client = sync_client(server, retries=1, breaker=breaker)
+        with pytest.raises(LLMError):
+            client.chat(DATA)
+        time.sleep(0.15)
+        assert breaker.state == "half-open"
+        # One trial request, then the circuit is open again
+        with pytest.raises(CircuitOpenError):
+            client.chat(DATA)
+        assert breaker.state == "open"
+        assert len(server.requests) == 3
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_stream_yields_tokens_and_usage():
+    async def main():
+        with fake_server() as server:
+            client = AsyncOllamaClient(base_url=server.base_url, backoff=0)
+            stats = {}
+            try:
+                tokens = [token async for token in client.chat_stream(DATA, stats=stats)]
+            finally:
+                await client.close()
+            return tokens, stats
+
+    tokens, stats = asyncio.run(main())
+    assert "".join(tokens) == REPLY
+    assert stats["eval_count"] == len(REPLY.split())
+
+
+async def wait_for_abort(server, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not server.aborted and time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+    return server.aborted
+
+
+def test_closing_a_stream_mid_reply_aborts_it():
+    async def main():
+        with fake_server(token_delay=0.05) as server:
+            client = AsyncOllamaClient(base_url=server.base_url, backoff=0)
+            try:
+                stream = client.chat_stream(DATA)
+                tokens = [await stream.__anext__() for _ in range(2)]
+                await stream.aclose()
+                return tokens, await wait_for_abort(server)
+            finally:
+                await client.close()
+
+    tokens, aborted = asyncio.run(main())
+    assert "".join(tokens) == "one two"
+    assert aborted == 1
+
+
+def test_cancelled_reply_aborts_the_stream():
+    async def main():
+        with fake_server(token_delay=0.05) as server:
+            client = AsyncOllamaClient(base_url=server.base_url, backoff=0)
+            received = []
+
+            async def consume():
+                async for token in client.chat_stream(DATA):
+                    received.append(token)
+
+            try:
+                task = asyncio.create_task(consume())
+                while len(received) < 2:
+                    await asyncio.sleep(0.01)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+                return await wait_for_abort(server)
+            finally:
+                await client.close()
+
+    assert asyncio.run(main()) == 1
+
+
+def test_cancelled_half_open_trial_frees_the_circuit():
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        with fake_server(fail_requests=1, first_token_delay=0.5) as server:
+            client = AsyncOllamaClient(base_url=server.base_url, retries=0, backoff=0, breaker=breaker)
+            try:
+                with pytest.raises(LLMError):
+                    await client.chat(DATA)
+                await asyncio.sleep(0.15)
+                assert breaker.state == "half-open"
+                # Barge-in cancels the trial call before the server answers
+                trial = asyncio.create_task(client.chat(DATA))
+                await asyncio.sleep(0.1)
+                trial.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await trial
+                server.first_token_delay = 0
+                return await client.chat(DATA)
+            finally:
+                await client.close()
+
+    assert asyncio.run(main()) == REPLY
@@ -0,0 +1,133 @@
+import asyncio
+from speculation import Speculator
+
+
+def replier(fail_first=0):
+    """prepare() stand-in that records its calls; the first fail_first calls raise"""
+    calls = []
+
+    async def prepare(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        if len(calls) <= fail_first:
+            raise RuntimeError("LLM down")
+        return f"reply to {text}"
+
+    return prepare, calls
+
+
+def test_failed_speculation_is_a_miss():
+    async def main():
+        prepare, calls = replier(fail_first=1)
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        await asyncio.sleep(0.05)
+        return speculator.take("hello"), speculator
+
+    prepared, speculator = asyncio.run(main())
+    assert prepared is None
+    assert (speculator.hits, speculator.wasted) == (0, 1)
+
+
+def test_cancelled_speculation_is_a_miss():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        speculator.current.task.cancel()
+        await asyncio.sleep(0)
+        return speculator.take("hello"), speculator
+
+    prepared, speculator = asyncio.run(main())
+    assert prepared is None
+    assert (speculator.hits, speculator.wasted) == (0, 1)
+
+
+def test_speculation_failing_after_the_hand_over_is_prepared_again():
+    async def main():
+        prepare, calls = replier(fail_first=1)
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        reply = await speculator.take("hello")
+        return reply, calls, speculator
+
+    reply, calls, speculator = asyncio.run(main())
+    assert reply == "reply to hello"
+    assert calls == ["hello", "hello"]
+    assert (speculator.hits, speculator.wasted) == (0, 1)
+
+
+def test_same_text_is_a_hit():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        # Scored again with the same text: still one speculation
+        speculator.consider("hello", 0.6, prepare)
+        return await speculator.take("hello"), calls, speculator
+
+    reply, calls, speculator = asyncio.run(main())
+    assert reply == "reply to hello"
+    assert calls == ["hello"]
+    assert (speculator.hits, speculator.wasted, speculator.hit_rate) == (1, 0, 1.0)
+
+
+def test_unlikely_end_of_turn_starts_nothing():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.2, prepare)
+        speculator.consider("hello", None, prepare)
+        Speculator(likely_threshold=0).consider("hello", 0.9, prepare)
+        return speculator.take("hello"), calls
+
+    assert asyncio.run(main()) == (None, [])
+
+
+def test_other_text_is_a_miss():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        task = speculator.current.task
+        prepared = speculator.take("hello there")
+        await asyncio.sleep(0)
+        return prepared, task, speculator
+
+    prepared, task, speculator = asyncio.run(main())
+    assert prepared is None
+    assert task.cancelled()
+    assert (speculator.hits, speculator.wasted) == (0, 1)
+
+
+def test_discard_keeps_the_speculation_for_the_current_text():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        speculator.discard("hello")
+        kept = speculator.current is not None
+        # The user went on talking
+        speculator.discard("hello there")
+        return kept, speculator
+
+    kept, speculator = asyncio.run(main())
+    assert kept
+    assert speculator.current is None
+    assert speculator.wasted == 1
+    assert speculator.wasted_seconds >= 0
+
+
+def test_new_text_replaces_the_running_speculation():
+    async def main():
+        prepare, calls = replier()
+        speculator = Speculator(likely_threshold=0.3)
+        speculator.consider("hello", 0.4, prepare)
+        speculator.consider("hello there", 0.5, prepare)
+        return await speculator.take("hello there"), calls, speculator
+
+    reply, calls, speculator = asyncio.run(main())
+    assert reply == "reply to hello there"
+    # The first one was cancelled before it got to run
+    assert calls == ["hello there"]
+    assert (speculator.started, speculator.hits, speculator.wasted) == (2, 1, 1)
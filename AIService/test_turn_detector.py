@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from turn_detector import EOUState, TurnDetector
+
+VOCAB = 8
+EOU_ID = 7
+
+
+class FakeSession:
+    """ONNX-session stand-in with a KV-cache signature. With reject_past it
+    fails whenever it is handed a non-empty cache, like an export whose
+    past layout differs from what run_model feeds."""
+
+    def __init__(self, extra_inputs=(), reject_past=False):
+        self.inputs = [SimpleNamespace(name="input_ids", shape=["batch", "seq"], type="tensor(int64)")]
+        for kind in ("key", "value"):
+            self.inputs.append(SimpleNamespace(name=f"past_key_values.0.{kind}", shape=["batch", 2, "past", 4],
+                                               type="tensor(float)"))
+        self.inputs += [SimpleNamespace(name=name, shape=[1], type="tensor(bool)") for name in extra_inputs]
+        self.reject_past = reject_past
+        self.runs = []
+
+    def get_inputs(self):
+        return self.inputs
+
+    def get_outputs(self):
+        return [SimpleNamespace(name=name) for name in ("logits", "present.0.key", "present.0.value")]
+
+    def run(self, output_names, feeds):
+        past = feeds.get("past_key_values.0.key")
+        past_len = 0 if past is None else past.shape[2]
+        self.runs.append((feeds["input_ids"].shape[1], past_len))
+        if self.reject_past and past_len:
+            raise RuntimeError("past_key_values.0.key: unexpected shape")
+        batch, new = feeds["input_ids"].shape
+        # EOU probability grows with the total sequence length
+        logits = np.zeros((batch, new, VOCAB), dtype=np.float32)
+        logits[:, :, EOU_ID] = np.arange(past_len + 1, past_len + new + 1) / 4
+        present = np.zeros((batch, 2, past_len + new, 4), dtype=np.float32)
+        return [logits, present, present][:len(output_names)]
+
+
+def make_detector(session, ids_by_text):
+    detector = object.__new__(TurnDetector)
+    detector.MAX_HISTORY = 2
+    detector.eou_token_id = EOU_ID
+    detector.onnx_session = session
+    detector.tokenize = lambda chat_ctx: (chat_ctx[-1]["content"], ids_by_text[chat_ctx[-1]["content"]])
+    detector.inspect_inputs()
+    return detector
+
+
+def user(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_incremental_scores_only_new_tokens():
+    session = FakeSession()
+    detector = make_detector(session, {"a": [1, 2, 3], "a b": [1, 2, 3, 4, 5]})
+    state = EOUState()
+    detector.calculate_eou(user("a"), state)
+    prob = detector.calculate_eou(user("a b"), state)
+    assert session.runs == [(3, 0), (2, 3)]
+    assert prob == pytest.approx(make_detector(FakeSession(), {"a b": [1, 2, 3, 4, 5]}).calculate_eou(user("a b")))
+
+
+def test_rejected_cache_falls_back_to_full_prefix():
+    session = FakeSession(reject_past=True)
+    detector = make_detector(session, {"a": [1, 2, 3], "a b": [1, 2, 3, 4, 5]})
+    state = EOUState()
+    detector.calculate_eou(user("a"), state)
+    prob = detector.calculate_eou(user("a b"), state)
+    assert prob > 0
+    assert not detector.supports_kv_cache
+    assert session.runs[-1] == (5, 0)
+
+
+def test_unknown_inputs_disable_the_incremental_path():
+    detector = make_detector(FakeSession(extra_inputs=["use_cache_branch"]), {})
+    assert not detector.supports_kv_cache
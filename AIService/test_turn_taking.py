@@ -0,0 +1,148 @@
+import pytest
+from turn_taking import IDLE, RESPONDING, SPEAKING, TurnTaker
+
+
+def make_taker(**kwargs):
+    kwargs = {"min_silence_ms": 300, "max_silence_ms": 1600, "eou_threshold": 0.5, "debounce_ms": 0,
+              "false_turn_ms": 1000, **kwargs}
+    return TurnTaker(**kwargs)
+
+
+def score(taker, now, prob):
+    version, _ = taker.eou_request(now)
+    taker.eou_result(version, prob)
+
+
+def test_turn_waits_for_the_final_transcript_of_an_open_utterance():
+    taker = make_taker()
+    # Audio client: speech, an interim transcript, then silence
+    taker.speech(0.0)
+    taker.utterance(True)
+    taker.add_text("i went hiking", 0.1, final=False)
+    score(taker, 0.2, 0.9)
+    # Past min_silence with a confident EOU, but the stream has not
+    # reached its endpoint yet
+    assert taker.poll(0.5) is None
+
+    # The stream endpoints: final transcription is on its way
+    taker.final_pending()
+    taker.utterance(False)
+    assert taker.poll(0.8) is None
+
+    taker.add_text("I went hiking.", 0.9, final=True)
+    score(taker, 0.9, 0.9)
+    assert taker.poll(1.3) == "I went hiking."
+    # The turn fires once, with the final text only
+    assert taker.state == RESPONDING
+    assert taker.poll(2.0) is None
+
+
+def test_turn_fires_after_min_silence_when_eou_is_confident():
+    taker = make_taker()
+    taker.add_text("how are you", 0.0)
+    taker.speech(0.0)
+    score(taker, 0.0, 0.9)
+    assert taker.poll(0.2) is None
+    assert taker.poll(0.31) == "how are you"
+
+
+def test_low_eou_waits_for_max_silence():
+    taker = make_taker()
+    taker.add_text("i think that", 0.0)
+    taker.speech(0.0)
+    score(taker, 0.0, 0.0)
+    assert taker.poll(1.5) is None
+    assert taker.poll(1.61) == "i think that"
+
+
+def test_unscored_text_waits_for_max_silence():
+    taker = make_taker()
+    taker.add_text("hello", 0.0)
+    taker.speech(0.0)
+    assert taker.required_silence_ms() == 1600
+
+
+def test_stale_eou_result_is_dropped():
+    taker = make_taker()
+    taker.add_text("i went", 0.0)
+    version, _ = taker.eou_request(0.0)
+    taker.add_text("i went hiking", 0.1, final=False)
+    taker.eou_result(version, 0.9)
+    assert not taker.eou_current
+
+
+def test_interim_text_is_replaced_and_final_text_kept():
+    taker = make_taker()
+    taker.add_text("i wen", 0.0, final=False)
+    taker.add_text("i went", 0.1, final=False)
+    assert taker.text == "i went"
+    taker.add_text("I went.", 0.2, final=True)
+    taker.add_text("and then", 0.3, final=False)
+    assert taker.text == "I went. and then"
+
+
+def test_speech_right_after_a_turn_raises_the_threshold():
+    taker = make_taker()
+    taker.add_text("so", 0.0)
+    taker.speech(0.0)
+    score(taker, 0.0, 0.9)
+    assert taker.poll(0.4) == "so"
+    taker.speech(0.6)
+    assert taker.false_turns == 1
+    assert taker.threshold == pytest.approx(0.55)
+
+
+def test_end_response_returns_to_idle_or_speaking():
+    taker = make_taker()
+    taker.add_text("hi", 0.0)
+    taker.speech(0.0)
+    assert taker.poll(2.0) == "hi"
+    taker.end_response()
+    assert taker.state == IDLE
+    taker.add_text("wait", 2.1, final=False)
+    assert taker.state == SPEAKING
+
+
+def test_eou_request_waits_for_the_debounce_and_runs_one_at_a_time():
+    taker = make_taker(debounce_ms=150)
+    taker.add_text("hello", 0.0, final=False)
+    assert taker.eou_request(0.1) is None
+    version, text = taker.eou_request(0.2)
+    assert text == "hello"
+    taker.add_text("hello there", 0.25, final=False)
+    # The first call is still running
+    assert taker.eou_request(0.5) is None
+    taker.eou_result(version, 0.9)
+    assert taker.eou_request(0.5) == (version + 1, "hello there")
+
+
+def test_required_silence_shrinks_as_eou_grows():
+    taker = make_taker()
+    taker.add_text("so then", 0.0)
+    taker.speech(0.0)
+    score(taker, 0.0, 0.25)
+    # Halfway to the threshold: halfway between max and min silence
+    assert taker.required_silence_ms() == pytest.approx(950)
+    assert taker.poll(0.9) is None
+    assert taker.poll(0.96) == "so then"
+
+
+def test_slow_speakers_get_longer_pauses():
+    taker = make_taker()
+    taker.add_text("well", 0.0)
+    taker.speech(0.0)
+    taker.speech(0.4)
+    score(taker, 0.4, 0.9)
+    # A 400 ms pause inside the turn: 1.5 times that before it may end
+    assert taker.required_silence_ms() == pytest.approx(600)
+    assert taker.poll(0.9) is None
+    assert taker.poll(1.01) == "well"
+
+
+def test_turn_ending_on_the_silence_fallback_lowers_the_threshold():
+    taker = make_taker()
+    taker.add_text("and", 0.0)
+    taker.speech(0.0)
+    score(taker, 0.0, 0.1)
+    assert taker.poll(1.61) == "and"
+    assert taker.threshold == pytest.approx(0.475)
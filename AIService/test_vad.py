@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from vad import EnergyVAD, original_position
+
+SR = 16000
+
+
+def tone(seconds):
+    t = np.arange(int(SR * seconds)) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(SR * seconds), dtype=np.float32)
+
+
+def speech_with_pauses():
+    return np.concatenate((silence(0.5), tone(0.5), silence(0.4), tone(0.5), silence(1.2), tone(0.5), silence(0.5)))
+
+
+@pytest.mark.parametrize("max_pause_ms, keep_pause_ms", [(0, 300), (500, 300), (300, 300), (200, 600), (100, 1000)])
+def test_removed_ranges_are_ordered_and_disjoint(max_pause_ms, keep_pause_ms):
+    audio = speech_with_pauses()
+    vad = EnergyVAD(pad_ms=100, max_pause_ms=max_pause_ms, keep_pause_ms=keep_pause_ms)
+    trimmed, removed = vad.trim(audio, SR)
+
+    previous_end = 0
+    for start, end in removed:
+        assert previous_end <= start < end <= len(audio)
+        previous_end = end
+    assert len(trimmed) == len(audio) - sum(end - start for start, end in removed)
+
+
+def test_pauses_shorter_than_keep_pause_are_not_cut():
+    audio = speech_with_pauses()
+    vad = EnergyVAD(pad_ms=100, max_pause_ms=200, keep_pause_ms=600)
+    trimmed, removed = vad.trim(audio, SR)
+    # Leading and trailing silence, plus only the 1.2 s pause
+    assert len(removed) == 3
+    start, end = removed[1]
+    assert (end - start) / SR == pytest.approx(1.0 - 0.6, abs=0.05)
+
+
+def test_original_position_maps_back_past_cuts():
+    audio = speech_with_pauses()
+    vad = EnergyVAD(pad_ms=100, max_pause_ms=500, keep_pause_ms=300)
+    trimmed, removed = vad.trim(audio, SR)
+    for position in (0, len(trimmed) // 2, len(trimmed) - 1):
+        assert trimmed[position] == audio[original_position(position, removed)]
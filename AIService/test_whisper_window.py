@@ -0,0 +1,70 @@
+import os
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+from whisper_window import FULL_WINDOW_FRAMES, encode_window, run_encoder
+
+SHORT_FRAMES = 500
+# Same clips as bench_whisper_window.py
+CLIPS = ["../audio.wav", "test.wav"]
+
+
+def tiny_whisper(max_source_positions):
+    config = WhisperConfig(
+        vocab_size=100, num_mel_bins=80, d_model=64,
+        encoder_layers=2, encoder_attention_heads=4, encoder_ffn_dim=128,
+        decoder_layers=1, decoder_attention_heads=4, decoder_ffn_dim=128,
+        max_source_positions=max_source_positions, max_target_positions=64,
+    )
+    return WhisperForConditionalGeneration(config).eval()
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    return tiny_whisper(FULL_WINDOW_FRAMES // 2)
+
+
+def test_copied_ops_match_the_encoder_on_a_full_window(model):
+    features = torch.randn(1, 80, FULL_WINDOW_FRAMES)
+    encoder = model.get_encoder()
+    with torch.no_grad():
+        expected = encoder(features).last_hidden_state
+    actual = run_encoder(encoder, features).last_hidden_state
+    torch.testing.assert_close(actual, expected)
+
+
+def test_short_window_matches_an_encoder_built_for_its_length(model):
+    # WhisperEncoder only takes the window it was built for: the same weights
+    # in an encoder with SHORT_FRAMES positions are the reference
+    short = tiny_whisper(SHORT_FRAMES // 2)
+    state = model.get_encoder().state_dict()
+    state["embed_positions.weight"] = state["embed_positions.weight"][: SHORT_FRAMES // 2]
+    short.get_encoder().load_state_dict(state)
+
+    features = torch.randn(1, 80, SHORT_FRAMES)
+    with torch.no_grad():
+        expected = short.get_encoder()(features).last_hidden_state
+    actual = encode_window(model, features).last_hidden_state
+    assert actual.shape == (1, SHORT_FRAMES // 2, 64)
+    torch.testing.assert_close(actual, expected)
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    if not os.path.isdir("models/whisper-large-v3-turbo"):
+        pytest.skip("needs the Whisper model")
+    pytest.importorskip("soundfile")
+    from pipeline import SpeechProcessingPipeline
+    return SpeechProcessingPipeline(short_window=True)
+
+
+@pytest.mark.parametrize("path", CLIPS)
+def test_short_window_transcripts_match_the_30s_window(pipeline, path):
+    # The check WHISPER_SHORT_WINDOW=1 depends on, on the repo's real clips
+    from bench_whisper_window import normalize, transcribe_both
+
+    _, (full_text, _), (short_text, _) = transcribe_both(pipeline, path)
+    assert normalize(short_text) == normalize(full_text)
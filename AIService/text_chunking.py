@@ -0,0 +1,50 @@
+import re
+
+# Sentence end: . ! ? (and … ) followed by whitespace, optional closing quotes/brackets
+SENTENCE_END_RE = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…]["\')\]]))\s+')
+# Clause boundaries used when a single sentence is too long for one TTS call
+CLAUSE_END_RE = re.compile(r'(?<=[,;:])\s+')
+
+
+def split_sentences(text):
+    """Split text into sentences, keeping the end punctuation"""
+    text = " ".join(text.split())
+    if not text:
+        return []
+    return [s.strip() for s in SENTENCE_END_RE.split(text) if s.strip()]
+
+
+def split_clauses(sentence):
+    """Split a long sentence at commas / semicolons / colons"""
+    return [c.strip() for c in CLAUSE_END_RE.split(sentence) if c.strip()]
+
+
+def split_words(text, n_parts):
+    """Split text into n_parts runs of roughly equal word count"""
+    words = text.split()
+    n_parts = max(1, min(n_parts, len(words)))
+    size = -(-len(words) // n_parts)
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+class SentenceBuffer:
+    """Accumulate streamed LLM tokens and cut them into finished sentences"""
+
+    def __init__(self):
+        self.text = ""
+
+    def feed(self, token):
+        """Add a token, return the sentences it completed (maybe none)"""
+        self.text += token
+        parts = SENTENCE_END_RE.split(self.text)
+        if len(parts) == 1:
+            return []
+        # The last part is still open until whitespace follows its punctuation
+        self.text = parts[-1]
+        return [" ".join(p.split()) for p in parts[:-1] if p.strip()]
+
+    def flush(self):
+        """Return whatever is left once the stream is done"""
+        rest = " ".join(self.text.split())
+        self.text = ""
+        return [rest] if rest else []
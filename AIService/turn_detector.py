@@ -1,9 +1,13 @@
 import torch
+import asyncio
+import os
 import string
 from transformers import BitsAndBytesConfig
 import numpy as np
 import logging
 import onnxruntime as ort
+from onnx_sessions import create_session
+from batching import MicroBatcher
 from transformers import AutoTokenizer, AutoModelForCausalLM, AutoProcessor
 
 # Logging setup
@@ -12,6 +16,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ONNX_DTYPES = {"tensor(float)": np.float32, "tensor(float16)": np.float16}
+
+
+def common_prefix(a, b):
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class EOUState:
+    """Scoring cache of one session: the token ids already run through the
+    model, their past key/values and the EOU probability after the last one"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ids = []
+        self.past = None
+        self.prob = 0.0
+
+
 class TurnDetector:
     def __init__(self):
         self.HG_MODEL = "models/turn_detector"
@@ -28,14 +56,55 @@ class TurnDetector:
     def load_model(self):
         try:
             self.turn_tokenizer = AutoTokenizer.from_pretrained(self.HG_MODEL)
-            self.onnx_session = ort.InferenceSession(
-                self.ONNX_FILENAME, providers=["CPUExecutionProvider"]
+            # Threads / optimization level come from TURN_* or ORT_* env vars
+            self.onnx_session = create_session(
+                self.ONNX_FILENAME,
+                name="turn_detector",
+                prefix="TURN",
+                providers=["CPUExecutionProvider"],
             )
+            # Looked up once instead of encoding it on every call
+            self.eou_token_id = self.turn_tokenizer.encode("<|im_end|>")[0]
+            self.inspect_inputs()
 
         except Exception as e:
             logger.error(f"Model loading error: {e}")
             raise e
 
+    def inspect_inputs(self):
+        """Find the model's optional inputs.
+
+        Incremental scoring expects the decoder layout of a
+        text-generation-with-past export (optimum's non-merged decoder):
+        inputs input_ids, optionally attention_mask / position_ids, and
+        past_key_values.<layer>.key/value shaped (batch, kv_heads, past_len,
+        head_dim) with fixed kv_heads and head_dim; outputs logits and
+        present.<layer>.key/value in the same layout. Any other input (e.g.
+        the merged export's use_cache_branch) or past shape means every
+        call recomputes the full prefix."""
+        inputs = {i.name: i for i in self.onnx_session.get_inputs()}
+        outputs = {o.name for o in self.onnx_session.get_outputs()}
+        self.input_names = set(inputs)
+        self.past_names = [name for name in inputs if name.startswith("past_key_values")]
+        self.present_names = [name.replace("past_key_values", "present") for name in self.past_names]
+        self.empty_past = {}
+        for name in self.past_names:
+            # (batch, heads, past_len, head_dim): batch 1, nothing cached yet
+            shape = [1] + [dim if isinstance(dim, int) else 0 for dim in inputs[name].shape[1:]]
+            self.empty_past[name] = np.zeros(shape, dtype=ONNX_DTYPES.get(inputs[name].type, np.float32))
+        # Past inputs the full-prefix path can fill with an empty cache
+        self.feeds_empty_past = bool(self.past_names) and all(
+            v.ndim == 4 and v.shape[1] and v.shape[3] for v in self.empty_past.values()
+        )
+        extra = self.input_names - {"input_ids", "attention_mask", "position_ids"} - set(self.past_names)
+        self.supports_kv_cache = (
+            self.feeds_empty_past
+            and not extra
+            and all(name in outputs for name in self.present_names)
+        )
+        if not self.supports_kv_cache:
+            logger.info("Turn detector model has no usable KV cache inputs, EOU is recomputed in full")
+
     def softmax(self, logits):
         try:
             exp_logits = np.exp(logits - np.max(logits))
@@ -62,8 +131,8 @@ class TurnDetector:
                 if msg["role"] in ("user", "assistant"):
                     content = self.normalize_text(msg["content"])
                     if content:
-                        msg["content"] = content
-                        new_chat_ctx.append(msg)
+                        # Copy: the caller's chat history keeps its original text
+                        new_chat_ctx.append({"role": msg["role"], "content": content})
             convo_text = self.turn_tokenizer.apply_chat_template(
                 new_chat_ctx,
                 add_generation_prompt=False,
@@ -76,24 +145,167 @@ class TurnDetector:
             logger.error(f"Format chat context error: {e}")
             return ""
 
-    def calculate_eou(self, chat_ctx):
+    def tokenize(self, chat_ctx):
+        formatted_text = self.format_chat_ctx(chat_ctx[-self.MAX_HISTORY:])
+        inputs = self.turn_tokenizer(
+            formatted_text,
+            truncation=True,
+            max_length=self.MAX_HISTORY_TOKENS,
+        )
+        return formatted_text, list(inputs["input_ids"])
+
+    def run_model(self, new_ids, past_len=0, past=None):
+        """Logits after the last of new_ids, and the present key/values
+        (None when the model has no KV cache). new_ids follow past_len
+        already cached tokens."""
+        total = past_len + len(new_ids)
+        feeds = {"input_ids": np.array([new_ids], dtype=np.int64)}
+        if "attention_mask" in self.input_names:
+            feeds["attention_mask"] = np.ones((1, total), dtype=np.int64)
+        if "position_ids" in self.input_names:
+            feeds["position_ids"] = np.arange(past_len, total, dtype=np.int64)[None, :]
+        if not self.supports_kv_cache:
+            if self.feeds_empty_past:
+                feeds.update(self.empty_past)
+            outputs = self.onnx_session.run(["logits"], feeds)
+            return outputs[0][0, -1, :], None
+        feeds.update(past or self.empty_past)
+        outputs = self.onnx_session.run(["logits"] + self.present_names, feeds)
+        return outputs[0][0, -1, :], dict(zip(self.past_names, outputs[1:]))
+
+    def run_batch(self, batch_ids):
+        """Last-token logits of several token sequences in one run. Right
+        padding: the causal mask already keeps every real token from
+        attending to the pads after it, so their logits match batch size 1."""
+        lengths = [len(ids) for ids in batch_ids]
+        input_ids = np.zeros((len(batch_ids), max(lengths)), dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for i, ids in enumerate(batch_ids):
+            input_ids[i, :len(ids)] = ids
+            attention_mask[i, :len(ids)] = 1
+        feeds = {"input_ids": input_ids}
+        if "attention_mask" in self.input_names:
+            feeds["attention_mask"] = attention_mask
+        if "position_ids" in self.input_names:
+            feeds["position_ids"] = np.broadcast_to(np.arange(max(lengths), dtype=np.int64), input_ids.shape).copy()
+        if self.feeds_empty_past:
+            for name, empty in self.empty_past.items():
+                feeds[name] = np.zeros((len(batch_ids),) + empty.shape[1:], dtype=empty.dtype)
+        logits = self.onnx_session.run(["logits"], feeds)[0]
+        return logits[np.arange(len(batch_ids)), np.array(lengths) - 1]
+
+    def calculate_eou_batch(self, chat_ctxs, states=None):
+        """calculate_eou for several sessions in one ONNX run. Sessions whose
+        transcript did not change since their last score are not run again;
+        the others are scored in full (their cached key/values are dropped)."""
+        states = states or [None] * len(chat_ctxs)
+        probs = [0.0] * len(chat_ctxs)
         try:
-            formatted_text = self.format_chat_ctx(chat_ctx[-self.MAX_HISTORY:])
-            inputs = self.turn_tokenizer(
-                formatted_text,
-                return_tensors="np",
-                truncation=True,
-                max_length=self.MAX_HISTORY_TOKENS,
-            )
-            input_ids = inputs["input_ids"].astype(np.int64)
-            outputs = self.onnx_session.run(["logits"], {"input_ids": input_ids})
-            logits = outputs[0][0, -1, :]
-            probs = self.softmax(logits)
-            eou_token_id = self.turn_tokenizer.encode("<|im_end|>")[0]
-            logger.debug(
-                f"Input text: {formatted_text}, EOU token ID: {eou_token_id}, Probs: {probs}"
-            )
-            return probs[eou_token_id]
+            pending = []
+            for i, (chat_ctx, state) in enumerate(zip(chat_ctxs, states)):
+                _, ids = self.tokenize(chat_ctx)
+                if state is not None and ids and ids == state.ids:
+                    probs[i] = state.prob
+                elif ids:
+                    pending.append((i, ids))
+            if not pending:
+                return probs
+            logits = self.run_batch([ids for _, ids in pending])
+            for (i, ids), row in zip(pending, logits):
+                probs[i] = float(self.softmax(row)[self.eou_token_id])
+                if states[i] is not None:
+                    states[i].ids = ids
+                    states[i].past = None
+                    states[i].prob = probs[i]
+            logger.debug("EOU batch of %d, %d run", len(chat_ctxs), len(pending))
+            return probs
+        except Exception as e:
+            logger.error(f"EOU batch calculation error: {e}")
+            return probs
+
+    def calculate_eou(self, chat_ctx, state=None):
+        """Probability that the last user message ends the turn.
+
+        With a per-session EOUState, only the tokens appended since the last
+        call are run, on top of the cached key/values. When earlier text
+        changed, the cache is cut back to the common token prefix (nothing
+        in common: full recompute). If the model rejects the cached run
+        (see inspect_inputs), that is logged once and every later call
+        recomputes the full prefix."""
+        try:
+            formatted_text, ids = self.tokenize(chat_ctx)
+            if not ids:
+                return 0.0
+            if state is not None and ids == state.ids:
+                return state.prob
+
+            reuse = 0
+            past = None
+            if state is not None and self.supports_kv_cache and state.past is not None:
+                # Feed at least the last token, its logits are the prediction
+                reuse = min(common_prefix(state.ids, ids), len(ids) - 1)
+                if reuse:
+                    past = state.past
+                    if reuse < len(state.ids):
+                        past = {name: v[:, :, :reuse] for name, v in past.items()}
+            try:
+                logits, present = self.run_model(ids[reuse:], reuse, past)
+            except Exception as e:
+                if not self.supports_kv_cache:
+                    raise
+                # The export does not take its cache the way run_model feeds
+                # it: recompute in full from now on instead of scoring 0
+                logger.error(f"Incremental EOU scoring failed, falling back to full recompute: {e}")
+                self.supports_kv_cache = False
+                reuse = 0
+                logits, present = self.run_model(ids)
+            prob = float(self.softmax(logits)[self.eou_token_id])
+            logger.debug("Input text: %s, new tokens: %d/%d, EOU prob: %.4f",
+                          formatted_text, len(ids) - reuse, len(ids), prob)
+            if state is not None:
+                state.ids = ids
+                state.past = present
+                state.prob = prob
+            return prob
         except Exception as e:
             logger.error(f"EOU calculation error: {e}")
-            return 0.0
\ No newline at end of file
+            return 0.0
+
+
+class EOUScorer:
+    """EOU scoring shared by every session.
+
+    TURN_MAX_BATCH > 1 collects concurrent calls for up to TURN_BATCH_WAIT_MS
+    and scores them in one padded ONNX run (calculate_eou_batch). Otherwise
+    each call runs on its own, incrementally from its session's EOUState
+    when the model has a KV cache.
+    """
+
+    def __init__(self, detector, max_batch_size=None, max_wait_ms=None):
+        self.detector = detector
+        max_batch_size = max_batch_size or int(os.environ.get("TURN_MAX_BATCH", 1))
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._score_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms if max_wait_ms is not None else float(os.environ.get("TURN_BATCH_WAIT_MS", 5)),
+                name="eou-batcher",
+            )
+
+    def _score_batch(self, items):
+        return self.detector.calculate_eou_batch([chat_ctx for chat_ctx, _ in items], [state for _, state in items])
+
+    def score_blocking(self, chat_ctx, state=None):
+        if self.batcher is not None:
+            return self.batcher.submit((chat_ctx, state)).result()
+        return self.detector.calculate_eou(chat_ctx, state)
+
+    async def score(self, chat_ctx, state=None):
+        if self.batcher is not None:
+            return await asyncio.wrap_future(self.batcher.submit((chat_ctx, state)))
+        return await asyncio.to_thread(self.detector.calculate_eou, chat_ctx, state)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
@@ -0,0 +1,170 @@
+import os
+
+IDLE = "idle"
+SPEAKING = "speaking"
+RESPONDING = "responding"
+
+
+class TurnTaker:
+    """End-of-turn decision for one session, from speech activity and EOU.
+
+    The user's turn ends after enough silence since the last speech, and how
+    much is enough depends on the turn detector: min_silence_ms when the EOU
+    probability of the current transcript reaches the threshold, up to
+    max_silence_ms as it drops towards 0 (or while the current text has not
+    been scored yet). A turn fires exactly once: poll() returns its text and
+    switches to RESPONDING until end_response().
+
+    Silence is measured from speech(): VAD speech frames for audio clients,
+    fragment arrival for clients that only send text. While the audio
+    stream is still inside an utterance (utterance(True)) or its final
+    transcript is being computed (final_pending), the turn does not fire,
+    so it is never committed on interim text the final one then repeats.
+
+    Text changes are debounced: eou_request() only hands out the transcript
+    once it has been stable for debounce_ms, one scoring call at a time, and
+    results for an older transcript are dropped.
+
+    Adaptive parts, per session:
+    - pauses inside a turn (speech resumed before the turn fired) are
+      tracked as a moving average; the minimum silence is at least
+      pause_factor times that, so slow speakers are not cut off mid-sentence
+    - speech within false_turn_ms after a turn fired means it was cut too
+      early, the EOU threshold goes up; turns that only ended on the silence
+      fallback (EOU stayed low) lower it again, within [0.2, 0.9]
+
+    All times are seconds from one monotonic clock (time.monotonic()).
+    """
+
+    def __init__(self, min_silence_ms=None, max_silence_ms=None, eou_threshold=None, debounce_ms=None,
+                 false_turn_ms=None, pause_factor=1.5, min_pause_ms=150, adapt_step=0.05):
+        self.min_silence_ms = float(min_silence_ms or os.environ.get("TURN_MIN_SILENCE_MS", 300))
+        self.max_silence_ms = float(max_silence_ms or os.environ.get("TURN_MAX_SILENCE_MS", 1600))
+        self.base_threshold = float(eou_threshold or os.environ.get("TURN_EOU_THRESHOLD", 0.5))
+        self.debounce_ms = float(os.environ.get("TURN_DEBOUNCE_MS", 150) if debounce_ms is None else debounce_ms)
+        self.false_turn_ms = float(false_turn_ms or os.environ.get("TURN_FALSE_TURN_MS", 1000))
+        self.pause_factor = pause_factor
+        # Gaps shorter than this are between VAD frames, not pauses
+        self.min_pause_ms = min_pause_ms
+        self.adapt_step = adapt_step
+        self.threshold = self.base_threshold
+        self.pause_ms = None
+        self.state = IDLE
+        self.committed = []
+        self.interim = ""
+        # Bumped on every transcript change; EOU results are tagged with it
+        self.version = 0
+        self.last_change = None
+        self.last_speech = None
+        self.finals_pending = 0
+        self.utterance_open = False
+        self.eou_prob = None
+        self.eou_version = -1
+        self.scoring = False
+        self.fired_at = None
+        self.turns = 0
+        self.false_turns = 0
+
+    @property
+    def text(self):
+        return " ".join(self.committed + [self.interim]).strip()
+
+    def speech(self, now):
+        """Speech activity: a VAD speech frame, or a transcript fragment
+        from a client that sends no audio"""
+        if self.state == SPEAKING and self.last_speech is not None:
+            gap_ms = (now - self.last_speech) * 1000
+            if gap_ms >= self.min_pause_ms:
+                # The user paused and went on: not the end of the turn
+                self.pause_ms = gap_ms if self.pause_ms is None else 0.8 * self.pause_ms + 0.2 * gap_ms
+        elif self.state == RESPONDING and self.fired_at is not None:
+            if (now - self.fired_at) * 1000 < self.false_turn_ms:
+                self.threshold = min(0.9, self.threshold + self.adapt_step)
+                self.false_turns += 1
+            self.fired_at = None
+        elif self.state == IDLE:
+            self.state = SPEAKING
+        self.last_speech = now
+
+    def utterance(self, active):
+        """Audio clients: whether the stream's VAD is inside an utterance
+        that has not been handed to final transcription yet"""
+        self.utterance_open = active
+
+    def final_pending(self):
+        """An utterance ended and its final transcript is on its way"""
+        self.finals_pending += 1
+
+    def add_text(self, text, now, final=True):
+        """Transcript fragment of the current turn. An interim fragment
+        replaces the previous interim one; a final one is kept."""
+        text = text.strip()
+        if final:
+            self.finals_pending = max(0, self.finals_pending - 1)
+            if text:
+                self.committed.append(text)
+            self.interim = ""
+        else:
+            self.interim = text
+        self.version += 1
+        self.last_change = now
+        if self.state == IDLE and self.text:
+            self.state = SPEAKING
+
+    def eou_request(self, now):
+        """(version, text) to score once the transcript has settled, else None"""
+        if self.state != SPEAKING or self.scoring or self.eou_version == self.version or not self.text:
+            return None
+        if (now - self.last_change) * 1000 < self.debounce_ms:
+            return None
+        self.scoring = True
+        return self.version, self.text
+
+    def eou_result(self, version, prob):
+        self.scoring = False
+        if version == self.version:
+            self.eou_prob = prob
+            self.eou_version = version
+
+    @property
+    def eou_current(self):
+        return self.eou_version == self.version and self.eou_prob is not None
+
+    def required_silence_ms(self):
+        min_silence = self.min_silence_ms
+        if self.pause_ms is not None:
+            min_silence = max(min_silence, min(self.max_silence_ms, self.pause_factor * self.pause_ms))
+        if not self.eou_current:
+            return self.max_silence_ms
+        if self.eou_prob >= self.threshold:
+            return min_silence
+        return self.max_silence_ms - (self.max_silence_ms - min_silence) * self.eou_prob / self.threshold
+
+    def silence_ms(self, now):
+        reference = self.last_speech if self.last_speech is not None else self.last_change
+        return (now - reference) * 1000
+
+    def poll(self, now):
+        """Text of the user's turn when it just ended, else None"""
+        if self.state != SPEAKING or not self.text or self.finals_pending or self.utterance_open:
+            return None
+        if self.silence_ms(now) < self.required_silence_ms():
+            return None
+        if self.eou_current and self.eou_prob < self.threshold:
+            # Ended on the silence fallback: this user's turns look less
+            # final to the model than the threshold expects
+            self.threshold = max(0.2, self.threshold - self.adapt_step / 2)
+        text = self.text
+        self.committed = []
+        self.interim = ""
+        self.version += 1
+        self.eou_prob = None
+        self.state = RESPONDING
+        self.fired_at = now
+        self.turns += 1
+        return text
+
+    def end_response(self):
+        """The reply to the last turn is done (or abandoned)"""
+        self.fired_at = None
+        self.state = SPEAKING if self.text else IDLE
@@ -0,0 +1,127 @@
+import os
+import numpy as np
+
+
+def original_position(position, removed):
+    """Sample index in trimmed audio -> sample index in the original audio.
+    removed is the sorted list of (start, end) ranges EnergyVAD.trim cut out."""
+    for start, end in removed:
+        if start > position:
+            break
+        position += end - start
+    return position
+
+
+class EnergyVAD:
+    """Frame-level energy / zero-crossing voice activity detection.
+
+    Every frame is scored at once on a (frames, samples) view of the audio.
+    A frame is speech when its RMS level is above energy_db relative to the
+    loudest frame (and above the absolute floor_db), or when it is up to
+    weak_db quieter than that but crosses zero often (zcr_threshold), which
+    keeps unvoiced consonants like "s" and "f". Speech is padded by pad_ms
+    on both sides. trim() cuts the silence before and after speech and, when
+    max_pause_ms > 0, shortens internal pauses longer than that (and than
+    keep_pause_ms) to keep_pause_ms.
+    """
+
+    def __init__(self, frame_ms=20, energy_db=-40.0, floor_db=-60.0, weak_db=10.0,
+                 zcr_threshold=0.25, pad_ms=200, max_pause_ms=0, keep_pause_ms=300):
+        self.frame_ms = frame_ms
+        self.energy_db = energy_db
+        self.floor_db = floor_db
+        self.weak_db = weak_db
+        self.zcr_threshold = zcr_threshold
+        self.pad_ms = pad_ms
+        self.max_pause_ms = max_pause_ms
+        self.keep_pause_ms = keep_pause_ms
+
+    @classmethod
+    def from_env(cls):
+        """VAD_* env vars, None when VAD_ENABLED=0"""
+        if os.environ.get("VAD_ENABLED", "1") != "1":
+            return None
+        return cls(
+            energy_db=float(os.environ.get("VAD_ENERGY_DB", -40)),
+            floor_db=float(os.environ.get("VAD_FLOOR_DB", -60)),
+            zcr_threshold=float(os.environ.get("VAD_ZCR", 0.25)),
+            pad_ms=int(os.environ.get("VAD_PAD_MS", 200)),
+            max_pause_ms=int(os.environ.get("VAD_MAX_PAUSE_MS", 0)),
+            keep_pause_ms=int(os.environ.get("VAD_KEEP_PAUSE_MS", 300)),
+        )
+
+    def frame_features(self, audio, sample_rate):
+        """(level_db, zcr) per frame_ms frame, the last partial frame is dropped"""
+        frame = int(sample_rate * self.frame_ms / 1000)
+        n = len(audio) // frame
+        frames = audio[:n * frame].reshape(n, frame)
+        rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame)
+        level_db = 20 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+        return level_db, zcr
+
+    def classify(self, level_db, zcr, reference_db):
+        """Unpadded speech mask, thresholds relative to reference_db"""
+        threshold = max(reference_db + self.energy_db, self.floor_db)
+        weak = level_db > max(threshold - self.weak_db, self.floor_db)
+        return (level_db > threshold) | (weak & (zcr >= self.zcr_threshold))
+
+    def speech_frames(self, audio, sample_rate):
+        """Boolean speech mask, one entry per frame_ms frame (last partial frame dropped)"""
+        level_db, zcr = self.frame_features(audio, sample_rate)
+        if len(level_db) == 0:
+            return np.zeros(0, dtype=bool)
+        speech = self.classify(level_db, zcr, level_db.max())
+
+        pad = int(np.ceil(self.pad_ms / self.frame_ms))
+        if pad:
+            speech = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+        return speech
+
+    def trim(self, audio, sample_rate):
+        """Returns (trimmed audio, removed) where removed lists the (start, end)
+        sample ranges of the input that were cut, in order"""
+        frame = int(sample_rate * self.frame_ms / 1000)
+        speech = self.speech_frames(audio, sample_rate)
+        voiced = np.flatnonzero(speech)
+        if len(voiced) == 0:
+            # Keep too-short input as is, drop input that is silence throughout
+            if len(speech) == 0:
+                return audio, []
+            return audio[:0], [(0, len(audio))]
+
+        first, last = voiced[0], voiced[-1]
+        start = first * frame
+        end = len(audio) if last == len(speech) - 1 else (last + 1) * frame
+        cuts = []
+        if self.max_pause_ms > 0:
+            # Runs of silent frames strictly inside the speech
+            inner = speech[first:last + 1].astype(np.int8)
+            edges = np.diff(np.concatenate(([1], inner, [1])))
+            run_starts = np.flatnonzero(edges == -1)
+            run_ends = np.flatnonzero(edges == 1)
+            keep = self.keep_pause_ms // self.frame_ms
+            # A pause is only shortened when it is longer than what is kept
+            # of it, whatever max_pause_ms is set to
+            max_pause = max(self.max_pause_ms // self.frame_ms, keep)
+            long = (run_ends - run_starts) > max_pause
+            for run_start, run_end in zip(run_starts[long], run_ends[long]):
+                # Keep half of keep_pause_ms on each side of the pause
+                cut_start = (first + run_start + keep // 2) * frame
+                cut_end = (first + run_end - (keep - keep // 2)) * frame
+                cuts.append((int(cut_start), int(cut_end)))
+
+        removed = []
+        if start > 0:
+            removed.append((0, int(start)))
+        removed.extend(cuts)
+        if end < len(audio):
+            removed.append((int(end), len(audio)))
+        if not removed:
+            return audio, removed
+
+        bounds = [int(start)] + [b for cut in cuts for b in cut] + [int(end)]
+        kept = [audio[a:b] for a, b in zip(bounds[::2], bounds[1::2])]
+        trimmed = kept[0] if len(kept) == 1 else np.concatenate(kept)
+        return trimmed, removed
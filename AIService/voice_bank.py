@@ -0,0 +1,84 @@
+import argparse
+import functools
+import json
+import os
+import numpy as np
+
+STYLE_DIM = 256
+PACKED_NAME = "voices.npy"
+
+
+def _voice_name(voice_file):
+    return os.path.splitext(os.path.basename(voice_file))[0]
+
+
+class VoiceBank:
+    """Kokoro voice style tables, memory-mapped once and shared.
+
+    Each voice is a (n_rows, 1, 256) float32 table where row i is the style
+    for an i-token input. Tables are np.memmap views, either of the separate
+    .bin files or of one packed voices.npy, so a lookup is a slice of mapped
+    memory: no file read and no copy, and processes mapping the same file
+    share the pages through the OS page cache.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def from_dir(cls, voices_dir):
+        """Map every <voice>.bin in voices_dir"""
+        tables = {}
+        for name in sorted(os.listdir(voices_dir)):
+            if name.endswith(".bin"):
+                table = np.memmap(os.path.join(voices_dir, name), dtype=np.float32, mode="r")
+                tables[_voice_name(name)] = table.reshape(-1, 1, STYLE_DIM)
+        return cls(tables)
+
+    @classmethod
+    def open(cls, packed_path):
+        """Map a bank written by pack()"""
+        packed = np.load(packed_path, mmap_mode="r")
+        with open(packed_path + ".json", "r", encoding="utf-8") as f:
+            index = json.load(f)
+        tables = {name: packed[start:start + n_rows] for name, (start, n_rows) in index.items()}
+        return cls(tables)
+
+    @staticmethod
+    def pack(voices_dir, packed_path):
+        """Write all voices of voices_dir into one .npy plus a .json row index"""
+        bank = VoiceBank.from_dir(voices_dir)
+        index, start = {}, 0
+        for name, table in bank.tables.items():
+            index[name] = (start, len(table))
+            start += len(table)
+        np.save(packed_path, np.concatenate(list(bank.tables.values())))
+        with open(packed_path + ".json", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        return index
+
+    def style(self, voice_file, n_tokens):
+        """Style row for an n_tokens input, shape (1, 256), zero-copy"""
+        return self.tables[_voice_name(voice_file)][n_tokens]
+
+    def voices(self):
+        return list(self.tables)
+
+
+@functools.lru_cache(maxsize=None)
+def get_voice_bank(model_dir):
+    """One bank per model dir and process; prefers the packed voices.npy"""
+    packed_path = os.environ.get("KOKORO_VOICE_BANK") or os.path.join(model_dir, PACKED_NAME)
+    if os.path.exists(packed_path):
+        return VoiceBank.open(packed_path)
+    return VoiceBank.from_dir(os.path.join(model_dir, "voices"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack Kokoro voice .bin files into one memory-mappable bank")
+    parser.add_argument("voices_dir", help="e.g. models/Kokoro-82M-ONNX/voices")
+    parser.add_argument("packed_path", help=f"e.g. models/Kokoro-82M-ONNX/{PACKED_NAME}")
+    args = parser.parse_args()
+
+    index = VoiceBank.pack(args.voices_dir, args.packed_path)
+    print(f"Packed {len(index)} voices into {args.packed_path}")
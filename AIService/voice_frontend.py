@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+from audio_decode import decode_pcm16, normalize_peak, resample
+from chat_context import as_chat_context
+from llm_client import AsyncOllamaClient, CircuitBreaker, OllamaClient
+from metrics import DECODE_SECONDS, LLM_SECONDS, LLM_TTFT_SECONDS, VAD_SECONDS
+from vad import EnergyVAD
+
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+
+SYSTEM_PROMPT_TEST = """
+- You are Neura a virtual assistant that helps you learn English.
+- Communicate naturally like a human conversation.
+- Answer as briefly as possible.
+- You always respond in English no matter what language the user uses.
+- Only talk and respond to English related topics. No coding, no talking about sensitive topics.
+        """
+
+
+class VoiceFrontEnd:
+    """The model-free half of the voice pipeline: PCM decode + VAD before
+    ASR, and the LLM chat calls. Shared by SpeechProcessingPipeline (models
+    in this process) and RemotePipeline (models in the model server), which
+    provide transcribe_audio / transcribe_batch and the TTS methods."""
+
+    def _init_front_end(self):
+        # Energy/ZCR silence trimming before ASR, VAD_ENABLED=0 turns it off
+        self.vad = EnergyVAD.from_env()
+        # Sync and async LLM clients share one circuit breaker
+        breaker = CircuitBreaker()
+        self.llm = OllamaClient(breaker=breaker)
+        self.async_llm = AsyncOllamaClient(breaker=breaker)
+        # phase -> seconds, filled by initialize_models
+        self.init_timings = {}
+        self.init_error = None
+        self.ready = threading.Event()
+
+    def load_audio_file(self, audio_data, sample_rate):
+        """Load audio file and return sample rate and numpy array"""
+        # audio_data, sample_rate = sf.read(file_path)
+        if audio_data.ndim > 1:
+            audio_data = np.mean(audio_data, axis=1, dtype=np.float32)
+        # No copy when the decoder already produced float32
+        audio_data = audio_data.astype(np.float32, copy=False)
+        return audio_data, sample_rate
+
+    def preprocess_audio(self, audio_data, sample_rate):
+        """Preprocess audio for Whisper model"""
+        if sample_rate != 16000:
+            # Cached polyphase filter per (source, target) rate pair
+            audio_data = resample(audio_data, sample_rate, 16000)
+            sample_rate = 16000
+        # In place; silent input is left as is instead of dividing by 0
+        audio_data = normalize_peak(audio_data)
+            
+        return audio_data, sample_rate
+
+    def prepare_audio(self, audio_bytes, with_offsets=False):
+        """Decode raw 16 kHz PCM_16 bytes into the float32 input Whisper expects,
+        with edge silence (and long pauses, if configured) trimmed by the VAD.
+        with_offsets=True also returns the removed (start, end) sample ranges."""
+        # int16 view of the bytes converted to float32 in one allocation
+        with DECODE_SECONDS.time():
+            audio_data, sample_rate = self._normalize_samples(decode_pcm16(audio_bytes), 16000)
+        # wav_buffer = io.BytesIO()
+        # sf.write(wav_buffer, audio_data, 16000, format='wav', subtype='PCM_16')
+        # wav_buffer.seek(0)
+        return self._trim_silence(audio_data, sample_rate, with_offsets)
+
+    def prepare_samples(self, audio_data, sample_rate, with_offsets=False):
+        """Decoded samples -> normalized 16 kHz mono float32, VAD-trimmed"""
+        with DECODE_SECONDS.time():
+            audio_data, sample_rate = self._normalize_samples(audio_data, sample_rate)
+        return self._trim_silence(audio_data, sample_rate, with_offsets)
+
+    def _normalize_samples(self, audio_data, sample_rate):
+        audio_data, sample_rate = self.load_audio_file(audio_data, sample_rate)
+        return self.preprocess_audio(audio_data, sample_rate)
+
+    def _trim_silence(self, audio_data, sample_rate, with_offsets):
+        removed = []
+        if self.vad is not None:
+            with VAD_SECONDS.time():
+                audio_data, removed = self.vad.trim(audio_data, sample_rate)
+        if with_offsets:
+            return audio_data, sample_rate, removed
+        return audio_data, sample_rate
+
+    def process_audio_file(self, audio_bytes):
+        """Complete pipeline: audio file -> text -> response -> speech"""
+        # Step 1: Load and preprocess audio
+        # with open("test.wav", "wb") as f:
+        #     f.write(audio_bytes)
+        audio_data, sample_rate = self.prepare_audio(audio_bytes)
+        if len(audio_data) == 0:
+            # Nothing but silence, skip Whisper
+            return ""
+        
+        # Step 2: Transcribe audio to text
+        transcription = self.transcribe_audio(audio_data, sample_rate)
+        print(f"Transcription: {transcription}")
+        
+        # Step 3: Generate response
+        # response = self.generate_response(transcription)
+        # print(f"Response: {response}")
+        
+        # Step 4: Convert response to speech
+        # self.generate_speech(response)
+        
+        return transcription
+
+    def generate_response(self, chat_history):
+        """Generate conversational response using Qwen model"""
+        vietnam_date = datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")).date()
+        
+        SYSTEM_PROMPT = f"""\
+You are an AI conversation assistant named **NEURA**.  
+Your main task is to help the **user improve their English speaking skills** through casual conversation.  
+You are currently talking to the user in real-time.  
+Do **not** make any grammar, spelling, or formatting mistakes.  
+The current time is **{vietnam_date}**.
+
+## Role Instructions:
+- Please be as brief as possible with every question.
+- You are having a live, spoken-style conversation with the user.
+- Your personality should be friendly, natural, and encouraging.
+- Your focus is to help the user **practice English speaking fluency**.
+
+<Requirements>
+### Language:
+- Always respond in **English only**.
+- **Never** switch to any other language, even if the user asks you to.
+
+### Response Style:
+- Keep each response **short and simple**, like normal spoken language.
+- Each response must be **only one line**.
+- Do **not explain**, **define**, or **elaborate** unless specifically asked in English.
+- Responses must feel like a real-time chat or spoken dialogue.
+
+
+### Tone and Format:
+- Talk as if you're having a **natural, face-to-face conversation** with the user.
+- Use **spoken English only**, no formal writing.
+- **Do not use any icons, emojis, symbols, markdown, or special characters**.
+
+## Example:
+**User:** How are you today?  
+**ONE:** I'm doing great, thanks! How about you?
+
+**User:** What's your favorite food?  
+**ONE:** I really like pizza, it's always a good choice.
+<Requirements/>
+
+Make sure to follow these rules consistently for every response."""
+        
+        # user_prompt = "Treat the following as a message from the user. Respond in natural, spoken English with one short line: " + user_input.strip()
+
+
+        context = as_chat_context(chat_history)
+        data = self.build_chat_payload(context, stream=False)
+
+        # Pooled keep-alive client with deadline, retries and circuit breaker,
+        # raises LLMError instead of returning None when the backend fails
+        stats = {}
+        with LLM_SECONDS.time():
+            response = self.llm.chat(data, stats=stats)
+        context.record_usage(stats)
+        print(response)
+        return response
+
+    def build_chat_payload(self, chat_history, stream=False):
+        """Build the body of an Ollama /api/chat call.
+        chat_history is not modified: the system prompt is only added to the
+        messages sent, which ChatContext keeps under the token budget."""
+        # Chuẩn bị dữ liệu cho phần thân yêu cầu
+        # data = {
+        #     "model": "qwen2.5-coder:7b",
+        #     "system": SYSTEM_PROMPT,
+        #     "prompt": chat_history,
+        #     "stream": False
+        # }
+        messages = as_chat_context(chat_history).messages(SYSTEM_PROMPT_TEST)
+        
+        data = {
+            "model": "qwen2.5-coder:7b",
+            "options": {
+                    "num_predict": 64  # <-- Điều chỉnh độ dài response tại đây
+                        },
+            "messages": messages,
+            "stream": stream,
+            # Keep the model, and with it the cached prompt prefix, loaded between turns
+            "keep_alive": LLM_KEEP_ALIVE,
+        }
+        return data
+
+    async def agenerate_response(self, chat_history):
+        """Async generate_response on aiohttp, does not block the event loop"""
+        context = as_chat_context(chat_history)
+        data = self.build_chat_payload(context, stream=False)
+        stats = {}
+        with LLM_SECONDS.time():
+            response = await self.async_llm.chat(data, stats=stats)
+        context.record_usage(stats)
+        return response
+
+    async def agenerate_response_stream(self, chat_history):
+        """Stream the reply from Ollama on aiohttp, yields content tokens as they arrive"""
+        context = as_chat_context(chat_history)
+        data = self.build_chat_payload(context, stream=True)
+        stats = {}
+        start = time.perf_counter()
+        first = True
+        async for token in self.async_llm.chat_stream(data, stats=stats):
+            if first:
+                LLM_TTFT_SECONDS.observe(time.perf_counter() - start)
+                first = False
+            yield token
+        LLM_SECONDS.observe(time.perf_counter() - start)
+        context.record_usage(stats)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from executors import ModelExecutors
+from metrics import TTS_FIRST_CHUNK_SECONDS, TTS_SECONDS
+from text_chunking import SentenceBuffer
+
+
+class VoiceTurnRunner:
+    """Runs the steps of a voice turn without blocking the event loop.
+
+    ASR and TTS go through their own bounded thread pools, the LLM is awaited
+    on the async HTTP client, so many websocket sessions can progress at once.
+    """
+
+    def __init__(self, pipeline, executors=None, asr_batcher=None, tts_batcher=None):
+        self.pipeline = pipeline
+        self.executors = executors or ModelExecutors()
+        # Optional MicroBatcher over pipeline.transcribe_batch shared by all sessions
+        self.asr_batcher = asr_batcher
+        # Optional MicroBatcher over pipeline.synthesize_sentences
+        self.tts_batcher = tts_batcher
+
+    async def transcribe(self, audio_bytes):
+        if self.asr_batcher is None:
+            return await self.executors.asr.run(self.pipeline.process_audio_file, audio_bytes)
+        audio_data, _ = await self.executors.asr.run(self.pipeline.prepare_audio, audio_bytes)
+        if len(audio_data) == 0:
+            return ""
+        return await asyncio.wrap_future(self.asr_batcher.submit(audio_data))
+
+    async def transcribe_samples(self, audio_data, sample_rate=16000):
+        """Transcribe float32 samples, e.g. an utterance from a streaming session"""
+        audio_data, sample_rate = await self.executors.asr.run(self.pipeline.prepare_samples, audio_data, sample_rate)
+        if len(audio_data) == 0:
+            return ""
+        if self.asr_batcher is None:
+            return await self.executors.asr.run(self.pipeline.transcribe_audio, audio_data, sample_rate)
+        return await asyncio.wrap_future(self.asr_batcher.submit(audio_data))
+
+    async def partial_transcript(self, audio_data, sample_rate=16000):
+        """Best-effort transcript of a streaming window: None when every ASR
+        worker is busy, so partials never delay final transcripts"""
+        if self.executors.asr.active >= self.executors.asr.workers:
+            return None
+        return await self.transcribe_samples(audio_data, sample_rate)
+
+    async def respond(self, chat_history):
+        async with self.executors.llm.slot():
+            return await self.pipeline.agenerate_response(chat_history)
+
+    async def speak(self, text):
+        with TTS_SECONDS.time():
+            return await self.executors.tts.run(self.pipeline.generate_speech, text)
+
+    async def synthesize_sentence(self, sentence):
+        if self.tts_batcher is None:
+            return await self.executors.tts.run(self.pipeline.synthesize_sentence, sentence)
+        return await asyncio.wrap_future(self.tts_batcher.submit(sentence))
+
+    async def respond_stream(self, chat_history):
+        """Async generator of (seq, chunk_text, wav_bytes).
+
+        A producer task reads the LLM token stream and queues finished
+        sentences, which are synthesized on the TTS stage while the LLM keeps
+        generating.
+        """
+        sentences = asyncio.Queue()
+        done = object()
+
+        async def read_llm():
+            try:
+                buffer = SentenceBuffer()
+                async with self.executors.llm.slot():
+                    async for token in self.pipeline.agenerate_response_stream(chat_history):
+                        for sentence in buffer.feed(token):
+                            await sentences.put(sentence)
+                for sentence in buffer.flush():
+                    await sentences.put(sentence)
+            except Exception as e:
+                await sentences.put(e)
+            finally:
+                await sentences.put(done)
+
+        reader = asyncio.create_task(read_llm())
+        tts_seconds = 0.0
+        try:
+            seq = 0
+            while True:
+                sentence = await sentences.get()
+                if sentence is done:
+                    break
+                if isinstance(sentence, Exception):
+                    raise sentence
+                start = time.perf_counter()
+                chunks = await self.synthesize_sentence(sentence)
+                elapsed = time.perf_counter() - start
+                if seq == 0:
+                    TTS_FIRST_CHUNK_SECONDS.observe(elapsed)
+                tts_seconds += elapsed
+                for chunk_text, wav_bytes in chunks:
+                    yield seq, chunk_text, wav_bytes
+                    seq += 1
+            TTS_SECONDS.observe(tts_seconds)
+        finally:
+            if not reader.done():
+                reader.cancel()
@@ -0,0 +1,58 @@
+import torch
+import transformers
+from torch import nn
+from transformers.modeling_outputs import BaseModelOutput
+
+# encode_window repeats WhisperEncoder.forward from this release (the one in
+# requirements.txt); test_whisper_window.py checks it against the library
+TRANSFORMERS_VERSION = "4.52.3"
+
+# Whisper mel frames: 100 per second of 16 kHz audio (hop length 160)
+HOP_LENGTH = 160
+FULL_WINDOW_FRAMES = 3000
+# Encoder input sizes for short utterances. A fixed set of shapes so warmed /
+# compiled kernels are reused; anything longer goes through the 30 s window.
+FRAME_BUCKETS = (500, 1000, 1500, FULL_WINDOW_FRAMES)
+# Keep at least this much padding after the speech so the decoder sees the end
+TAIL_FRAMES = 50
+
+
+def pick_frame_bucket(n_samples, buckets=FRAME_BUCKETS):
+    """Smallest bucket that holds n_samples of 16 kHz audio plus a short tail"""
+    frames = -(-n_samples // HOP_LENGTH) + TAIL_FRAMES
+    for bucket in buckets:
+        if frames <= bucket:
+            return bucket
+    return FULL_WINDOW_FRAMES
+
+
+@torch.no_grad()
+def encode_window(whisper_model, input_features):
+    """Run the Whisper encoder on a mel window shorter than 30 s.
+
+    Same ops as WhisperEncoder.forward, which rejects anything but 3000
+    frames, with the positional embedding sliced to the window length.
+    Returns encoder_outputs ready for whisper_model.generate(encoder_outputs=...).
+    """
+    encoder = whisper_model.get_encoder()
+    if input_features.shape[-1] == FULL_WINDOW_FRAMES:
+        return encoder(input_features)
+    return run_encoder(encoder, input_features)
+
+
+@torch.no_grad()
+def run_encoder(encoder, input_features):
+    """The WhisperEncoder.forward ops for any window length"""
+    hidden_states = nn.functional.gelu(encoder.conv1(input_features))
+    hidden_states = nn.functional.gelu(encoder.conv2(hidden_states))
+    hidden_states = hidden_states.permute(0, 2, 1)
+    hidden_states = hidden_states + encoder.embed_positions.weight[: hidden_states.shape[1]]
+    for layer in encoder.layers:
+        hidden_states = layer(hidden_states, None, layer_head_mask=None)[0]
+    hidden_states = encoder.layer_norm(hidden_states)
+    return BaseModelOutput(last_hidden_state=hidden_states)
+
+
+if transformers.__version__ != TRANSFORMERS_VERSION:
+    print(f"whisper_window: written against transformers {TRANSFORMERS_VERSION}, "
+          f"found {transformers.__version__}; run test_whisper_window.py and bench_whisper_window.py before using short windows")